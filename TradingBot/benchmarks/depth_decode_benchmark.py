@@ -0,0 +1,69 @@
+"""
+Decode cost per depthUpdate frame, before and after the shared decode path.
+Run from the TradingBot directory: python -m benchmarks.depth_decode_benchmark
+"""
+import json
+import random
+import timeit
+from decimal import Decimal
+
+from market_data.events import MarketDataDecoder
+from market_data.fixed_point import FixedPointScale
+
+TRADERS = 5
+LEVELS = 40
+FRAMES = 2000
+
+
+def build_frames():
+    random.seed(0)
+    frames = []
+    for update_id in range(FRAMES):
+        mid = 100000 + random.randint(-500, 500) / 100
+
+        def levels(sign):
+            return [[f"{mid + sign * random.randint(1, 3000) / 100:.8f}", f"{random.random() * 5:.5f}000"]
+                    for _ in range(LEVELS // 2)]
+
+        payload = {'e': 'depthUpdate', 'E': update_id, 's': 'BTCUSDT', 'U': update_id, 'u': update_id,
+                   'b': levels(-1), 'a': levels(1)}
+        frames.append(json.dumps({'stream': 'btcusdt@depth@100ms', 'data': payload}))
+    return frames
+
+
+def decode_before(frames):
+    # json.loads in the handler, then every trader converted every level to Decimal on its own
+    for frame in frames:
+        payload = json.loads(frame)['data']
+        for _ in range(TRADERS):
+            for level in payload['b']:
+                Decimal(level[0]), Decimal(level[1])
+            for level in payload['a']:
+                Decimal(level[0]), Decimal(level[1])
+
+
+def decode_after(frames, decoder):
+    # One decode per frame, levels parsed once when the order book reads them
+    for frame in frames:
+        event = decoder.decode(frame)
+        event.bids, event.asks
+
+
+def main():
+    frames = build_frames()
+    decimal_decoder = MarketDataDecoder()
+    fixed_point_decoder = MarketDataDecoder()
+    scale = FixedPointScale('0.01', '0.00001')
+    fixed_point_decoder.register_parsers('BTCUSDT', scale.parse_price, scale.parse_quantity)
+    runs = {
+        f'before ({TRADERS} traders)': lambda: decode_before(frames),
+        'after (Decimal)': lambda: decode_after(frames, decimal_decoder),
+        'after (fixed point)': lambda: decode_after(frames, fixed_point_decoder),
+    }
+    for name, run in runs.items():
+        best = min(timeit.repeat(run, number=1, repeat=5))
+        print(f"{name:<24} {best / FRAMES * 1e6:8.1f} us per depthUpdate")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class Clock(ABC):
+    """
+    Source of the current time for traders. Live runs read the wall clock, replays an event driven clock.
+    """
+
+    @abstractmethod
+    def time_ms(self):
+        pass
+
+    def time(self):
+        return self.time_ms() / 1000
+
+    def utcnow(self):
+        # Naive UTC datetime, like datetime.utcnow()
+        return EPOCH + timedelta(milliseconds=self.time_ms())
+
+
+class WallClock(Clock):
+
+    def time_ms(self):
+        return time.time_ns() // 1_000_000
+
+
+class EventClock(Clock):
+    """
+    Clock that only moves when advanced to the time of the event being processed, so that a simulated run
+    goes as fast as the events are processed and stamps the same times on every run.
+    """
+
+    def __init__(self, start_ms=0):
+        self.current_ms = start_ms
+
+    def advance(self, time_ms):
+        # Never goes back, recorded events can be slightly out of order
+        if time_ms > self.current_ms:
+            self.current_ms = time_ms
+
+    def time_ms(self):
+        return self.current_ms
+
+
+WALL_CLOCK = WallClock()
@@ -1,16 +1,39 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
+from date.clock import EPOCH, WALL_CLOCK
 
-def get_current_date():
-    now_utc = datetime.utcnow()
-    return now_utc.strftime("%d/%m/%YT%H:%M")
+DATE_FORMAT = "%d/%m/%YT%H:%M"
 
 
-def compute_duration_until_now(date):
+def get_current_date(clock=WALL_CLOCK):
+    now_utc = clock.utcnow()
+    return now_utc.strftime(DATE_FORMAT)
 
-    current_time = datetime.utcnow()
+
+def compute_duration_until_now(date, clock=WALL_CLOCK):
+
+    current_time = clock.utcnow()
     runtime = current_time - date
     days = runtime.days
     hours, remainder = divmod(runtime.seconds, 3600)
     minutes, seconds = divmod(remainder, 60)
     return f"{days}d {hours}h {minutes}m"
+
+
+def timestamp_ms_of(order, key):
+    """
+    :param key: 'opened_at' or 'closed_at'.
+    :return: the epoch milliseconds of the key + '_ts' field of order, parsed from its minute precision key date for
+    orders saved before timestamps were recorded.
+    """
+    timestamp = getattr(order, key + '_ts')
+    if timestamp is None:
+        return int((datetime.strptime(getattr(order, key), DATE_FORMAT) - EPOCH) / timedelta(milliseconds=1))
+    return int(timestamp)
+
+
+def datetime_of(timestamp_ms):
+    """
+    :return: the naive UTC datetime of epoch milliseconds, like Clock.utcnow.
+    """
+    return EPOCH + timedelta(milliseconds=timestamp_ms)
@@ -1,9 +1,13 @@
 import json
 from decimal import Decimal
 
+from traders.order import Order
+
 
 class DecimalEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, Decimal):
             return str(obj)
+        if isinstance(obj, Order):
+            return obj.to_dict()
         return super().default(obj)
@@ -2,12 +2,15 @@ import logging
 from decimal import Decimal
 
 import requests
-from sortedcontainers import SortedDict
 
 DEPTH_SUFFIX = '/api/v3/depth'
+EXCHANGE_INFO_SUFFIX = '/api/v3/exchangeInfo'
+KLINES_SUFFIX = '/api/v3/klines'
+FUTURES_BASE_URL = 'https://fapi.binance.com'
+FUTURES_KLINES_SUFFIX = '/fapi/v1/klines'
 
 
-def initialize_order_book(base_url, symbol, limit=1000):
+def fetch_depth_snapshot(base_url, symbol, limit=1000):
     params = {
         'symbol': symbol,
         'limit': limit
@@ -16,13 +19,50 @@ def initialize_order_book(base_url, symbol, limit=1000):
         url = base_url + DEPTH_SUFFIX
         response = requests.get(url, params=params)
         if response.status_code == 200:
-            depth = response.json()
-            order_book = {'bids': SortedDict({Decimal(bid[0]): Decimal(bid[1]) for bid in depth['bids']}),
-                          'asks': SortedDict({Decimal(ask[0]): Decimal(ask[1]) for ask in depth['asks']})}
-            return order_book
+            return response.json()
         else:
             logging.error(f"Error fetching order book for {symbol}: {response.status_code} - {response.text}")
             return None
     except Exception as e:
-        logging.error("Error occurred when initializing_order_book")
+        logging.error("Error occurred when fetching depth snapshot")
+        return None
+
+
+def fetch_klines(base_url, symbol, interval, start_time=None, limit=1000, suffix=KLINES_SUFFIX):
+    """
+    :param start_time: open time of the first kline, the latest klines if None.
+    :return: the klines in time order, or None if they could not be fetched.
+    """
+    params = {
+        'symbol': symbol,
+        'interval': interval,
+        'limit': limit
+    }
+    if start_time is not None:
+        params['startTime'] = start_time
+    try:
+        response = requests.get(base_url + suffix, params=params)
+        if response.status_code == 200:
+            return response.json()
+        logging.error(f"Error fetching {interval} klines for {symbol}: {response.status_code} - {response.text}")
+        return None
+    except Exception as e:
+        logging.error(f"Error occurred when fetching {interval} klines for {symbol}")
+        return None
+
+
+def fetch_symbol_filters(base_url, symbol):
+    """
+    :return: the tick size and the step size of the symbol, or None if exchange info is unavailable.
+    """
+    try:
+        response = requests.get(base_url + EXCHANGE_INFO_SUFFIX, params={'symbol': symbol})
+        if response.status_code != 200:
+            logging.error(f"Error fetching exchange info for {symbol}: {response.status_code} - {response.text}")
+            return None
+        filters = {f['filterType']: f for f in response.json()['symbols'][0]['filters']}
+        return {'tick_size': Decimal(filters['PRICE_FILTER']['tickSize']),
+                'step_size': Decimal(filters['LOT_SIZE']['stepSize'])}
+    except Exception as e:
+        logging.error("Error occurred when fetching symbol filters")
         return None
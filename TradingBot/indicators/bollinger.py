@@ -0,0 +1,119 @@
+from indicators.ring_buffer import RingBuffer
+from indicators.rolling import RollingStatistics
+
+
+class BollingerBands:
+    """
+    Moving average of the last `window` values with bands `num_std` standard deviations above and below.
+    Bands are None until the window is full.
+    """
+
+    def __init__(self, window=20, num_std=2):
+        self.num_std = num_std
+        self.statistics = RollingStatistics(window)
+
+    @property
+    def ready(self):
+        return self.statistics.ready
+
+    def update(self, value):
+        self.statistics.push(value)
+
+    def replace_last(self, value):
+        self.statistics.replace_last(value)
+
+    @property
+    def middle(self):
+        return self.statistics.mean
+
+    @property
+    def upper(self):
+        std = self.statistics.std
+        return self.statistics.mean + std * self.num_std if std is not None else None
+
+    @property
+    def lower(self):
+        std = self.statistics.std
+        return self.statistics.mean - std * self.num_std if std is not None else None
+
+    def clear(self):
+        self.statistics.clear()
+
+
+class BandCandle:
+    """
+    Candle with the Bollinger bands computed at its close, prices as float.
+    """
+    __slots__ = ('open_time', 'open', 'high', 'low', 'close', 'volume', 'middle', 'upper', 'lower')
+
+    def __init__(self, open_time, open, high, low, close, volume):
+        self.open_time = open_time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.middle = None
+        self.upper = None
+        self.lower = None
+
+
+class BollingerCandles:
+    """
+    Bollinger bands of a candle series fed with klines as returned by the Binance REST API or streams.
+    A kline with the open time of the latest candle updates it (candle in progress), a newer one appends a candle,
+    older ones are ignored: polling overlapping kline ranges only costs the new candles.
+
+    :param history: number of latest candles kept with their bands.
+    :param interval_ms: candle duration, the series restarts when candles are missing if given.
+    """
+
+    def __init__(self, window=20, num_std=2, history=3, interval_ms=None):
+        self.bands = BollingerBands(window, num_std)
+        self.candles = RingBuffer(history)
+        self.interval_ms = interval_ms
+
+    @property
+    def ready(self):
+        return self.bands.ready
+
+    @property
+    def last_open_time(self):
+        return self.candles[-1].open_time if len(self.candles) > 0 else None
+
+    def update_klines(self, klines):
+        """
+        :param klines: [open_time, open, high, low, close, volume, ...] lists, in time order.
+        """
+        for kline in klines:
+            self.update_kline(kline)
+
+    def update_kline(self, kline):
+        candle = BandCandle(int(kline[0]), float(kline[1]), float(kline[2]), float(kline[3]), float(kline[4]),
+                            float(kline[5]))
+        last_open_time = self.last_open_time
+        if last_open_time is not None and candle.open_time < last_open_time:
+            return
+        if (last_open_time is not None and self.interval_ms is not None
+                and candle.open_time > last_open_time + self.interval_ms):
+            # Candles are missing, the bands would mix both sides of the gap
+            self.clear()
+            last_open_time = None
+        if last_open_time is not None and candle.open_time == last_open_time:
+            self.bands.replace_last(candle.close)
+            self.candles.replace_last(candle)
+        else:
+            self.bands.update(candle.close)
+            self.candles.append(candle)
+        candle.middle, candle.upper, candle.lower = self.bands.middle, self.bands.upper, self.bands.lower
+
+    def last(self, count):
+        """
+        :return: the latest `count` candles, oldest first, fewer if the series is shorter.
+        """
+        size = len(self.candles)
+        return [self.candles[index] for index in range(max(size - count, 0), size)]
+
+    def clear(self):
+        self.bands.clear()
+        self.candles.clear()
@@ -0,0 +1,61 @@
+class RingBuffer:
+    """
+    Fixed capacity buffer keeping the last `capacity` values, appending evicts the oldest one.
+    Index 0 is the oldest value, -1 the latest.
+    """
+    __slots__ = ('capacity', '_values', '_start', '_size')
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError(f"Ring buffer capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self._values = [None] * capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('ring buffer index out of range')
+        return self._values[(self._start + index) % self.capacity]
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self._values[(self._start + index) % self.capacity]
+
+    @property
+    def full(self):
+        return self._size == self.capacity
+
+    def append(self, value):
+        """
+        :return: the evicted value, None if the buffer was not full.
+        """
+        if self._size < self.capacity:
+            self._values[(self._start + self._size) % self.capacity] = value
+            self._size += 1
+            return None
+        evicted = self._values[self._start]
+        self._values[self._start] = value
+        self._start = (self._start + 1) % self.capacity
+        return evicted
+
+    def replace_last(self, value):
+        """
+        :return: the replaced value.
+        """
+        if self._size == 0:
+            raise IndexError('replace_last on an empty ring buffer')
+        position = (self._start + self._size - 1) % self.capacity
+        replaced = self._values[position]
+        self._values[position] = value
+        return replaced
+
+    def clear(self):
+        self._values = [None] * self.capacity
+        self._start = 0
+        self._size = 0
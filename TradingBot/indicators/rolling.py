@@ -0,0 +1,76 @@
+import math
+
+from indicators.ring_buffer import RingBuffer
+
+
+class RollingStatistics:
+    """
+    Mean and standard deviation of the last `window` values, updated in O(1) per value.
+    The sum of squared deviations is maintained with Welford's updates, adapted to values leaving the window,
+    which stays accurate for prices far from zero where the sum of squares would not.
+
+    :param ddof: delta degrees of freedom of the standard deviation, 1 like pandas' rolling std.
+    """
+
+    def __init__(self, window, ddof=1):
+        self.window = window
+        self.ddof = ddof
+        self.values = RingBuffer(window)
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def ready(self):
+        return self.values.full
+
+    def push(self, value):
+        value = float(value)
+        evicted = self.values.append(value)
+        if evicted is None:
+            count = len(self.values)
+            delta = value - self._mean
+            self._mean += delta / count
+            self._m2 += delta * (value - self._mean)
+        else:
+            self.__replace(evicted, value)
+
+    def replace_last(self, value):
+        """
+        Replaces the latest value, e.g. the close of a candle still in progress.
+        """
+        value = float(value)
+        self.__replace(self.values.replace_last(value), value)
+
+    def __replace(self, old_value, new_value):
+        previous_mean = self._mean
+        self._mean += (new_value - old_value) / len(self.values)
+        self._m2 += (new_value - old_value) * (new_value - self._mean + old_value - previous_mean)
+        if self._m2 < 0:
+            # Rounding on a constant window
+            self._m2 = 0.0
+
+    @property
+    def mean(self):
+        """
+        :return: the mean of the window, None until the window is full.
+        """
+        return self._mean if self.ready else None
+
+    @property
+    def variance(self):
+        if not self.ready or self.window <= self.ddof:
+            return None
+        return self._m2 / (self.window - self.ddof)
+
+    @property
+    def std(self):
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    def clear(self):
+        self.values.clear()
+        self._mean = 0.0
+        self._m2 = 0.0
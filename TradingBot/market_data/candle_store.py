@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import threading
+
+from sortedcontainers import SortedDict
+
+from date.clock import WALL_CLOCK
+from exchange.binance_helper import FUTURES_BASE_URL, FUTURES_KLINES_SUFFIX, KLINES_SUFFIX, fetch_klines
+
+INTERVAL_UNITS_MS = {'s': 1000, 'm': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000,
+                     'w': 7 * 24 * 60 * 60 * 1000}
+PAGE_LIMIT = 1000
+
+
+def interval_to_ms(interval):
+    """
+    :param interval: Binance kline interval, e.g. 1m, 15m, 4h, 1d. Monthly klines are not supported.
+    """
+    return int(interval[:-1]) * INTERVAL_UNITS_MS[interval[-1]]
+
+
+class CandleStore:
+    """
+    Klines of one symbol and interval, shared by every consumer and persisted to `directory`.
+
+    The store loads its history from disk at startup, then `synchronize` only fetches the klines from the
+    latest stored candle on: that candle may have been in progress, newer ones are added and pages are followed
+    until the store is up to date, which fills the gaps left while the bot was stopped. Klines are keyed by open
+    time, a kline received twice replaces the stored one.
+
+    :param capacity: number of latest candles kept.
+    """
+
+    def __init__(self, symbol, interval, base_url, directory='candles', capacity=1000, suffix=KLINES_SUFFIX,
+                 name=None, clock=None):
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = interval_to_ms(interval)
+        self.base_url = base_url
+        self.suffix = suffix
+        self.capacity = capacity
+        self.clock = clock or WALL_CLOCK
+        self.file_name = os.path.join(directory, f'{name or symbol}-{interval}.json')
+        self.lock = threading.Lock()
+        # Consumers synchronizing at the same time fetch once
+        self._synchronize_lock = threading.Lock()
+        self._klines = SortedDict()
+
+    def __len__(self):
+        return len(self._klines)
+
+    @property
+    def last_open_time(self):
+        with self.lock:
+            return self._klines.peekitem(-1)[0] if self._klines else None
+
+    def load(self):
+        if not os.path.exists(self.file_name):
+            return
+        try:
+            with open(self.file_name, 'r') as file:
+                self.update(json.load(file))
+            logging.info(f"Loaded {len(self)} {self.interval} candles of {self.symbol} from {self.file_name}")
+        except Exception as e:
+            logging.error(f"Error loading candles from {self.file_name}: {e}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.file_name) or '.', exist_ok=True)
+        temporary_file_name = self.file_name + '.tmp'
+        with open(temporary_file_name, 'w') as file:
+            json.dump(self.klines(), file)
+        os.replace(temporary_file_name, self.file_name)
+
+    def update(self, klines):
+        """
+        :param klines: [open_time, open, high, low, close, volume, ...] lists.
+        :return: the number of candles added, replaced candles are not counted.
+        """
+        added = 0
+        with self.lock:
+            for kline in klines:
+                open_time = int(kline[0])
+                if open_time not in self._klines:
+                    added += 1
+                self._klines[open_time] = kline
+            while len(self._klines) > self.capacity:
+                self._klines.popitem(0)
+        return added
+
+    def klines(self, limit=None, end_time=None):
+        """
+        :param end_time: open time of the latest kline returned, the latest stored one if None.
+        :return: the latest `limit` klines, all of them if None, oldest first.
+        """
+        with self.lock:
+            end = len(self._klines) if end_time is None else self._klines.bisect_right(end_time)
+            start = 0 if limit is None else max(end - limit, 0)
+            return list(self._klines.values()[start:end])
+
+    def synchronize(self):
+        """
+        Fetches the klines missing since the latest stored candle, and saves the store if candles were added.
+        :return: False if the klines could not be fetched.
+        """
+        with self._synchronize_lock:
+            return self.__synchronize()
+
+    def __synchronize(self):
+        start_time = self.last_open_time
+        # Candles older than the capacity would be dropped right away, they are not fetched
+        oldest_kept = self.clock.time_ms() - self.capacity * self.interval_ms
+        if start_time is not None and start_time < oldest_kept:
+            start_time = oldest_kept - oldest_kept % self.interval_ms
+        added = 0
+        while True:
+            if start_time is None:
+                klines = fetch_klines(self.base_url, self.symbol, self.interval, limit=min(self.capacity, PAGE_LIMIT),
+                                      suffix=self.suffix)
+            else:
+                klines = fetch_klines(self.base_url, self.symbol, self.interval, start_time=start_time,
+                                      limit=PAGE_LIMIT, suffix=self.suffix)
+            if klines is None:
+                return False
+            added += self.update(klines)
+            if start_time is None or len(klines) < PAGE_LIMIT:
+                break
+            start_time = int(klines[-1][0])
+        if added > 0:
+            self.save()
+        return True
+
+
+def futures_candle_store(symbol, interval, directory='candles', capacity=100, clock=None):
+    """
+    :return: the store of the USD-M futures klines of symbol, loaded from disk.
+    """
+    candle_store = CandleStore(symbol, interval, FUTURES_BASE_URL, directory=directory, capacity=capacity,
+                               suffix=FUTURES_KLINES_SUFFIX, name=f'{symbol}-futures', clock=clock)
+    candle_store.load()
+    return candle_store
@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+# Results of applying a diff
+APPLIED = 'applied'
+# Already contained in the order book, nothing changed
+DROPPED = 'dropped'
+GAP = 'gap'
+
+
+class DepthSynchronizer:
+    """
+    Keeps the OrderBook of one symbol consistent with the diff depth stream, following the
+    Binance procedure: diffs are buffered while a REST snapshot loads, diffs already contained
+    in the snapshot are dropped and any gap in the update ids triggers a new snapshot for this
+    symbol only.
+
+    Without a snapshot loader, snapshots are only supplied through `load_snapshot` (replayed recordings).
+    """
+
+    def __init__(self, order_book, snapshot_loader=None, retry_delay=5):
+        self.order_book = order_book
+        self.snapshot_loader = snapshot_loader
+        self.retry_delay = retry_delay
+        self.buffer = []
+        self.loading = False
+        # True while the next applied diff must straddle the snapshot's lastUpdateId
+        self.awaiting_first_update = order_book.last_update_id is not None
+        self.synchronized = order_book.last_update_id is not None
+        self._lock = threading.Lock()
+
+    def on_depth_update(self, message):
+        """
+        :return: True if the diff has changed the order book and can be dispatched to traders, False if it was
+        buffered, dropped as already contained in the book, or revealed a gap.
+        """
+        with self._lock:
+            if not self.synchronized:
+                self.buffer.append(message)
+                self.__start_loading()
+                return False
+            result = self.__apply(message)
+            if result != GAP:
+                return result == APPLIED
+            logging.warning(f"Depth stream gap detected for {self.order_book.symbol}, resynchronizing order book")
+            self.synchronized = False
+            self.buffer = [message]
+            self.__start_loading()
+            return False
+
+    def load_snapshot(self, depth):
+        """
+        Loads a snapshot obtained outside of the synchronizer and replays the buffered diffs on top of it.
+        :return: True if the order book is synchronized.
+        """
+        with self._lock:
+            return self.__replay_buffer(depth)
+
+    def invalidate(self):
+        with self._lock:
+            self.synchronized = False
+            self.buffer = []
+
+    def __apply(self, message):
+        last_update_id = self.order_book.last_update_id
+        if message.final_update_id <= last_update_id:
+            return DROPPED
+        if self.awaiting_first_update:
+            if message.first_update_id > last_update_id + 1:
+                return GAP
+            self.awaiting_first_update = False
+        elif message.first_update_id != last_update_id + 1:
+            return GAP
+        self.order_book.apply_depth_update(message)
+        return APPLIED
+
+    def __start_loading(self):
+        if not self.loading and self.snapshot_loader is not None:
+            self.loading = True
+            threading.Thread(target=self.__load_snapshot, daemon=True).start()
+
+    def __load_snapshot(self):
+        symbol = self.order_book.symbol
+        while True:
+            depth = self.snapshot_loader(symbol)
+            if depth is not None:
+                with self._lock:
+                    if self.__replay_buffer(depth):
+                        self.loading = False
+                        logging.info(f"Order book of {symbol} synchronized at update {depth['lastUpdateId']}")
+                        return
+                logging.warning(f"Snapshot of {symbol} does not match the buffered diffs, reloading")
+            time.sleep(self.retry_delay)
+
+    def __replay_buffer(self, depth):
+        self.order_book.load_snapshot(depth)
+        self.awaiting_first_update = True
+        for message in self.buffer:
+            if self.__apply(message) == GAP:
+                return False
+        self.buffer = []
+        self.synchronized = True
+        return True
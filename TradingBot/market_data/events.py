@@ -0,0 +1,142 @@
+import json
+import sys
+from decimal import Decimal
+
+DEPTH_UPDATE = 'depthUpdate'
+TRADE = 'trade'
+KLINE = 'kline'
+
+
+class DepthUpdateEvent:
+    """
+    Decoded depthUpdate frame. Level arrays are kept as received, with interned price strings,
+    and are only parsed the first time `bids`/`asks` are read, so that every subscriber shares one decode.
+    """
+    __slots__ = ('symbol', 'event_time', 'first_update_id', 'final_update_id', 'raw_bids', 'raw_asks',
+                 'parse_price', 'parse_quantity', '_bids', '_asks')
+
+    event_type = DEPTH_UPDATE
+
+    def __init__(self, symbol, event_time, first_update_id, final_update_id, raw_bids, raw_asks,
+                 parse_price=Decimal, parse_quantity=Decimal):
+        self.symbol = symbol
+        self.event_time = event_time
+        self.first_update_id = first_update_id
+        self.final_update_id = final_update_id
+        self.raw_bids = raw_bids
+        self.raw_asks = raw_asks
+        self.parse_price = parse_price
+        self.parse_quantity = parse_quantity
+        self._bids = None
+        self._asks = None
+
+    @property
+    def bids(self):
+        if self._bids is None:
+            self._bids = self.__parse(self.raw_bids)
+        return self._bids
+
+    @property
+    def asks(self):
+        if self._asks is None:
+            self._asks = self.__parse(self.raw_asks)
+        return self._asks
+
+    def __parse(self, levels):
+        parse_price, parse_quantity = self.parse_price, self.parse_quantity
+        return [(parse_price(price), parse_quantity(qty)) for price, qty in levels]
+
+
+class TradeEvent:
+    """
+    :param buyer_maker: True when the seller took liquidity (the trade consumed bids), None if unknown.
+    """
+    __slots__ = ('symbol', 'event_time', 'price', 'quantity', 'buyer_maker')
+
+    event_type = TRADE
+
+    def __init__(self, symbol, event_time, price, quantity, buyer_maker=None):
+        self.symbol = symbol
+        self.event_time = event_time
+        self.price = price
+        self.quantity = quantity
+        self.buyer_maker = buyer_maker
+
+
+class KlineEvent:
+    """
+    Decoded kline frame: the state of the candle opened at open_time, `closed` once the candle is final.
+    Prices and volumes are kept as received.
+    """
+    __slots__ = ('symbol', 'event_time', 'interval', 'open_time', 'close_time', 'open', 'high', 'low', 'close',
+                 'volume', 'quote_volume', 'trades', 'taker_buy_volume', 'taker_buy_quote_volume', 'closed')
+
+    event_type = KLINE
+
+    def __init__(self, symbol, event_time, interval, open_time, close_time, open, high, low, close, volume,
+                 quote_volume, trades, taker_buy_volume, taker_buy_quote_volume, closed):
+        self.symbol = symbol
+        self.event_time = event_time
+        self.interval = interval
+        self.open_time = open_time
+        self.close_time = close_time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.quote_volume = quote_volume
+        self.trades = trades
+        self.taker_buy_volume = taker_buy_volume
+        self.taker_buy_quote_volume = taker_buy_quote_volume
+        self.closed = closed
+
+    def kline(self):
+        """
+        :return: the candle in the layout of the REST klines endpoint.
+        """
+        return [self.open_time, self.open, self.high, self.low, self.close, self.volume, self.close_time,
+                self.quote_volume, self.trades, self.taker_buy_volume, self.taker_buy_quote_volume, '0']
+
+
+class MarketDataDecoder:
+    """
+    Decodes each combined stream frame once into a DepthUpdateEvent, a TradeEvent or a KlineEvent.
+    Depth levels are parsed with the parsers registered for the symbol (the order book ones).
+    """
+
+    def __init__(self):
+        self.parsers = {}
+
+    def register_parsers(self, symbol, parse_price, parse_quantity):
+        self.parsers[symbol] = (parse_price, parse_quantity)
+
+    def decode(self, frame):
+        payload = json.loads(frame).get('data')
+        if payload is None:
+            # Answer to a SUBSCRIBE/UNSUBSCRIBE control message
+            return None
+        return self.decode_payload(payload)
+
+    def decode_payload(self, payload):
+        event_type = payload['e']
+        symbol = payload['s']
+        if event_type == DEPTH_UPDATE:
+            parse_price, parse_quantity = self.parsers.get(symbol, (Decimal, Decimal))
+            return DepthUpdateEvent(symbol, payload['E'], payload['U'], payload['u'],
+                                    intern_levels(payload['b']), intern_levels(payload['a']),
+                                    parse_price, parse_quantity)
+        if event_type == TRADE:
+            return TradeEvent(symbol, payload['E'], payload['p'], payload['q'], payload.get('m'))
+        if event_type == KLINE:
+            kline = payload['k']
+            return KlineEvent(symbol, payload['E'], kline['i'], kline['t'], kline['T'], kline['o'], kline['h'],
+                              kline['l'], kline['c'], kline['v'], kline['q'], kline['n'], kline['V'], kline['Q'],
+                              kline['x'])
+        return None
+
+
+def intern_levels(levels):
+    # The same prices come back in most frames, interning them keeps merges and lookups cheap
+    intern = sys.intern
+    return [(intern(price), qty) for price, qty in levels]
@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+
+class FixedPointScale:
+    """
+    Scaled integer representation of a symbol: prices are counted in ticks and quantities in steps.
+    Parsing goes straight from the exchange strings to int, without building Decimal objects.
+    """
+
+    def __init__(self, tick_size, step_size):
+        self.tick_size = Decimal(tick_size).normalize()
+        self.step_size = Decimal(step_size).normalize()
+        self.parse_price = self.__parser(self.tick_size)
+        self.parse_quantity = self.__parser(self.step_size)
+
+    @staticmethod
+    def __parser(unit):
+        # unit = divisor * 10^-decimals with an integer divisor
+        decimals = max(-unit.as_tuple().exponent, 0)
+        factor = 10 ** decimals
+        divisor = int(unit.scaleb(decimals))
+        # float parsing is the cheapest conversion available and is exact once rounded to the unit,
+        # exchange values stay far below 2^53 units
+        if divisor == 1:
+            return lambda text: round(float(text) * factor)
+        return lambda text: round(float(text) * factor) // divisor
+
+    def price_to_ticks(self, price):
+        return int(Decimal(price) // self.tick_size)
+
+    def quantity_to_steps(self, quantity):
+        # Rounded up so that `steps >= quantity_to_steps(q)` is equivalent to `quantity >= q`
+        steps = Decimal(quantity) / self.step_size
+        return int(steps) + (1 if steps != int(steps) else 0)
+
+    def to_price(self, ticks):
+        return ticks * self.tick_size if ticks is not None else None
+
+    def to_quantity(self, steps):
+        return steps * self.step_size if steps is not None else None
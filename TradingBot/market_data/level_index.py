@@ -0,0 +1,132 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+BLOCK_SIZE = 64
+# Below any quantity, marks the leaves of the tree without block
+EMPTY = -1.0
+
+
+class MaxQuantityTree:
+    """
+    Max quantity index over the live price levels of one book side, keyed by the exact price keys of the book.
+    Levels are kept sorted in blocks of at most `block_size` levels, and a max segment tree over the blocks answers
+    "highest/lowest level with quantity >= X" in O(log n) for any X: the tree finds the block, the block is then
+    scanned. Memory is linear in the number of levels whatever their price span, and no tick size is needed.
+    """
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        # Sorted keys and quantities of each block, and the first key of each block to find the block of a key
+        self.keys = []
+        self.quantities = []
+        self.firsts = []
+        self.size = 0
+        self.tree = array('d')
+
+    def rebuild(self, levels):
+        """
+        :param levels: (key, quantity) of the whole side, sorted by key.
+        """
+        # Half full blocks, so that the next levels are inserted without splitting them
+        step = max(self.block_size // 2, 1)
+        levels = [(key, quantity) for key, quantity in levels if quantity > 0]
+        self.keys = [[key for key, _ in levels[start:start + step]] for start in range(0, len(levels), step)]
+        self.quantities = [array('d', (quantity for _, quantity in levels[start:start + step]))
+                           for start in range(0, len(levels), step)]
+        self.__rebuild_tree()
+
+    def update(self, key, quantity):
+        """
+        Sets the quantity of a level, a quantity of 0 removes it.
+        """
+        if not self.keys:
+            if quantity > 0:
+                self.keys, self.quantities = [[key]], [array('d', [quantity])]
+                self.__rebuild_tree()
+            return
+        block = max(bisect_right(self.firsts, key) - 1, 0)
+        keys, quantities = self.keys[block], self.quantities[block]
+        position = bisect_left(keys, key)
+        found = position < len(keys) and keys[position] == key
+        if quantity > 0:
+            if found:
+                quantities[position] = quantity
+            else:
+                keys.insert(position, key)
+                quantities.insert(position, quantity)
+                if len(keys) > self.block_size:
+                    half = len(keys) // 2
+                    self.keys[block + 1:block + 1] = [keys[half:]]
+                    self.quantities[block + 1:block + 1] = [quantities[half:]]
+                    del keys[half:]
+                    del quantities[half:]
+                    self.__rebuild_tree()
+                    return
+        elif found:
+            del keys[position]
+            del quantities[position]
+            if not keys:
+                del self.keys[block]
+                del self.quantities[block]
+                self.__rebuild_tree()
+                return
+        else:
+            return
+        self.firsts[block] = keys[0]
+        self.__set_block_max(block, max(quantities))
+
+    def find_highest(self, min_quantity):
+        block = self.__find_block(min_quantity, highest=True)
+        if block is None:
+            return None
+        quantities = self.quantities[block]
+        for position in range(len(quantities) - 1, -1, -1):
+            if quantities[position] >= min_quantity:
+                return self.keys[block][position]
+
+    def find_lowest(self, min_quantity):
+        block = self.__find_block(min_quantity, highest=False)
+        if block is None:
+            return None
+        quantities = self.quantities[block]
+        for position in range(len(quantities)):
+            if quantities[position] >= min_quantity:
+                return self.keys[block][position]
+
+    def __find_block(self, min_quantity, highest):
+        tree = self.tree
+        if not self.size or tree[1] < min_quantity:
+            return None
+        position = 1
+        while position < self.size:
+            position *= 2
+            if highest:
+                if tree[position + 1] >= min_quantity:
+                    position += 1
+            elif tree[position] < min_quantity:
+                position += 1
+        return position - self.size
+
+    def __rebuild_tree(self):
+        self.firsts = [keys[0] for keys in self.keys]
+        size = 1
+        while size < len(self.keys):
+            size <<= 1
+        tree = array('d', [EMPTY]) * (2 * size)
+        for block, quantities in enumerate(self.quantities):
+            tree[size + block] = max(quantities)
+        for position in range(size - 1, 0, -1):
+            tree[position] = max(tree[2 * position], tree[2 * position + 1])
+        self.size = size if self.keys else 0
+        self.tree = tree
+
+    def __set_block_max(self, block, quantity):
+        tree = self.tree
+        position = block + self.size
+        if tree[position] == quantity:
+            return
+        tree[position] = quantity
+        position >>= 1
+        while position:
+            tree[position] = max(tree[2 * position], tree[2 * position + 1])
+            position >>= 1
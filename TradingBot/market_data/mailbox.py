@@ -0,0 +1,106 @@
+import queue
+import threading
+from collections import deque
+
+from market_data.events import DepthUpdateEvent, TradeEvent
+
+TRADE_SLOT = 'trade'
+DEPTH_SLOT = 'depthUpdate'
+
+
+class ConflatingMailbox:
+    """
+    Market data mailbox of a trader, used in place of a bounded queue.Queue.
+    Pending trades collapse to the latest one and pending depth diffs merge level by level into
+    one net diff, so a slow consumer receives fewer, larger updates and nothing is ever dropped.
+    Any other message is delivered as is, in arrival order.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # Slots in the order in which they became pending: TRADE_SLOT, DEPTH_SLOT or a plain message
+        self._pending = deque()
+        self._trade = None
+        self._depth = None
+        self._last_depth = None
+        self._bids = None
+        self._asks = None
+
+    def put_nowait(self, message):
+        with self._condition:
+            if isinstance(message, TradeEvent):
+                if self._trade is None:
+                    self._pending.append(TRADE_SLOT)
+                self._trade = message
+            elif isinstance(message, DepthUpdateEvent):
+                if self._depth is None:
+                    self._pending.append(DEPTH_SLOT)
+                    self._depth = message
+                else:
+                    self.__merge_depth(message)
+            else:
+                self._pending.append(message)
+            self._condition.notify()
+
+    put = put_nowait
+
+    def __merge_depth(self, message):
+        if self._bids is None:
+            self._bids = dict(self._depth.raw_bids)
+            self._asks = dict(self._depth.raw_asks)
+            self._last_depth = self._depth
+        # Price strings are interned by the decoder, merging is a plain dict update per level
+        self._bids.update(message.raw_bids)
+        self._asks.update(message.raw_asks)
+        self._last_depth = message
+
+    def get(self, block=True, timeout=None):
+        with self._condition:
+            if not self._pending:
+                if not block or not self._condition.wait_for(lambda: self._pending, timeout=timeout):
+                    raise queue.Empty
+            slot = self._pending.popleft()
+            if slot is TRADE_SLOT:
+                message, self._trade = self._trade, None
+            elif slot is DEPTH_SLOT:
+                message = self.__pop_depth()
+            else:
+                message = slot
+            return message
+
+    def drain(self, timeout=None):
+        """
+        Waits for pending messages then takes all of them at once.
+        :return: the merged depth diff, the latest trade and the other messages in arrival order.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._pending, timeout=timeout):
+                raise queue.Empty
+            messages = [slot for slot in self._pending if slot is not TRADE_SLOT and slot is not DEPTH_SLOT]
+            self._pending.clear()
+            depth = self.__pop_depth() if self._depth is not None else None
+            trade, self._trade = self._trade, None
+            return depth, trade, messages
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def __pop_depth(self):
+        message = self._depth
+        if self._bids is not None:
+            last = self._last_depth
+            message = DepthUpdateEvent(message.symbol, last.event_time, message.first_update_id,
+                                       last.final_update_id, list(self._bids.items()), list(self._asks.items()),
+                                       message.parse_price, message.parse_quantity)
+        self._depth = self._last_depth = self._bids = self._asks = None
+        return message
+
+    def task_done(self):
+        pass
+
+    def qsize(self):
+        with self._condition:
+            return len(self._pending)
+
+    def empty(self):
+        return self.qsize() == 0
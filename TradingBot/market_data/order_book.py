@@ -0,0 +1,131 @@
+import threading
+from decimal import Decimal
+
+from sortedcontainers import SortedDict
+
+from market_data.fixed_point import FixedPointScale
+from market_data.level_index import MaxQuantityTree
+
+
+class OrderBook:
+    """
+    Authoritative order book of a symbol, shared by every trader of that symbol.
+    Only the TraderManager applies depth diffs; traders read it while holding `lock`.
+
+    Prices and quantities are stored as Decimal, or as ticks and steps (int) in fixed point mode.
+    Readers get keys in the book representation and convert them with `to_price`/`to_quantity`.
+    """
+
+    def __init__(self, symbol, limit=5000, tick_size=None, step_size=None, fixed_point=False):
+        self.symbol = symbol
+        self.limit = limit
+        self.tick_size = Decimal(tick_size).normalize() if tick_size is not None else None
+        self.scale = None
+        if fixed_point:
+            if tick_size is None or step_size is None:
+                raise ValueError(f"Fixed point order book of {symbol} requires the tick size and the step size")
+            self.scale = FixedPointScale(tick_size, step_size)
+            self.parse_price = self.scale.parse_price
+            self.parse_quantity = self.scale.parse_quantity
+        else:
+            self.parse_price = Decimal
+            self.parse_quantity = Decimal
+        self.lock = threading.RLock()
+        self.last_update_id = None
+        self._bids = SortedDict()
+        self._asks = SortedDict()
+        # Max quantity index of the live levels of each side, to find support/resistance levels in O(log n)
+        self._bid_index = MaxQuantityTree()
+        self._ask_index = MaxQuantityTree()
+
+    @property
+    def fixed_point(self):
+        return self.scale is not None
+
+    @property
+    def bids(self):
+        return self._bids.items()
+
+    @property
+    def asks(self):
+        return self._asks.items()
+
+    def price_key(self, price):
+        return self.scale.price_to_ticks(price) if self.scale is not None else Decimal(price)
+
+    def quantity_key(self, quantity):
+        return self.scale.quantity_to_steps(quantity) if self.scale is not None else Decimal(quantity)
+
+    def to_price(self, key):
+        return self.scale.to_price(key) if self.scale is not None else key
+
+    def to_quantity(self, key):
+        return self.scale.to_quantity(key) if self.scale is not None else key
+
+    def load_snapshot(self, depth):
+        with self.lock:
+            parse_price, parse_quantity = self.parse_price, self.parse_quantity
+            self._bids = SortedDict({parse_price(bid[0]): parse_quantity(bid[1]) for bid in depth['bids']})
+            self._asks = SortedDict({parse_price(ask[0]): parse_quantity(ask[1]) for ask in depth['asks']})
+            self.last_update_id = depth['lastUpdateId']
+            self.__trim(self._bids, 0)
+            self.__trim(self._asks, -1)
+            self._bid_index.rebuild([(price, float(qty)) for price, qty in self._bids.items()])
+            self._ask_index.rebuild([(price, float(qty)) for price, qty in self._asks.items()])
+
+    def apply_depth_update(self, event):
+        """
+        :param event: DepthUpdateEvent decoded with this book's parsers.
+        """
+        with self.lock:
+            self.__apply_levels(self._bids, self._bid_index, event.bids, 0)
+            self.__apply_levels(self._asks, self._ask_index, event.asks, -1)
+            self.last_update_id = event.final_update_id
+
+    def __trim(self, side, position):
+        """
+        :return: the prices of the levels dropped beyond the limit.
+        """
+        trimmed = []
+        while len(side) > self.limit:
+            price, _ = side.popitem(position)
+            trimmed.append(price)
+        return trimmed
+
+    def __apply_levels(self, side, index, levels, worst_position):
+        for price, qty in levels:
+            if qty == 0:
+                side.pop(price, None)
+            else:
+                side[price] = qty
+        # The side is trimmed before indexing, levels beyond the limit never reach the index
+        for price in self.__trim(side, worst_position):
+            index.update(price, 0)
+        for price, _ in levels:
+            index.update(price, float(side.get(price, 0)))
+
+    def bid_quantity(self, price):
+        return self._bids.get(price)
+
+    def ask_quantity(self, price):
+        return self._asks.get(price)
+
+    def bid_depth_index(self, price):
+        return len(self._bids) - self._bids.index(price) + 1
+
+    def find_support(self, min_quantity):
+        """
+        :param min_quantity: quantity in the book representation, see `quantity_key`.
+        :return: price and quantity keys of the highest bid holding at least min_quantity.
+        """
+        price = self._bid_index.find_highest(float(min_quantity))
+        if price is None:
+            return None, None
+        return price, self._bids[price]
+
+    def find_resistance(self, min_quantity):
+        """
+        :param min_quantity: quantity in the book representation, see `quantity_key`.
+        :return: price key of the lowest ask holding at least min_quantity.
+        """
+        return self._ask_index.find_lowest(float(min_quantity))
@@ -0,0 +1,243 @@
+import bisect
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+FRAME = 'frame'
+SNAPSHOT = 'snapshot'
+KEYFRAME = 'keyframe'
+FILE_SUFFIX = '.rec.gz'
+INDEX_SUFFIX = '.idx'
+
+
+def current_time_ms():
+    return time.time_ns() // 1_000_000
+
+
+def recording_file_name(symbol, period_start_ms):
+    return symbol + '-' + time.strftime('%Y%m%d-%H%M%S', time.gmtime(period_start_ms / 1000)) + FILE_SUFFIX
+
+
+def recording_files(directory, symbol):
+    # File names embed the UTC period start, name order is time order
+    return sorted(glob.glob(os.path.join(directory, symbol, symbol + '-*' + FILE_SUFFIX)))
+
+
+def read_records(path, offset=0):
+    """
+    :param offset: position of a gzip member in the file, see `read_index`.
+    :return: an iterator over the (receive_ms, kind, payload) records of a capture file, in recording order.
+    """
+    with open(path, 'rb') as raw_file:
+        raw_file.seek(offset)
+        with gzip.open(raw_file, 'rt', encoding='utf-8') as file:
+            for line in file:
+                received_at, kind, payload = line.rstrip('\n').split('\t', 2)
+                yield int(received_at), kind, payload
+
+
+def read_index(path):
+    """
+    :return: the (receive_ms, offset) of the snapshots and keyframes of a capture file, in recording order.
+    """
+    index_path = path + INDEX_SUFFIX
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, 'r') as file:
+        return [tuple(int(value) for value in line.split('\t')) for line in file if line.strip()]
+
+
+def seek_records(directory, symbol, timestamp_ms):
+    """
+    Starts reading the recordings of a symbol at the last snapshot or keyframe received at or before timestamp_ms,
+    the whole recording is read if there is none.
+    :return: an iterator over the (receive_ms, kind, payload) records from there, across capture files.
+    """
+    paths = recording_files(directory, symbol)
+    start_file, start_offset = 0, 0
+    for file_position in range(len(paths) - 1, -1, -1):
+        index = read_index(paths[file_position])
+        position = bisect.bisect_right([received_at for received_at, offset in index], timestamp_ms)
+        if position > 0:
+            start_file, start_offset = file_position, index[position - 1][1]
+            break
+    for file_position in range(start_file, len(paths)):
+        yield from read_records(paths[file_position], start_offset if file_position == start_file else 0)
+
+
+def keyframe_times(directory, symbol):
+    """
+    :return: receive times of the snapshots and keyframes of a symbol, the points a reader can start from.
+    """
+    return [received_at for path in recording_files(directory, symbol) for received_at, offset in read_index(path)]
+
+
+def order_book_at(directory, symbol, timestamp_ms, limit=5000):
+    """
+    Rebuilds the order book of a symbol as it was at timestamp_ms, from the nearest keyframe before it.
+    :return: the OrderBook, or None if no snapshot or keyframe precedes timestamp_ms.
+    """
+    from market_data.depth_sync import DepthSynchronizer
+    from market_data.events import DEPTH_UPDATE, DepthUpdateEvent, MarketDataDecoder
+    from market_data.order_book import OrderBook
+
+    order_book = OrderBook(symbol=symbol, limit=limit)
+    synchronizer = DepthSynchronizer(order_book)
+    decoder = MarketDataDecoder()
+    for received_at, kind, payload in seek_records(directory, symbol, timestamp_ms):
+        if received_at > timestamp_ms:
+            break
+        if kind == SNAPSHOT or kind == KEYFRAME:
+            synchronizer.load_snapshot(json.loads(payload))
+        elif order_book.last_update_id is not None and DEPTH_UPDATE in payload:
+            # Trades do not change the book, they are not even decoded
+            event = decoder.decode(payload)
+            if isinstance(event, DepthUpdateEvent):
+                synchronizer.on_depth_update(event)
+    return order_book if order_book.last_update_id is not None else None
+
+
+class CaptureFile:
+
+    def __init__(self, period_start, path):
+        self.period_start = period_start
+        self.path = path
+        self.file = None
+        self.member_start = 0
+        self.records = 0
+
+    def open(self, compress_level):
+        # The new member starts where the file currently ends
+        self.member_start = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self.file = gzip.open(self.path, 'at', compresslevel=compress_level, encoding='utf-8')
+        self.records = 0
+
+
+class MarketDataRecorder:
+    """
+    Captures the raw market data of every symbol for later replay.
+    Each record is one `receive_ms<TAB>kind<TAB>payload` line, where kind is `frame` (a combined stream frame
+    exactly as received), `snapshot` (a REST depth snapshot) or `keyframe` (the synchronized order book, written
+    every `keyframe_seconds`). Lines are written to gzip files rotated every `rotation_minutes`, under one
+    directory per symbol.
+
+    Snapshots and keyframes start a new gzip member, whose offset is appended to the `.idx` file next to the
+    capture file: readers can decompress from any of them without reading what precedes (see `seek_records`).
+
+    Recording only enqueues the line: compression and disk writes happen on a background thread so that the
+    receive loop never waits on them.
+    """
+
+    def __init__(self, directory, rotation_minutes=60, compress_level=6, keyframe_seconds=30):
+        self.directory = directory
+        self.rotation_ms = rotation_minutes * 60 * 1000
+        self.compress_level = compress_level
+        self.keyframe_ms = keyframe_seconds * 1000
+        self._queue = queue.SimpleQueue()
+        self._files = {}
+        self._last_keyframes = {}
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.__write_records, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def record_frame(self, symbol, frame, received_at=None):
+        self._queue.put((symbol, received_at or current_time_ms(), FRAME, frame))
+
+    def record_snapshot(self, symbol, depth, received_at=None):
+        received_at = received_at or current_time_ms()
+        self._last_keyframes[symbol] = received_at
+        self._queue.put((symbol, received_at, SNAPSHOT, json.dumps(depth, separators=(',', ':'))))
+
+    def keyframe_due(self, symbol, received_at):
+        """
+        :return: True if the book of symbol should be recorded, every keyframe_seconds and in every capture file.
+        """
+        last_keyframe = self._last_keyframes.get(symbol)
+        return (last_keyframe is None or received_at - last_keyframe >= self.keyframe_ms
+                or received_at // self.rotation_ms != last_keyframe // self.rotation_ms)
+
+    def record_keyframe(self, symbol, order_book, received_at=None):
+        """
+        Records the synchronized order book, to be called right after the diff it must include has been applied.
+        Levels are copied here, they are formatted on the writer thread.
+        """
+        received_at = received_at or current_time_ms()
+        self._last_keyframes[symbol] = received_at
+        with order_book.lock:
+            levels = (order_book.last_update_id, list(order_book.bids), list(order_book.asks))
+        self._queue.put((symbol, received_at, KEYFRAME, (order_book, levels)))
+
+    def close(self):
+        """
+        Writes everything recorded so far and closes the capture files.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def __write_records(self):
+        while True:
+            record = self._queue.get()
+            try:
+                if record is None:
+                    break
+                self.__write(*record)
+            except Exception as e:
+                logging.error(f"Error writing market data record", exc_info=True)
+        for current in self._files.values():
+            current.file.close()
+        self._files = {}
+
+    def __write(self, symbol, received_at, kind, payload):
+        if kind == KEYFRAME:
+            payload = keyframe_payload(*payload)
+        current = self.__current(symbol, received_at)
+        if kind == SNAPSHOT or kind == KEYFRAME:
+            self.__start_member(current, received_at)
+        current.file.write(f'{received_at}\t{kind}\t{payload}\n')
+        current.records += 1
+
+    def __start_member(self, current, received_at):
+        if current.records > 0:
+            # Appending adds a gzip member, that can be decompressed on its own
+            current.file.close()
+            current.open(self.compress_level)
+        with open(current.path + INDEX_SUFFIX, 'a') as index_file:
+            index_file.write(f'{received_at}\t{current.member_start}\n')
+
+    def __current(self, symbol, received_at):
+        period_start = received_at - received_at % self.rotation_ms
+        current = self._files.get(symbol)
+        if current is not None:
+            # Records queued by other threads can arrive slightly out of order, files only rotate forward
+            if period_start <= current.period_start:
+                return current
+            current.file.close()
+        symbol_directory = os.path.join(self.directory, symbol)
+        os.makedirs(symbol_directory, exist_ok=True)
+        path = os.path.join(symbol_directory, recording_file_name(symbol, period_start))
+        # Appending adds a gzip member, a restarted recorder keeps the file readable as one stream
+        current = CaptureFile(period_start, path)
+        current.open(self.compress_level)
+        self._files[symbol] = current
+        logging.info(f"Recording {symbol} market data to {path}")
+        return current
+
+
+def keyframe_payload(order_book, levels):
+    last_update_id, bids, asks = levels
+    to_price, to_quantity = order_book.to_price, order_book.to_quantity
+    return json.dumps({
+        'lastUpdateId': last_update_id,
+        'bids': [[str(to_price(price)), str(to_quantity(quantity))] for price, quantity in reversed(bids)],
+        'asks': [[str(to_price(price)), str(to_quantity(quantity))] for price, quantity in asks]
+    }, separators=(',', ':'))
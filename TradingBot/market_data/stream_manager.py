@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+import websockets
+
+# Binance limits: 1024 streams per connection and 5 incoming messages per second
+MAX_STREAMS_PER_CONNECTION = 1024
+CONTROL_MESSAGE_INTERVAL = 0.25
+STREAMS_PER_CONTROL_MESSAGE = 200
+RECONNECT_DELAY = 5
+
+
+def symbol_streams(symbol):
+    lower_symbol = symbol.lower()
+    return [lower_symbol + '@depth@100ms', lower_symbol + '@trade']
+
+
+def kline_stream(symbol, interval):
+    return symbol.lower() + '@kline_' + interval
+
+
+class StreamConnection:
+
+    def __init__(self, manager, connection_id):
+        self.manager = manager
+        self.connection_id = connection_id
+        self.streams = set()
+        self.websocket = None
+        self.closed = False
+        self.last_control_time = 0
+        self.task = None
+
+    async def run(self):
+        url = self.manager.websocket_url + '/stream'
+        while not self.closed:
+            try:
+                async with websockets.connect(url) as websocket:
+                    logging.info(f'Connected to WebSocket {url} (connection {self.connection_id})')
+                    self.websocket = websocket
+                    await self.send_control('SUBSCRIBE', sorted(self.streams))
+                    while not self.closed:
+                        message = await websocket.recv()
+                        if isinstance(message, bytes):
+                            await websocket.pong(message)
+                        else:
+                            self.manager.on_frame(message)
+            except (websockets.ConnectionClosedError, websockets.ConnectionClosed):
+                if not self.closed:
+                    logging.error(f"Connection {self.connection_id} lost. Try to reconnect")
+            except Exception as e:
+                logging.error(f"Unexpected error occurred on connection {self.connection_id}", exc_info=True)
+            finally:
+                self.websocket = None
+            if not self.closed:
+                self.manager.on_disconnect(list(self.streams))
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def send_control(self, method, streams):
+        websocket = self.websocket
+        if websocket is None:
+            # Everything subscribed so far is sent again on connection
+            return
+        for start in range(0, len(streams), STREAMS_PER_CONTROL_MESSAGE):
+            wait = self.last_control_time + CONTROL_MESSAGE_INTERVAL - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.last_control_time = time.monotonic()
+            await websocket.send(json.dumps({
+                'method': method,
+                'params': streams[start:start + STREAMS_PER_CONTROL_MESSAGE],
+                'id': self.manager.next_request_id()
+            }))
+
+    async def close(self):
+        self.closed = True
+        if self.websocket is not None:
+            await self.websocket.close()
+
+
+class StreamConnectionManager:
+    """
+    Multiplexes the market data streams of every symbol on as few combined stream connections as the
+    per-connection stream limit allows. All connections are served by one asyncio loop on one thread,
+    and streams are added or removed at runtime with SUBSCRIBE/UNSUBSCRIBE control messages.
+    """
+
+    def __init__(self, websocket_url, on_frame, on_disconnect, max_streams_per_connection=MAX_STREAMS_PER_CONNECTION):
+        self.websocket_url = websocket_url
+        self.on_frame = on_frame
+        self.on_disconnect = on_disconnect
+        self.max_streams_per_connection = max_streams_per_connection
+        self.connections = []
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self._request_id = 0
+        self._connection_id = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def next_request_id(self):
+        self._request_id += 1
+        return self._request_id
+
+    def subscribe(self, streams):
+        return asyncio.run_coroutine_threadsafe(self.__subscribe(list(streams)), self.loop)
+
+    def unsubscribe(self, streams):
+        return asyncio.run_coroutine_threadsafe(self.__unsubscribe(list(streams)), self.loop)
+
+    async def __subscribe(self, streams):
+        subscribed = {stream for connection in self.connections for stream in connection.streams}
+        streams = [stream for stream in streams if stream not in subscribed]
+        while streams:
+            connection = next((c for c in self.connections
+                               if len(c.streams) < self.max_streams_per_connection), None)
+            if connection is None:
+                self._connection_id += 1
+                connection = StreamConnection(self, self._connection_id)
+                self.connections.append(connection)
+                connection.task = self.loop.create_task(connection.run())
+            free = self.max_streams_per_connection - len(connection.streams)
+            added, streams = streams[:free], streams[free:]
+            connection.streams.update(added)
+            await connection.send_control('SUBSCRIBE', added)
+
+    async def __unsubscribe(self, streams):
+        for connection in list(self.connections):
+            removed = [stream for stream in streams if stream in connection.streams]
+            if not removed:
+                continue
+            connection.streams.difference_update(removed)
+            if connection.streams:
+                await connection.send_control('UNSUBSCRIBE', removed)
+            else:
+                self.connections.remove(connection)
+                await connection.close()
@@ -0,0 +1,334 @@
+import itertools
+import logging
+import queue
+import threading
+from decimal import Decimal
+
+from date.clock import WALL_CLOCK
+from market_data.events import DepthUpdateEvent, TradeEvent
+from simulation.fill_model import walk_book
+from simulation.queue_position import QueuePositionTracker
+
+BUY = 'BUY'
+SELL = 'SELL'
+MARKET = 'MARKET'
+LIMIT = 'LIMIT'
+
+NEW = 'NEW'
+TRADE = 'TRADE'
+PARTIALLY_FILLED = 'PARTIALLY_FILLED'
+FILLED = 'FILLED'
+CANCELED = 'CANCELED'
+EXPIRED = 'EXPIRED'
+
+QUOTE_ASSETS = ('USDT', 'FDUSD', 'USDC', 'BUSD', 'TUSD', 'BTC', 'ETH', 'BNB')
+
+
+def split_symbol(symbol):
+    for quote_asset in QUOTE_ASSETS:
+        if symbol.endswith(quote_asset) and len(symbol) > len(quote_asset):
+            return symbol[:-len(quote_asset)], quote_asset
+    return symbol, ''
+
+
+class SimulatedOrder:
+
+    def __init__(self, order_id, symbol, side, order_type, quantity, price, time_in_force, created_at, account=None):
+        self.order_id = order_id
+        self.account = account
+        self.client_order_id = f'simulated-{order_id}'
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.quantity = quantity
+        self.price = price
+        self.time_in_force = time_in_force
+        self.created_at = created_at
+        self.updated_at = created_at
+        self.status = NEW
+        self.executed_quantity = Decimal('0')
+        self.quote_quantity = Decimal('0')
+
+    @property
+    def remaining(self):
+        return self.quantity - self.executed_quantity
+
+    @property
+    def active(self):
+        return self.status == NEW or self.status == PARTIALLY_FILLED
+
+    def crosses(self, price):
+        return price <= self.price if self.side == BUY else price >= self.price
+
+    def trades_through(self, price):
+        return price < self.price if self.side == BUY else price > self.price
+
+    def to_dict(self):
+        return {
+            'symbol': self.symbol,
+            'orderId': self.order_id,
+            'clientOrderId': self.client_order_id,
+            'price': str(self.price or Decimal('0')),
+            'origQty': str(self.quantity),
+            'executedQty': str(self.executed_quantity),
+            'cummulativeQuoteQty': str(self.quote_quantity),
+            'status': self.status,
+            'timeInForce': self.time_in_force,
+            'type': self.order_type,
+            'side': self.side,
+            'time': self.created_at,
+            'updateTime': self.updated_at
+        }
+
+
+class SimulatedAccount:
+    """
+    Client of one trader on a shared SimulatedSpotClient. Its orders are only reported to the listeners of the
+    account, and the volume of a trade is shared between the resting orders of the account only: traders
+    replayed side by side do not see or compete with each other's orders.
+    """
+
+    def __init__(self, exchange, name):
+        self.exchange = exchange
+        self.name = name
+
+    def exchange_info(self, symbol=None, **kwargs):
+        return self.exchange.exchange_info(symbol=symbol, **kwargs)
+
+    def new_order(self, symbol, side, type, **kwargs):
+        return self.exchange.new_order(symbol, side, type, account=self.name, **kwargs)
+
+    def get_order(self, symbol, orderId=None, **kwargs):
+        return self.exchange.get_order(symbol, orderId=orderId, account=self.name, **kwargs)
+
+    def cancel_order(self, symbol, orderId=None, **kwargs):
+        return self.exchange.cancel_order(symbol, orderId=orderId, account=self.name, **kwargs)
+
+
+class SimulatedSpotClient:
+    """
+    In-process stand-in for binance.spot.Spot, matching orders against the order books fed by the live or
+    replayed market data. Every order change is published as an executionReport to the listeners, the same
+    message the user data stream delivers, so traders handle simulated and real fills with the same code.
+
+    MARKET orders and the marketable part of LIMIT orders take liquidity from the opposite side of the book.
+    The rest of a GTC LIMIT order rests and fills at its limit price once the opposite side of the book crosses
+    it, once trades print through it, or once trades at its price have consumed the queue ahead of it
+    (see QueuePositionTracker). Without a book, trades at the limit price fill it directly.
+    """
+
+    def __init__(self, order_books, clock=None, fee_rate=Decimal('0.001'), min_notional=Decimal('5')):
+        self.order_books = order_books
+        self.clock = clock or WALL_CLOCK
+        self.fee_rate = fee_rate
+        self.min_notional = min_notional
+        self.listeners = []
+        self.account_listeners = {}
+        self.accounts = {}
+        self.orders = {}
+        # Resting orders per symbol
+        self.open_orders = {}
+        # Queue ahead of the resting orders per symbol
+        self.queue_trackers = {}
+        self.last_prices = {}
+        self._order_ids = itertools.count(1)
+        self._trade_ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def add_listener(self, q, account=None):
+        """
+        :param account: only reports the orders of this account, and the orders placed without account.
+        Every order is reported if None.
+        """
+        if account is None:
+            self.listeners.append(q)
+        else:
+            self.account_listeners.setdefault(account, []).append(q)
+
+    def account(self, name):
+        if name not in self.accounts:
+            self.accounts[name] = SimulatedAccount(self, name)
+        return self.accounts[name]
+
+    def exchange_info(self, symbol=None, **kwargs):
+        order_book = self.order_books.get(symbol)
+        filters = [{'filterType': 'NOTIONAL', 'minNotional': str(self.min_notional)}]
+        if order_book is not None and order_book.tick_size is not None:
+            filters.append({'filterType': 'PRICE_FILTER', 'tickSize': str(order_book.tick_size)})
+        if order_book is not None and order_book.scale is not None:
+            filters.append({'filterType': 'LOT_SIZE', 'stepSize': str(order_book.scale.step_size)})
+        base_asset, quote_asset = split_symbol(symbol or '')
+        return {'symbols': [{'symbol': symbol, 'status': 'TRADING', 'baseAsset': base_asset,
+                             'quoteAsset': quote_asset, 'filters': filters}]}
+
+    def new_order(self, symbol, side, type, quantity=None, price=None, timeInForce='GTC', account=None, **kwargs):
+        with self._lock:
+            order_type = type.upper()
+            order = SimulatedOrder(next(self._order_ids), symbol, side.upper(), order_type, Decimal(quantity),
+                                   Decimal(price) if price is not None else None,
+                                   timeInForce if order_type == LIMIT else None, self.clock.time_ms(), account)
+            self.orders[order.order_id] = order
+            self.__report(order, NEW)
+            fills = self.__take_liquidity(order, order.price if order_type == LIMIT else None)
+            if order.active:
+                if order_type == LIMIT and order.time_in_force == 'GTC':
+                    self.__rest(order)
+                else:
+                    order.status = EXPIRED
+                    self.__report(order, EXPIRED)
+            response = order.to_dict()
+            response['transactTime'] = order.created_at
+            response['fills'] = fills
+            return response
+
+    def get_order(self, symbol, orderId=None, account=None, **kwargs):
+        with self._lock:
+            order = self.orders.get(orderId)
+            if order is None or order.symbol != symbol or order.account != account:
+                raise ValueError(f"Order {orderId} does not exist on {symbol}")
+            return order.to_dict()
+
+    def cancel_order(self, symbol, orderId=None, account=None, **kwargs):
+        with self._lock:
+            order = self.orders.get(orderId)
+            if order is None or order.symbol != symbol or order.account != account or not order.active:
+                raise ValueError(f"Order {orderId} cannot be canceled on {symbol}")
+            self.open_orders[symbol].remove(order)
+            queue_tracker = self.queue_trackers.get(symbol)
+            if queue_tracker is not None:
+                queue_tracker.remove(order.order_id)
+            order.status = CANCELED
+            self.__report(order, CANCELED)
+            return order.to_dict()
+
+    def on_market_event(self, event):
+        """
+        Called with every trade and every applied depth diff, fills the resting orders they cross.
+        """
+        if isinstance(event, TradeEvent):
+            self.last_prices[event.symbol] = event.price
+        with self._lock:
+            open_orders = self.open_orders.get(event.symbol)
+            if not open_orders:
+                return
+            queue_tracker = self.__queue_tracker(event.symbol)
+            if isinstance(event, TradeEvent):
+                self.__on_trade(event, open_orders, queue_tracker)
+            elif isinstance(event, DepthUpdateEvent):
+                if queue_tracker is not None:
+                    queue_tracker.on_depth_update(event)
+                for order in list(open_orders):
+                    # A resting order is the maker of the liquidity that crosses it, it fills at its own price
+                    for price, quantity in self.__crossing_levels(order, order.price):
+                        self.__fill(order, order.price, quantity)
+            self.open_orders[event.symbol] = [order for order in open_orders if order.active]
+            if queue_tracker is not None:
+                for order in open_orders:
+                    if not order.active:
+                        queue_tracker.remove(order.order_id)
+
+    def __on_trade(self, event, open_orders, queue_tracker):
+        trade_price = Decimal(event.price)
+        trade_quantity = Decimal(event.quantity)
+        reached = dict(queue_tracker.on_trade(trade_price, trade_quantity, event.buyer_maker)) \
+            if queue_tracker is not None else {}
+        # Volume of the trade left for the orders of each account
+        available = {}
+        for order in list(open_orders):
+            account_available = available.get(order.account, trade_quantity)
+            if account_available <= 0:
+                continue
+            if order.trades_through(trade_price) or (queue_tracker is None and order.crosses(trade_price)):
+                quantity = min(order.remaining, account_available)
+            elif order.order_id in reached:
+                quantity = min(order.remaining, account_available, reached[order.order_id])
+            else:
+                continue
+            self.__fill(order, order.price, quantity)
+            available[order.account] = account_available - quantity
+
+    def __rest(self, order):
+        self.open_orders.setdefault(order.symbol, []).append(order)
+        queue_tracker = self.__queue_tracker(order.symbol)
+        if queue_tracker is not None:
+            queue_tracker.add(order.order_id, order.side, order.price)
+
+    def __queue_tracker(self, symbol):
+        queue_tracker = self.queue_trackers.get(symbol)
+        if queue_tracker is None:
+            order_book = self.order_books.get(symbol)
+            if order_book is None:
+                return None
+            queue_tracker = self.queue_trackers[symbol] = QueuePositionTracker(order_book)
+        return queue_tracker
+
+    def __take_liquidity(self, order, limit_price):
+        fills = []
+        levels = self.__crossing_levels(order, limit_price)
+        if not levels and limit_price is None and order.symbol in self.last_prices:
+            # Without a book, market orders fill at the last trade price
+            levels = [(Decimal(self.last_prices[order.symbol]), order.remaining)]
+        for price, quantity in levels:
+            fills.append(self.__fill(order, price, quantity))
+        return fills
+
+    def __crossing_levels(self, order, limit_price):
+        order_book = self.order_books.get(order.symbol)
+        if order_book is None:
+            return []
+        return walk_book(order_book, order.side, order.remaining, limit_price)
+
+    def __fill(self, order, price, quantity):
+        quote_quantity = price * quantity
+        order.executed_quantity += quantity
+        order.quote_quantity += quote_quantity
+        order.status = FILLED if order.remaining <= 0 else PARTIALLY_FILLED
+        base_asset, quote_asset = split_symbol(order.symbol)
+        # Commission is taken on the received asset
+        if order.side == BUY:
+            commission, commission_asset = quantity * self.fee_rate, base_asset
+        else:
+            commission, commission_asset = quote_quantity * self.fee_rate, quote_asset
+        trade_id = next(self._trade_ids)
+        self.__report(order, TRADE, last_quantity=quantity, last_price=price, commission=commission,
+                      commission_asset=commission_asset, trade_id=trade_id)
+        return {'price': str(price), 'qty': str(quantity), 'commission': str(commission),
+                'commissionAsset': commission_asset, 'tradeId': trade_id}
+
+    def __report(self, order, execution_type, last_quantity=Decimal('0'), last_price=Decimal('0'),
+                 commission=Decimal('0'), commission_asset=None, trade_id=-1):
+        now = self.clock.time_ms()
+        order.updated_at = now
+        report = {
+            'e': 'executionReport',
+            'E': now,
+            's': order.symbol,
+            'c': order.client_order_id,
+            'S': order.side,
+            'o': order.order_type,
+            'f': order.time_in_force or 'GTC',
+            'q': str(order.quantity),
+            'p': str(order.price or Decimal('0')),
+            'x': execution_type,
+            'X': order.status,
+            'i': order.order_id,
+            'l': str(last_quantity),
+            'z': str(order.executed_quantity),
+            'L': str(last_price),
+            'n': str(commission),
+            'N': commission_asset,
+            'T': now,
+            't': trade_id,
+            'Z': str(order.quote_quantity),
+            'Y': str(last_price * last_quantity),
+            'O': order.created_at
+        }
+        if order.account is None:
+            listeners = self.listeners + [q for qs in self.account_listeners.values() for q in qs]
+        else:
+            listeners = self.listeners + self.account_listeners.get(order.account, [])
+        for listener in listeners:
+            try:
+                listener.put_nowait(report)
+            except queue.Full:
+                logging.warning("Queue full. Dropping message.")
@@ -0,0 +1,155 @@
+import heapq
+import itertools
+from abc import ABC, abstractmethod
+from decimal import Decimal
+
+from date.clock import WALL_CLOCK
+
+BUY = 'BUY'
+SELL = 'SELL'
+
+
+def walk_book(order_book, side, quantity, limit_price=None):
+    """
+    Walks the opposite side of the book from the best level until quantity is reached.
+    :param limit_price: worst price to take, all levels if None.
+    :return: the (price, quantity) levels taken, as Decimal.
+    """
+    levels = []
+    remaining = quantity
+    with order_book.lock:
+        book_levels = order_book.asks if side == BUY else reversed(order_book.bids)
+        for price_key, quantity_key in book_levels:
+            price = order_book.to_price(price_key)
+            if limit_price is not None and (price > limit_price if side == BUY else price < limit_price):
+                break
+            taken = min(remaining, order_book.to_quantity(quantity_key))
+            levels.append((price, taken))
+            remaining -= taken
+            if remaining <= 0:
+                break
+    return levels
+
+
+class FillResult:
+    """
+    Outcome of a simulated order: the levels taken, their volume weighted average price and the slippage
+    against the price the trader decided on.
+    """
+
+    def __init__(self, side, requested_quantity, reference_price, fills, filled_at):
+        self.side = side
+        self.requested_quantity = requested_quantity
+        self.reference_price = reference_price
+        self.fills = fills
+        self.filled_at = filled_at
+        self.quantity = sum((quantity for price, quantity in fills), Decimal('0'))
+        self.quote_quantity = sum((price * quantity for price, quantity in fills), Decimal('0'))
+
+    @property
+    def price(self):
+        """
+        Volume weighted average price, None if nothing has been filled.
+        """
+        return self.quote_quantity / self.quantity if self.quantity > 0 else None
+
+    @property
+    def partial(self):
+        return self.quantity < self.requested_quantity
+
+    @property
+    def slippage(self):
+        """
+        Price difference against the reference price, positive when the fill is worse than expected.
+        """
+        if self.quantity == 0:
+            return Decimal('0')
+        difference = self.price - self.reference_price
+        return difference if self.side == BUY else -difference
+
+    @property
+    def slippage_bps(self):
+        return self.slippage / self.reference_price * 10000 if self.reference_price else Decimal('0')
+
+
+class FillModel(ABC):
+    """
+    Decides how simulated orders fill. Orders are executed `latency_ms` after their submission: with a latency
+    they stay pending and are executed by `poll` at the first call once the clock has passed their due time.
+    """
+
+    def __init__(self, clock=None, latency_ms=0):
+        self.clock = clock or WALL_CLOCK
+        self.latency_ms = latency_ms
+        self._pending = []
+        self._sequence = itertools.count()
+
+    def submit(self, side, quantity, reference_price, key=None):
+        """
+        :param key: returned by `poll` with the result of a pending order.
+        :return: the FillResult, or None if the order is pending.
+        """
+        if self.latency_ms <= 0:
+            return self.execute(side, quantity, reference_price)
+        due_time = self.clock.time_ms() + self.latency_ms
+        heapq.heappush(self._pending, (due_time, next(self._sequence), side, quantity, reference_price, key))
+        return None
+
+    def poll(self):
+        """
+        :return: the (key, FillResult) of the pending orders that are due, in submission order for a given time.
+        """
+        results = []
+        now = self.clock.time_ms()
+        while self._pending and self._pending[0][0] <= now:
+            due_time, sequence, side, quantity, reference_price, key = heapq.heappop(self._pending)
+            results.append((key, self.execute(side, quantity, reference_price)))
+        return results
+
+    def has_pending(self):
+        return len(self._pending) > 0
+
+    @abstractmethod
+    def execute(self, side, quantity, reference_price):
+        pass
+
+
+class InstantFillModel(FillModel):
+    """
+    Fills the whole quantity at the reference price, for markets without a book to walk.
+    """
+
+    def execute(self, side, quantity, reference_price):
+        return FillResult(side, quantity, reference_price, [(reference_price, quantity)], self.clock.time_ms())
+
+
+class DepthWalkFillModel(FillModel):
+    """
+    Fills against the levels of the order book at execution time, as a market order would.
+    The part of the quantity the book cannot absorb within `max_slippage` of the reference price is left unfilled.
+    """
+
+    def __init__(self, order_book, clock=None, latency_ms=0, max_slippage=None):
+        super().__init__(clock=clock, latency_ms=latency_ms)
+        self.order_book = order_book
+        self.max_slippage = Decimal(str(max_slippage)) if max_slippage is not None else None
+
+    def execute(self, side, quantity, reference_price):
+        limit_price = None
+        if self.max_slippage is not None:
+            limit_price = reference_price * (Decimal('1') + self.max_slippage if side == BUY
+                                             else Decimal('1') - self.max_slippage)
+        fills = walk_book(self.order_book, side, quantity, limit_price)
+        return FillResult(side, quantity, reference_price, fills, self.clock.time_ms())
+
+
+def create_fill_model(fill_model_config, order_book, clock=None):
+    """
+    :param fill_model_config: `trading.fill-model` configuration, instant fills if None.
+    """
+    fill_model_config = fill_model_config or {}
+    latency_ms = fill_model_config.get('latency-ms', 0)
+    if fill_model_config.get('type', 'instant') == 'depth-walk' and order_book is not None:
+        return DepthWalkFillModel(order_book, clock=clock, latency_ms=latency_ms,
+                                  max_slippage=fill_model_config.get('max-slippage'))
+    return InstantFillModel(clock=clock, latency_ms=latency_ms)
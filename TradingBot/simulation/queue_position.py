@@ -0,0 +1,105 @@
+from decimal import Decimal
+
+from simulation.fill_model import BUY, SELL
+
+
+class QueuePosition:
+    __slots__ = ('key', 'side', 'price_key', 'queue_ahead')
+
+    def __init__(self, key, side, price_key, queue_ahead):
+        self.key = key
+        self.side = side
+        self.price_key = price_key
+        self.queue_ahead = queue_ahead
+
+
+class QueuePositionTracker:
+    """
+    Estimates the quantity queued ahead of simulated orders resting in an order book.
+
+    An order joins the back of its price level: the quantity already displayed there is ahead of it.
+    Trades printed at the level consume the queue first, the volume going past it fills the order.
+    A level shrinking below the queue ahead means orders in front of ours were canceled; cancels are
+    otherwise assumed to come from behind, the conservative choice.
+
+    Positions are indexed by side and price, each event costs one lookup per level it touches.
+    """
+
+    def __init__(self, order_book):
+        self.order_book = order_book
+        self._levels = {BUY: {}, SELL: {}}
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def add(self, key, side, price):
+        """
+        :param key: identifier of the order, returned with its fills.
+        :param price: limit price of the resting order.
+        """
+        order_book = self.order_book
+        price_key = order_book.price_key(price)
+        with order_book.lock:
+            level_quantity = order_book.bid_quantity(price_key) if side == BUY else order_book.ask_quantity(price_key)
+        queue_ahead = order_book.to_quantity(level_quantity) if level_quantity is not None else Decimal('0')
+        position = QueuePosition(key, side, price_key, queue_ahead)
+        self._positions[key] = position
+        self._levels[side].setdefault(price_key, []).append(position)
+        return position
+
+    def remove(self, key):
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        level = self._levels[position.side]
+        positions = level[position.price_key]
+        positions.remove(position)
+        if not positions:
+            del level[position.price_key]
+
+    def queue_ahead(self, key):
+        position = self._positions.get(key)
+        return position.queue_ahead if position is not None else None
+
+    def on_depth_update(self, event):
+        """
+        :param event: DepthUpdateEvent decoded with the order book's parsers.
+        """
+        to_quantity = self.order_book.to_quantity
+        for side, levels in ((BUY, event.bids), (SELL, event.asks)):
+            tracked = self._levels[side]
+            if not tracked:
+                continue
+            for price_key, quantity_key in levels:
+                positions = tracked.get(price_key)
+                if positions is None:
+                    continue
+                quantity = to_quantity(quantity_key)
+                for position in positions:
+                    if quantity < position.queue_ahead:
+                        position.queue_ahead = quantity
+
+    def on_trade(self, price, quantity, buyer_maker=None):
+        """
+        :param buyer_maker: True when the trade consumed bids, False when it consumed asks, None if unknown.
+        :return: the (key, quantity) of the orders reached by the trade, quantity being the traded volume
+        left once their queue is exhausted.
+        """
+        price_key = self.order_book.price_key(price)
+        quantity = Decimal(quantity)
+        if buyer_maker is None:
+            sides = (BUY, SELL)
+        else:
+            sides = (BUY,) if buyer_maker else (SELL,)
+        fills = []
+        for side in sides:
+            positions = self._levels[side].get(price_key)
+            if positions is None:
+                continue
+            for position in positions:
+                position.queue_ahead -= quantity
+                if position.queue_ahead < 0:
+                    fills.append((position.key, -position.queue_ahead))
+                    position.queue_ahead = Decimal('0')
+        return fills
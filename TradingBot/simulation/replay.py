@@ -0,0 +1,290 @@
+import heapq
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from decimal import Decimal
+
+from date.clock import EventClock
+from encoders.DecimalEncoder import DecimalEncoder
+from market_data.order_book import OrderBook
+from market_data.recorder import KEYFRAME, SNAPSHOT, keyframe_times, read_records, recording_files, seek_records
+from simulation.exchange import SimulatedSpotClient
+from traders.TraderManager import TraderManager
+from traders.trader_factory import create_trader
+from trading_bot_data import TradingBotData
+
+# Trader types driven by the recorded streams, the ones placing orders trade on the simulated exchange.
+# The Bollinger traders are fed the recorded klines of their interval.
+REPLAYABLE_TRADER_TYPES = ('SecuredCapitalTrader', 'RealSecuredCapitalTrader', 'MinMaxSecuredCapitalTrader',
+                           'MinMaxTrader', 'BollingerReverseMeanTrader', 'BollingerOriginalReverseMeanTrader')
+
+
+class RecordingReader:
+    """
+    Reads the recordings of several symbols as one stream of (receive_ms, symbol, kind, payload) records
+    ordered by receive time.
+
+    :param start_ms: each symbol is read from its last keyframe at or before start_ms, from the start if None.
+    :param end_ms: records received from end_ms on are not read, all of them if None.
+    """
+
+    def __init__(self, directory, symbols, start_ms=None, end_ms=None):
+        self.directory = directory
+        self.symbols = symbols
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+
+    def start_time(self):
+        """
+        :return: receive time of the first recorded record, or None if nothing has been recorded.
+        """
+        first_times = [next(self.__symbol_records(symbol), (None,))[0] for symbol in self.symbols]
+        first_times = [first_time for first_time in first_times if first_time is not None]
+        return min(first_times) if first_times else None
+
+    def __iter__(self):
+        # Records with the same receive time keep the symbols order, the merged stream is the same on every run
+        return heapq.merge(*(self.__symbol_records(symbol) for symbol in self.symbols),
+                           key=lambda record: record[0])
+
+    def __symbol_records(self, symbol):
+        if self.start_ms is None:
+            records = (record for path in recording_files(self.directory, symbol) for record in read_records(path))
+        else:
+            records = seek_records(self.directory, symbol, self.start_ms)
+        for received_at, kind, payload in records:
+            if self.end_ms is not None and received_at >= self.end_ms:
+                return
+            yield received_at, symbol, kind, payload
+
+
+class ReplayEngine:
+    """
+    Drives the traders of a TraderManager from recorded market data, through the same dispatch path as the
+    live streams. Instead of consumer threads, trader mailboxes are consumed synchronously after each record
+    (or each consumer cycle of recorded time in batch mode), so identical recordings give identical decisions.
+    The manager's EventClock follows the receive time of the records, traders see the recorded time.
+
+    Records received before the reader's start_ms (between the keyframe a symbol is read from and start_ms)
+    only update the order books.
+
+    :param speed: None replays as fast as possible, otherwise records are paced at `speed` times real time.
+    """
+
+    def __init__(self, trader_manager, reader, speed=None):
+        self.trader_manager = trader_manager
+        self.reader = reader
+        self.speed = speed
+        self.start_ms = reader.start_ms
+        self.clock = trader_manager.clock
+        self.records = 0
+        # Latest state of each trader file, written once the replay is over
+        self.trader_files = {}
+        self._origin = None
+
+    def run(self):
+        manager = self.trader_manager
+        traders = [trader for trader in manager.traders if getattr(trader, 'queue', None) is not None]
+        cycle_ms = manager.consumer_cycle * 1000 if manager.batch_consumer else 0
+        next_cycle = None
+        try:
+            for received_at, symbol, kind, payload in self.reader:
+                if self.speed:
+                    self.__pace(received_at)
+                self.clock.advance(received_at)
+                if kind == SNAPSHOT:
+                    manager.dispatch_depth_snapshot(symbol, json.loads(payload))
+                elif kind == KEYFRAME:
+                    manager.dispatch_keyframe(symbol, json.loads(payload))
+                elif self.start_ms is not None and received_at < self.start_ms:
+                    manager.apply_depth_frame(payload)
+                    continue
+                else:
+                    manager.dispatch_market_frame(payload)
+                self.records += 1
+                if next_cycle is None or received_at >= next_cycle:
+                    self.__consume(traders)
+                    next_cycle = received_at + cycle_ms
+        finally:
+            self.__consume(traders)
+            for trader in manager.traders:
+                trader.update_file()
+            self.__collect_trader_updates()
+        return self.summary()
+
+    def __pace(self, received_at):
+        if self._origin is None:
+            self._origin = (received_at, time.monotonic())
+        origin_received_at, origin_time = self._origin
+        delay = origin_time + (received_at - origin_received_at) / 1000 / self.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def __consume(self, traders):
+        manager = self.trader_manager
+        for trader in traders:
+            with manager.traders_locks[trader.trader_id]:
+                try:
+                    self.__consume_trader(trader)
+                except Exception as e:
+                    logging.error(f"Error processing messages for {trader.symbol}: {e}", exc_info=True)
+        self.__collect_trader_updates()
+
+    def __consume_trader(self, trader):
+        manager = self.trader_manager
+        while not trader.order_queue.empty():
+            manager.handle_order_message(trader, trader.order_queue.get_nowait())
+        if manager.batch_consumer:
+            if trader.queue.empty():
+                return
+            depth_message, trade_message, messages = trader.queue.drain(timeout=0)
+            for message in messages:
+                manager.handle_strategy_message(trader, message)
+            trader.handle_market_batch(depth_message, trade_message)
+        else:
+            while not trader.queue.empty():
+                manager.handle_strategy_message(trader, trader.queue.get_nowait())
+
+    def __collect_trader_updates(self):
+        updates = self.trader_manager.trader_updates_queue
+        while not updates.empty():
+            trader_update = updates.get_nowait()
+            self.trader_files[trader_update['file_name']] = trader_update['content']
+
+    def save_files(self):
+        for file_name, content in self.trader_files.items():
+            os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+            with open(file_name, 'w') as file:
+                json.dump(content, file, cls=DecimalEncoder)
+
+    def summary(self):
+        results = []
+        for trader in self.trader_manager.traders:
+            analytics = trader.compute_analytics()
+            results.append({
+                'trader_id': trader.trader_id,
+                'capital': trader.capital,
+                'closed_trades': len(trader.trade_history),
+                'open_orders': len(trader.current_orders),
+                'total_profit_loss': analytics['total_profit_loss'],
+                'potential_profit_loss': analytics['potential_profit_loss'],
+                'max_drawdown': max_drawdown(trader.trade_history)
+            })
+        return results
+
+
+def max_drawdown(trade_history):
+    """
+    :return: largest fall of the cumulated realized profit/loss from its previous peak, in closing order.
+    """
+    cumulated = peak = drawdown = Decimal('0')
+    for trade in trade_history:
+        cumulated += trade.profit or Decimal('0')
+        peak = max(peak, cumulated)
+        drawdown = max(drawdown, peak - cumulated)
+    return drawdown
+
+
+def symbols_of(trader_entries):
+    symbols = []
+    for trader_entry in trader_entries:
+        trader_config = next(iter(trader_entry.values()))
+        if trader_config['type'] in REPLAYABLE_TRADER_TYPES and trader_config['symbol'] not in symbols:
+            symbols.append(trader_config['symbol'])
+    return symbols
+
+
+def split_chunks(recordings_directory, symbols, chunks):
+    """
+    Splits the recordings in time ranges of about the same number of keyframes, each range can be replayed
+    independently from its starting keyframe.
+    :return: the (start_ms, end_ms) of the chunks, None for the open ends.
+    """
+    times = keyframe_times(recordings_directory, symbols[0]) if symbols else []
+    if chunks <= 1 or len(times) < 2:
+        return [(None, None)]
+    chunks = min(chunks, len(times))
+    boundaries = [times[len(times) * chunk // chunks] for chunk in range(1, chunks)]
+    boundaries = sorted(set(boundaries))
+    return list(zip([None] + boundaries, boundaries + [None]))
+
+
+def build_replay(config, recordings_directory, data_directory, speed=None, trader_entries=None, start_ms=None,
+                 end_ms=None):
+    """
+    Builds the configured traders on fresh order books fed by the recordings of their symbols, orders are
+    matched by a simulated exchange. Trader types that are not driven by the recorded streams are left out.
+
+    All the traders are replayed in one pass: each symbol's book is rebuilt once and shared, while every
+    trader keeps its own capital, orders and exchange account.
+    :param trader_entries: entries replayed instead of `trading.traders`, e.g. variations of one strategy.
+    :param start_ms: traders see the records received from start_ms, the books are rebuilt from the keyframes before.
+    :param end_ms: records received from end_ms on are not replayed.
+    """
+    trader_entries = trader_entries if trader_entries is not None else config['trading']['traders']
+    reader = RecordingReader(recordings_directory, symbols_of(trader_entries), start_ms, end_ms)
+    # Starts at the first recorded time so that creation dates are reproducible too
+    clock = EventClock(reader.start_time() or 0)
+    trading_config = config['trading']
+    capital = Decimal(trading_config['capital'])
+    trade_capital_percentage = Decimal(trading_config['trade-capital-percentage'])
+    order_book_limit = trading_config['order-book']['limit']
+    order_books = {}
+    exchange = SimulatedSpotClient(order_books, clock=clock)
+
+    def order_book_provider(symbol):
+        if symbol not in order_books:
+            order_books[symbol] = OrderBook(symbol=symbol, limit=order_book_limit)
+        return order_books[symbol]
+
+    trader_updates_queue = queue.SimpleQueue()
+    queues = {}
+    traders = []
+    traders_locks = {}
+    symbols = []
+    for trader_entry in trader_entries:
+        trader_id, trader_config = next(iter(trader_entry.items()))
+        if trader_config['type'] not in REPLAYABLE_TRADER_TYPES:
+            logging.warning(f"{trader_id} : {trader_config['type']} is not driven by recorded streams, not replayed")
+            continue
+        trader = create_trader(config, trader_id, trader_config, capital, trade_capital_percentage,
+                               trader_updates_queue, order_book_provider=order_book_provider,
+                               data_directory=data_directory, clock=clock,
+                               client=exchange.account(trader_id))
+        # Market orders of the traders without order book are matched against the book of their symbol too
+        order_book_provider(trader.symbol)
+        traders.append(trader)
+        traders_locks[trader_id] = threading.Lock()
+        queues.setdefault(trader.symbol, []).append(trader.queue)
+        if trader.symbol not in symbols:
+            symbols.append(trader.symbol)
+    trader_manager = TraderManager(
+        queues=queues,
+        order_books=order_books,
+        websocket_url=config['api']['websocket-base-url'],
+        trading_bot_data=TradingBotData(),
+        traders_locks=traders_locks,
+        traders=traders,
+        trader_updates_queue=trader_updates_queue,
+        symbols=symbols,
+        api_config=config['api'],
+        consumer_config=trading_config.get('consumer'),
+        fetch_snapshots=False,
+        clock=clock,
+        exchange=exchange
+    )
+    return ReplayEngine(trader_manager, reader, speed=speed)
+
+
+def replay_chunk(config, recordings_directory, data_directory, start_ms=None, end_ms=None):
+    """
+    Replays one time range of the recordings and writes its trader files, in a worker process.
+    :return: the number of records replayed and the summary of the traders.
+    """
+    replay = build_replay(config, recordings_directory, data_directory, start_ms=start_ms, end_ms=end_ms)
+    results = replay.run()
+    replay.save_files()
+    return replay.records, results
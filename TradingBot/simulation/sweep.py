@@ -0,0 +1,170 @@
+import csv
+import itertools
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from simulation.replay import build_replay
+
+RESULT_COLUMNS = ('total_profit_loss', 'potential_profit_loss', 'closed_trades', 'open_orders', 'max_drawdown',
+                  'batch', 'records', 'runtime_s', 'error')
+
+
+def grid(parameters):
+    """
+    :param parameters: candidate values of each parameter, {'target-volume': [5, 10], ...}.
+    :return: every combination of the values, as a list of {parameter: value}.
+    """
+    names = list(parameters)
+    return [dict(zip(names, values)) for values in itertools.product(*(parameters[name] for name in names))]
+
+
+def random_sample(parameters, samples, seed=None):
+    """
+    :param parameters: candidate values of each parameter, a list to choose from or a {min, max} range.
+    :param samples: number of configurations drawn.
+    :param seed: makes the draw reproducible.
+    """
+    generator = random.Random(seed)
+    configurations = []
+    for _ in range(samples):
+        configuration = {}
+        for name, values in parameters.items():
+            if isinstance(values, dict):
+                configuration[name] = generator.uniform(values['min'], values['max'])
+            else:
+                configuration[name] = generator.choice(values)
+        configurations.append(configuration)
+    return configurations
+
+
+def configurations_of(sweep_config, mode=None, samples=None, seed=None):
+    """
+    :param sweep_config: `sweep` configuration, arguments override its mode, samples and seed.
+    """
+    mode = mode or sweep_config.get('mode', 'grid')
+    if mode == 'grid':
+        return grid(sweep_config['parameters'])
+    if mode == 'random':
+        return random_sample(sweep_config['parameters'], samples or sweep_config.get('samples', 100),
+                             seed if seed is not None else sweep_config.get('seed'))
+    raise ValueError(f"Unknown sweep mode {mode}")
+
+
+class ResultTable:
+    """
+    Results of a sweep stored by column, one row per run.
+    """
+
+    def __init__(self, columns):
+        self.columns = {column: [] for column in columns}
+
+    def __len__(self):
+        return len(self.columns['run_id']) if 'run_id' in self.columns else 0
+
+    def append(self, row):
+        for column, values in self.columns.items():
+            values.append(row.get(column))
+
+    def rows(self):
+        names = list(self.columns)
+        return [dict(zip(names, values)) for values in zip(*self.columns.values())]
+
+    def sort_by(self, column, reverse=False):
+        values = self.columns[column]
+        # Failed runs have no value, they stay at the end
+        order = sorted((index for index in range(len(self)) if values[index] is not None),
+                       key=lambda index: values[index], reverse=reverse)
+        order += [index for index in range(len(self)) if values[index] is None]
+        for name, column_values in self.columns.items():
+            self.columns[name] = [column_values[index] for index in order]
+
+    def to_csv(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(self.columns)
+            writer.writerows(zip(*self.columns.values()))
+
+
+def run_batch(config, recordings_directory, data_directory, batch, runs):
+    """
+    Replays the recordings once through the traders of several runs, in a worker process.
+    :param runs: (run_id, trader_config) of the runs, the run id is the trader id.
+    :return: the result rows of the runs, the runtime is the one of the whole batch.
+    """
+    start_time = time.perf_counter()
+    replay = build_replay(config, recordings_directory, os.path.join(data_directory, f'batch-{batch:05d}'),
+                          trader_entries=[{run_id: trader_config} for run_id, trader_config in runs])
+    results = replay.run()
+    runtime = round(time.perf_counter() - start_time, 3)
+    return [{
+        'run_id': result['trader_id'],
+        'total_profit_loss': result['total_profit_loss'],
+        'potential_profit_loss': result['potential_profit_loss'],
+        'closed_trades': result['closed_trades'],
+        'open_orders': result['open_orders'],
+        'max_drawdown': result['max_drawdown'],
+        'batch': batch,
+        'records': replay.records,
+        'runtime_s': runtime
+    } for result in results]
+
+
+class ParameterSweep:
+    """
+    Replays the same recordings through many variations of one trader configuration on a process pool.
+    Runs are grouped in batches replayed in a single pass by a worker: the order books are rebuilt once per
+    batch and every trader of the batch keeps its own capital, orders and exchange account.
+
+    :param base_trader_config: trader entry the swept parameters are applied to.
+    :param data_directory: parent of the batch directories, traders must not find files of a previous sweep there.
+    :param workers: number of worker processes, one per CPU by default.
+    :param batch_size: number of runs replayed together by a worker.
+    """
+
+    def __init__(self, config, recordings_directory, base_trader_config, data_directory='sweep', workers=None,
+                 batch_size=1):
+        self.config = config
+        self.recordings_directory = recordings_directory
+        self.base_trader_config = base_trader_config
+        self.data_directory = data_directory
+        self.workers = workers
+        self.batch_size = max(batch_size, 1)
+
+    def run(self, configurations):
+        """
+        :param configurations: parameters of each run, see `grid` and `random_sample`.
+        :return: ResultTable of the runs, in configuration order.
+        """
+        parameter_names = []
+        for configuration in configurations:
+            parameter_names.extend(name for name in configuration if name not in parameter_names)
+        table = ResultTable(('run_id',) + tuple(parameter_names) + RESULT_COLUMNS)
+        runs = []
+        for index, configuration in enumerate(configurations):
+            trader_config = dict(self.base_trader_config)
+            trader_config.update(configuration)
+            runs.append((f'run-{index:05d}', trader_config))
+        batches = [runs[start:start + self.batch_size] for start in range(0, len(runs), self.batch_size)]
+        rows = {}
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(run_batch, self.config, self.recordings_directory, self.data_directory,
+                                       batch, batch_runs): batch for batch, batch_runs in enumerate(batches)}
+            for completed, future in enumerate(as_completed(futures), start=1):
+                batch = futures[future]
+                try:
+                    batch_rows = future.result()
+                except Exception as e:
+                    logging.error(f"Sweep batch {batch} failed: {e}")
+                    batch_rows = [{'run_id': run_id, 'batch': batch, 'error': str(e)} for run_id, _ in batches[batch]]
+                for row in batch_rows:
+                    rows[row['run_id']] = row
+                logging.info(f"Sweep batch {batch} done ({completed}/{len(futures)})")
+        for index, configuration in enumerate(configurations):
+            row = rows.get(f'run-{index:05d}', {'run_id': f'run-{index:05d}'})
+            row.update(configuration)
+            table.append(row)
+        return table
@@ -0,0 +1,66 @@
+import queue
+from decimal import Decimal
+
+from date.clock import EventClock
+from market_data.order_book import OrderBook
+from simulation.exchange import SimulatedSpotClient
+from traders.min_max_trader import MinMaxTrader
+from traders.order import Order, OrderStatus
+from traders.SecuredCapitalTrader import SecuredCapitalTrader
+
+
+class FullScanMixin:
+    """
+    Updates every open order on each price like the traders did before the trigger index.
+    """
+
+    def update_triggered_orders(self):
+        for order in list(self.current_orders):
+            self.update_order(order)
+
+
+class FullScanSecuredCapitalTrader(FullScanMixin, SecuredCapitalTrader):
+    pass
+
+
+class FullScanMinMaxTrader(FullScanMixin, MinMaxTrader):
+    pass
+
+
+def secured_capital_trader(data_directory, trader_class=SecuredCapitalTrader, clock=None, fill_model=None):
+    return trader_class(trader_id=trader_class.__name__, symbol='BTCUSDT', capital=Decimal('1000'),
+                        trade_capital_percentage=Decimal('0.01'), order_book=OrderBook('BTCUSDT'),
+                        trader_updates_queue=queue.Queue(), target_volume=10, respected_gap_value=10,
+                        data_directory=str(data_directory), clock=clock or EventClock(), fill_model=fill_model)
+
+
+def min_max_trader(data_directory, trader_class=MinMaxTrader, clock=None):
+    clock = clock or EventClock()
+    client = SimulatedSpotClient({}, clock=clock).account(trader_class.__name__)
+    return trader_class(trader_id=trader_class.__name__, symbol='BTCUSDT', capital=Decimal('1000'),
+                        trade_capital_percentage=Decimal('0.01'), order_book=OrderBook('BTCUSDT'),
+                        trader_updates_queue=queue.Queue(), target_volume=10, respected_gap_value=10,
+                        api_config={}, data_directory=str(data_directory), clock=clock, client=client)
+
+
+def open_position(order_id, buy_price, quantity, max_price=None, stop_loss_price=None, secured=False):
+    buy_price = Decimal(buy_price)
+    quantity = Decimal(quantity)
+    buy_fee = buy_price * quantity * Decimal('0.001')
+    return Order(id=order_id, status=OrderStatus.OPEN, opened_at='01/01/2025T00:00', opened_at_ts=0,
+                 detected_price=buy_price, buy_price=buy_price, quantity=quantity,
+                 cost=buy_price * quantity + buy_fee, buy_fee=buy_fee,
+                 max_price=Decimal(max_price) if max_price is not None else buy_price,
+                 stop_loss_price=Decimal(stop_loss_price) if stop_loss_price is not None
+                 else buy_price * Decimal('0.95'),
+                 secured=secured)
+
+
+def add_position(trader, order):
+    trader.current_orders.append(order)
+    trader._track_position(order)
+
+
+def positions_of(trader):
+    return [(order.id, order.status, order.secured, order.max_price, order.stop_loss_price)
+            for order in trader.current_orders]
@@ -0,0 +1,82 @@
+import random
+from decimal import Decimal
+
+from market_data.depth_sync import DepthSynchronizer
+from market_data.events import DepthUpdateEvent
+from market_data.order_book import OrderBook
+
+
+def snapshot(last_update_id, bids, asks):
+    return {'lastUpdateId': last_update_id, 'bids': [[price, quantity] for price, quantity in bids],
+            'asks': [[price, quantity] for price, quantity in asks]}
+
+
+def diff(first_update_id, final_update_id, bids=(), asks=()):
+    return DepthUpdateEvent('BTCUSDT', 0, first_update_id, final_update_id,
+                            [list(level) for level in bids], [list(level) for level in asks])
+
+
+def synchronized(last_update_id=100):
+    book = OrderBook('BTCUSDT')
+    synchronizer = DepthSynchronizer(book)
+    synchronizer.load_snapshot(snapshot(last_update_id, [('99', '1')], [('101', '1')]))
+    return book, synchronizer
+
+
+def test_diffs_contained_in_the_snapshot_are_dropped_and_not_dispatched():
+    book, synchronizer = synchronized()
+    assert not synchronizer.on_depth_update(diff(90, 100, bids=[('99', '5')]))
+    assert book.bid_quantity(Decimal('99')) == Decimal('1')
+    assert synchronizer.synchronized
+
+
+def test_first_diff_straddles_the_snapshot_then_ids_follow():
+    book, synchronizer = synchronized()
+    assert synchronizer.on_depth_update(diff(95, 105, bids=[('99', '2')]))
+    assert synchronizer.on_depth_update(diff(106, 110, bids=[('98', '3')]))
+    assert book.last_update_id == 110
+    assert list(book.bids) == [(Decimal('98'), Decimal('3')), (Decimal('99'), Decimal('2'))]
+
+
+def test_gap_buffers_until_next_snapshot():
+    book, synchronizer = synchronized()
+    assert synchronizer.on_depth_update(diff(101, 105))
+    assert not synchronizer.on_depth_update(diff(107, 110, asks=[('102', '4')]))
+    assert not synchronizer.synchronized
+    assert not synchronizer.on_depth_update(diff(111, 112, asks=[('103', '1')]))
+    assert synchronizer.load_snapshot(snapshot(108, [('99', '1')], [('101', '1')]))
+    assert synchronizer.synchronized
+    assert book.last_update_id == 112
+    assert book.ask_quantity(Decimal('102')) == Decimal('4')
+    assert book.ask_quantity(Decimal('103')) == Decimal('1')
+
+
+def test_snapshot_older_than_the_buffer_is_rejected():
+    book, synchronizer = synchronized()
+    synchronizer.invalidate()
+    synchronizer.on_depth_update(diff(120, 125))
+    assert not synchronizer.load_snapshot(snapshot(110, [], []))
+    assert not synchronizer.synchronized
+
+
+def test_random_stream_matches_a_plain_book():
+    random.seed(5)
+    book, synchronizer = synchronized(last_update_id=0)
+    bids, asks = {Decimal('99'): Decimal('1')}, {Decimal('101'): Decimal('1')}
+    update_id = 0
+    for _ in range(2000):
+        first = update_id + 1
+        update_id += random.randint(1, 3)
+        levels = [(f"{random.randint(80, 99)}", f"{random.randint(0, 3)}") for _ in range(5)]
+        ask_levels = [(f"{random.randint(101, 120)}", f"{random.randint(0, 3)}") for _ in range(5)]
+        for side, side_levels in ((bids, levels), (asks, ask_levels)):
+            for price, quantity in side_levels:
+                if Decimal(quantity) == 0:
+                    side.pop(Decimal(price), None)
+                else:
+                    side[Decimal(price)] = Decimal(quantity)
+        assert synchronizer.on_depth_update(diff(first, update_id, levels, ask_levels))
+        # Stale copies of the diff change nothing
+        assert not synchronizer.on_depth_update(diff(first, update_id, [('80', '9')], []))
+    assert dict(book.bids) == bids
+    assert dict(book.asks) == asks
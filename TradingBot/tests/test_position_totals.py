@@ -0,0 +1,63 @@
+import random
+from decimal import Decimal
+
+from tests.helpers import add_position, min_max_trader, open_position, secured_capital_trader
+from traders.order import OrderStatus
+from traders.price_index import is_position_open
+
+
+def scanned_unrealized_profit_loss(trader, price):
+    # The sum computed over every open position before the running totals
+    return sum((trader.compute_potential_profit_loss(order, price)
+                for order in trader.current_orders if is_position_open(order)), Decimal('0'))
+
+
+def shuffle_positions(trader, quantity):
+    action = random.random()
+    if action < 0.4 or not trader.current_orders:
+        add_position(trader, open_position(str(random.random()), random.randint(90, 110), quantity))
+    elif action < 0.7:
+        order = trader.current_orders.pop(random.randrange(len(trader.current_orders)))
+        trader._untrack_position(order)
+    else:
+        order = random.choice(trader.current_orders)
+        order.status = random.choice([OrderStatus.BUY_IN_PROGRESS, OrderStatus.OPEN, OrderStatus.SALE_IN_PROGRESS])
+        order.buy_price = Decimal(random.randint(90, 110))
+        order.cost = order.buy_price * order.quantity
+        trader._track_position(order)
+
+
+def test_unrealized_profit_loss_matches_scan(tmp_path):
+    random.seed(23)
+    trader = secured_capital_trader(tmp_path)
+    for _ in range(1000):
+        shuffle_positions(trader, random.choice(['0.01', '0.5', '1.25']))
+        price = Decimal(random.randint(80, 120))
+        assert trader.compute_unrealized_profit_loss(price) == scanned_unrealized_profit_loss(trader, price)
+
+
+def test_min_max_unrealized_profit_loss_matches_scan(tmp_path):
+    random.seed(29)
+    trader = min_max_trader(tmp_path)
+    trader.fees_to_cover = Decimal('0.002')
+    for _ in range(1000):
+        shuffle_positions(trader, '0.0001')
+        price = Decimal(random.randint(80, 120))
+        assert trader.compute_unrealized_profit_loss(price) == scanned_unrealized_profit_loss(trader, price)
+
+
+def test_analytics_match_scan_of_trades_and_positions(tmp_path):
+    random.seed(31)
+    trader = secured_capital_trader(tmp_path)
+    for i in range(20):
+        add_position(trader, open_position(str(i), Decimal(90 + i), '0.01'))
+    price = Decimal('100')
+    for _ in range(2000):
+        price = max(price + Decimal(random.randint(-20, 20)) / 10, Decimal('50'))
+        trader.update_current_price(price)
+        trader.update_triggered_orders()
+        analytics = trader.compute_analytics()
+        realized = sum((trade.profit for trade in trader.trade_history), Decimal('0'))
+        assert analytics['total_profit_loss'] == realized
+        assert analytics['potential_profit_loss'] == realized + scanned_unrealized_profit_loss(trader, price)
+    assert trader.trade_history
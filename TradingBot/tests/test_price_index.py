@@ -0,0 +1,93 @@
+import random
+from decimal import Decimal
+
+from tests.helpers import min_max_trader, open_position, secured_capital_trader
+from traders.order import Order, OrderStatus
+from traders.price_index import PriceIndex, is_position_open
+
+
+def random_order(order_id):
+    if random.random() < 0.2:
+        return Order(id=order_id, status=OrderStatus.BUY_IN_PROGRESS, detected_price=Decimal(random.randint(90, 110)))
+    order = open_position(order_id, random.randint(90, 110), '0.001')
+    order.detected_price = Decimal(random.randint(90, 110))
+    return order
+
+
+def mutate(orders, track, untrack):
+    """
+    Adds, removes or changes one order, calling track/untrack like the traders do.
+    """
+    action = random.random()
+    if action < 0.35 or not orders:
+        order = random_order(str(random.random()))
+        orders.append(order)
+        track(order)
+    elif action < 0.65:
+        order = orders.pop(random.randrange(len(orders)))
+        untrack(order)
+    else:
+        order = random.choice(orders)
+        order.status = random.choice(list(OrderStatus))
+        order.buy_price = Decimal(random.randint(90, 110))
+        # A filled buy gets its stop loss and max prices
+        order.max_price = order.max_price or order.buy_price
+        order.stop_loss_price = order.stop_loss_price or order.buy_price * Decimal('0.95')
+        track(order)
+
+
+def test_lowest_matches_scan():
+    random.seed(13)
+    indexes = [PriceIndex('buy_price'), PriceIndex('buy_price', include=is_position_open)]
+    orders = []
+
+    def track(order):
+        for index in indexes:
+            index.track(order)
+
+    def untrack(order):
+        for index in indexes:
+            index.untrack(order)
+
+    for _ in range(2000):
+        mutate(orders, track, untrack)
+        prices = [order.buy_price for order in orders if order.buy_price is not None]
+        open_prices = [order.buy_price for order in orders if order.buy_price is not None and is_position_open(order)]
+        assert indexes[0].lowest() == (min(prices) if prices else None)
+        assert indexes[1].lowest() == (min(open_prices) if open_prices else None)
+
+
+def test_gap_checks_match_scan_of_positions(tmp_path):
+    random.seed(17)
+    trader = secured_capital_trader(tmp_path)
+
+    def untrack(order):
+        trader._untrack_position(order)
+
+    for _ in range(1000):
+        mutate(trader.current_orders, trader._track_position, untrack)
+        trader.update_current_price(Decimal(random.randint(70, 115)))
+        price = trader.current_price
+        # Scans the checks used to make over every order
+        positions = [order for order in trader.current_orders if order.buy_price is not None]
+        assert trader.respected_gap() == all(
+            price < order.buy_price and order.buy_price - price >= trader.respected_gap_value for order in positions)
+        assert trader.is_price_in_buy_orders(price) == any(
+            abs(order.buy_price - price) < Decimal('0.01') or order.buy_price <= price
+            for order in positions if is_position_open(order))
+
+
+def test_min_max_gap_check_matches_scan_of_positions(tmp_path):
+    random.seed(19)
+    trader = min_max_trader(tmp_path)
+
+    def untrack(order):
+        trader._untrack_position(order)
+
+    for _ in range(1000):
+        mutate(trader.current_orders, trader._track_position, untrack)
+        trader.current_price = Decimal(random.randint(70, 115))
+        price = trader.current_price
+        assert trader.respected_gap() == all(
+            not (is_position_open(order) and price >= order.detected_price)
+            and order.detected_price - price >= trader.respected_gap_value for order in trader.current_orders)
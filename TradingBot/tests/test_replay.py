@@ -0,0 +1,135 @@
+import json
+import random
+
+from market_data.recorder import MarketDataRecorder
+from simulation.replay import build_replay
+
+START_MS = 1_760_000_000_000
+CANDLE_MS = 15 * 60 * 1000
+
+
+def replay_config(traders):
+    return {'trading': {'capital': '1000', 'trade-capital-percentage': '0.01', 'order-book': {'limit': 5000},
+                        'traders': traders},
+            'api': {'websocket-base-url': 'wss://stream.invalid', 'base-url': 'https://api.invalid'}}
+
+
+def kline_frame(event_time, open_time, close, closed):
+    kline = {'t': open_time, 'T': open_time + CANDLE_MS - 1, 'i': '15m', 'o': close, 'h': close, 'l': close,
+             'c': close, 'v': '1', 'q': close, 'n': 1, 'V': '0', 'Q': '0', 'x': closed}
+    return json.dumps({'stream': 'btcusdt@kline_15m', 'data': {'e': 'kline', 'E': event_time, 's': 'BTCUSDT',
+                                                               'k': kline}})
+
+
+def record_klines(directory, candles):
+    """
+    Records two updates per candle, the second one closing it, then an update of a candle in progress.
+    :return: the close of the last closed candle and of the candle in progress.
+    """
+    recorder = MarketDataRecorder(str(directory))
+    recorder.start()
+    recorder.record_snapshot('BTCUSDT', {'lastUpdateId': 1, 'bids': [['99.00', '1']], 'asks': [['101.00', '1']]},
+                             received_at=START_MS)
+    for candle in range(candles):
+        open_time = START_MS + candle * CANDLE_MS
+        close = f"{100 + candle % 5}.00"
+        recorder.record_frame('BTCUSDT', kline_frame(open_time + 1000, open_time, '90.00', False), open_time + 1000)
+        recorder.record_frame('BTCUSDT', kline_frame(open_time + CANDLE_MS - 1, open_time, close, True),
+                              open_time + CANDLE_MS - 1)
+    open_time = START_MS + candles * CANDLE_MS
+    recorder.record_frame('BTCUSDT', kline_frame(open_time + 1000, open_time, '80.00', False), open_time + 1000)
+    recorder.close()
+    return float(close), 80.0
+
+
+def bollinger_replay(tmp_path, trader_type, **options):
+    trader_config = {'type': trader_type, 'symbol': 'BTCUSDT', **options}
+    replay = build_replay(replay_config([{trader_type: trader_config}]), str(tmp_path / 'recordings'),
+                          str(tmp_path / 'data'))
+    replay.run()
+    return replay
+
+
+def test_bollinger_traders_are_fed_recorded_klines(tmp_path):
+    last_close, in_progress_close = record_klines(tmp_path / 'recordings', 25)
+    for trader_type in ('BollingerReverseMeanTrader', 'BollingerOriginalReverseMeanTrader'):
+        replay = bollinger_replay(tmp_path, trader_type)
+        trader = replay.trader_manager.traders[0]
+        # Strategies run on the candle in progress by default, the exchange matches on the symbol's book
+        assert trader.candles.ready
+        assert trader.candles.last(1)[0].close == in_progress_close
+        assert 'BTCUSDT' in replay.trader_manager.order_books
+
+
+def test_partial_candles_option_restricts_strategies_to_closed_candles(tmp_path):
+    last_close, in_progress_close = record_klines(tmp_path / 'recordings', 25)
+    replay = bollinger_replay(tmp_path, 'BollingerReverseMeanTrader', **{'partial-candles': False})
+    trader = replay.trader_manager.traders[0]
+    assert [candle.close for candle in trader.candles.last(3)] == [102.0, 103.0, last_close]
+
+
+def record_market(directory, frames, seed):
+    """
+    Records a random walk of trades with depth diffs around it, after a depth snapshot.
+    """
+    generator = random.Random(seed)
+    recorder = MarketDataRecorder(str(directory))
+    recorder.start()
+    received_at = START_MS
+    price = 60000.0
+    bids = [[f"{price - level * 0.01:.2f}", f"{generator.random():.5f}"] for level in range(1, 200)]
+    asks = [[f"{price + level * 0.01:.2f}", f"{generator.random():.5f}"] for level in range(200)]
+    recorder.record_snapshot('BTCUSDT', {'lastUpdateId': 100, 'bids': bids, 'asks': asks}, received_at=received_at)
+    update_id = 100
+    for frame in range(frames):
+        received_at += generator.randint(1, 40)
+        if frame % 3 == 0:
+            first_update_id = update_id + 1
+            update_id += generator.randint(1, 5)
+            bids = [[f"{price - generator.randint(1, 300) * 0.01:.2f}",
+                     f"{generator.choice([0, generator.random(), generator.random() * 12]):.5f}"] for _ in range(10)]
+            asks = [[f"{price + generator.randint(1, 300) * 0.01:.2f}", f"{generator.random():.5f}"]
+                    for _ in range(10)]
+            stream, data = 'btcusdt@depth@100ms', {'e': 'depthUpdate', 'E': received_at, 's': 'BTCUSDT',
+                                                   'U': first_update_id, 'u': update_id, 'b': bids, 'a': asks}
+        else:
+            price = round(price + generator.choice([-1, 1]) * generator.random() * 2, 2)
+            stream, data = 'btcusdt@trade', {'e': 'trade', 'E': received_at, 's': 'BTCUSDT', 'p': f"{price:.2f}",
+                                             'q': '0.001'}
+        recorder.record_frame('BTCUSDT', json.dumps({'stream': stream, 'data': data}), received_at)
+    recorder.close()
+
+
+STRATEGY_ENTRIES = [{trader_id: {'type': trader_type, 'symbol': 'BTCUSDT', 'target-volume': 10,
+                                 'respected-gap-value': 10}}
+                    for trader_id, trader_type in (('Secured', 'SecuredCapitalTrader'),
+                                                   ('Real', 'RealSecuredCapitalTrader'),
+                                                   ('MinMax', 'MinMaxTrader'),
+                                                   ('MinMaxSecured', 'MinMaxSecuredCapitalTrader'))]
+
+
+def replay_results(recordings, data_directory, trader_entries):
+    replay = build_replay(replay_config(trader_entries), str(recordings), str(data_directory))
+    summary = replay.run()
+    # Exchange order ids are shared by the accounts, they depend on the other traders
+    positions = {trader.trader_id: [(order.status, order.buy_price, order.quantity, order.sale_price)
+                                    for order in trader.current_orders + trader.trade_history]
+                 for trader in replay.trader_manager.traders}
+    return summary, positions
+
+
+def test_one_pass_replay_matches_replays_of_each_trader(tmp_path):
+    record_market(tmp_path / 'recordings', 6000, seed=3)
+    summary, positions = replay_results(tmp_path / 'recordings', tmp_path / 'all', STRATEGY_ENTRIES)
+    assert any(result['open_orders'] or result['closed_trades'] for result in summary)
+    for entry in STRATEGY_ENTRIES:
+        trader_id = next(iter(entry))
+        alone_summary, alone_positions = replay_results(tmp_path / 'recordings', tmp_path / trader_id, [entry])
+        assert alone_summary == [result for result in summary if result['trader_id'] == trader_id]
+        assert alone_positions[trader_id] == positions[trader_id]
+
+
+def test_replays_are_deterministic(tmp_path):
+    record_market(tmp_path / 'recordings', 3000, seed=5)
+    first = replay_results(tmp_path / 'recordings', tmp_path / 'first', STRATEGY_ENTRIES)
+    assert replay_results(tmp_path / 'recordings', tmp_path / 'second', STRATEGY_ENTRIES) == first
@@ -0,0 +1,69 @@
+import math
+import random
+import statistics
+
+from indicators.bollinger import BollingerCandles
+from indicators.rolling import RollingStatistics
+
+MINUTE_MS = 60 * 1000
+
+
+def assert_close(value, expected):
+    assert math.isclose(value, expected, rel_tol=1e-9, abs_tol=1e-7)
+
+
+def test_rolling_statistics_match_the_window():
+    random.seed(37)
+    rolling = RollingStatistics(20)
+    values = []
+    price = 60000.0
+    for _ in range(5000):
+        price += random.uniform(-50, 50)
+        if values and random.random() < 0.3:
+            # Update of the candle in progress
+            values[-1] = price
+            rolling.replace_last(price)
+        else:
+            values.append(price)
+            rolling.push(price)
+        window = values[-20:]
+        if len(window) < 20:
+            assert rolling.mean is None and rolling.std is None
+            continue
+        assert_close(rolling.mean, statistics.fmean(window))
+        assert_close(rolling.std, statistics.stdev(window))
+
+
+def test_rolling_std_of_a_constant_window_is_zero():
+    rolling = RollingStatistics(20)
+    for value in [60000.1] * 10 + [60000.3] * 40:
+        rolling.push(value)
+    assert rolling.std == 0.0
+
+
+def test_bollinger_candles_match_bands_of_the_closes():
+    random.seed(41)
+    candles = BollingerCandles(window=20, num_std=2, history=3, interval_ms=MINUTE_MS)
+    closes = {}
+    open_time = 0
+    for _ in range(3000):
+        action = random.random()
+        if action < 0.02:
+            # Missing candles restart the series
+            open_time += 3 * MINUTE_MS
+            closes = {}
+        elif action < 0.7:
+            open_time += MINUTE_MS
+        close = random.uniform(59000, 61000)
+        closes[open_time] = close
+        candles.update_kline([open_time, close, close, close, close, 1])
+        series = [closes[time] for time in sorted(closes)][-20:]
+        candle = candles.last(1)[0]
+        assert candle.open_time == open_time and candle.close == close
+        if len(series) < 20:
+            assert candle.lower is None
+            continue
+        middle, std = statistics.fmean(series), statistics.stdev(series)
+        assert_close(candle.middle, middle)
+        assert_close(candle.upper, middle + 2 * std)
+        assert_close(candle.lower, middle - 2 * std)
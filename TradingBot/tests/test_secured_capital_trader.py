@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+import pytest
+
+from date.clock import EventClock
+from market_data.events import TradeEvent
+from simulation.fill_model import InstantFillModel
+from tests.helpers import add_position, open_position, secured_capital_trader
+from traders.order import OrderStatus
+
+
+def latency_trader(tmp_path, latency_ms=100):
+    clock = EventClock(1_000)
+    trader = secured_capital_trader(tmp_path, clock=clock, fill_model=InstantFillModel(clock, latency_ms=latency_ms))
+    trader.support = {'value': Decimal('100'), 'volume': Decimal('20'), 'index': 1}
+    return trader, clock
+
+
+def test_pending_buy_completes_on_trade_without_price_change(tmp_path):
+    trader, clock = latency_trader(tmp_path)
+    trader.update_current_price(Decimal('100'))
+    trader.buy_order(Decimal('0.01'))
+    order = trader.current_orders[0]
+    assert order.status == OrderStatus.BUY_IN_PROGRESS
+    assert trader.pending_orders == {order.id: order}
+
+    clock.advance(1_100)
+    trader.handle_ticker_message(TradeEvent('BTCUSDT', 1_100, '100', '0.5'))
+    assert order.status == OrderStatus.OPEN
+    assert trader.pending_orders == {}
+
+
+def test_pending_sale_completes_in_market_batch(tmp_path):
+    trader, clock = latency_trader(tmp_path)
+    trader.update_current_price(Decimal('90'))
+    order = open_position('1', '100', '0.01')
+    add_position(trader, order)
+    trader.sell_trade(order)
+    assert order.status == OrderStatus.SALE_IN_PROGRESS
+
+    clock.advance(1_100)
+    trader.handle_market_batch(None, TradeEvent('BTCUSDT', 1_100, '90', '0.5'))
+    assert trader.current_orders == []
+    assert [trade.id for trade in trader.trade_history] == ['1']
+    assert trader.realized_profit_loss == trader.trade_history[0].profit
+
+
+def test_close_error_propagates_without_recording_trade(tmp_path, monkeypatch):
+    trader = secured_capital_trader(tmp_path)
+    trader.update_current_price(Decimal('90'))
+    order = open_position('1', '100', '0.01')
+    add_position(trader, order)
+
+    def fail(order, current_price=None):
+        raise ArithmeticError('profit')
+
+    monkeypatch.setattr(trader, 'compute_potential_profit_loss', fail)
+    with pytest.raises(ArithmeticError):
+        trader.sell_trade(order)
+    assert trader.trade_history == []
+    assert trader.realized_profit_loss == 0
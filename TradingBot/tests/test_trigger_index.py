@@ -0,0 +1,85 @@
+import random
+from decimal import Decimal
+
+from tests.helpers import (FullScanMinMaxTrader, FullScanSecuredCapitalTrader, add_position, min_max_trader,
+                           open_position, positions_of, secured_capital_trader)
+from traders.order import OrderStatus
+from traders.trigger_index import TriggerIndex
+
+
+def run_prices(trader, prices):
+    for price in prices:
+        trader.update_current_price(Decimal(price))
+        trader.update_triggered_orders()
+
+
+def test_triggered_matches_scan_of_tracked_positions():
+    random.seed(3)
+    index = TriggerIndex()
+    orders = [open_position(str(i), random.randint(90, 110), '0.001') for i in range(50)]
+    watermarks = {}
+    for order in orders:
+        index.track(order)
+    index.triggered(Decimal('100'))
+    for order in orders:
+        watermarks[order.id] = order.max_price
+        index.track(order)
+    for _ in range(500):
+        price = Decimal(random.randint(80, 120))
+        expected = [order for order in orders if order.status == OrderStatus.OPEN and
+                    (order.stop_loss_price >= price or watermarks[order.id] < price)]
+        assert index.triggered(price) == expected
+        for order in expected:
+            order.max_price = max(order.max_price, price)
+            order.stop_loss_price = Decimal(random.randint(80, 110))
+            if random.random() < 0.1:
+                order.status = OrderStatus.SALE_IN_PROGRESS
+            watermarks[order.id] = min(order.max_price, price)
+            index.track(order, price)
+
+
+def test_min_max_secures_below_max_price_after_mid_change(tmp_path):
+    traders = [min_max_trader(tmp_path / 'index'), min_max_trader(tmp_path / 'scan', FullScanMinMaxTrader)]
+    for trader in traders:
+        trader.min_price, trader.max_price, trader.mid_price = Decimal('100'), Decimal('104'), Decimal('102')
+        add_position(trader, open_position('1', '100', '0.0001', max_price='101.9', stop_loss_price='95'))
+        # The price drops under the min, the mid falls to 100, then the price rises back under the max price
+        run_prices(trader, ['101.9', '96', '101'])
+    index_trader, scan_trader = traders
+    assert positions_of(index_trader) == positions_of(scan_trader)
+    assert index_trader.current_orders[0].secured
+    assert index_trader.current_orders[0].stop_loss_price == index_trader.mid_price
+
+
+def test_min_max_trigger_index_matches_full_scan(tmp_path):
+    random.seed(7)
+    prices = [Decimal('100')]
+    for _ in range(2000):
+        prices.append(max(prices[-1] + Decimal(random.randint(-30, 30)) / 10, Decimal('50')))
+    traders = [min_max_trader(tmp_path / 'index'), min_max_trader(tmp_path / 'scan', FullScanMinMaxTrader)]
+    for trader in traders:
+        trader.min_price, trader.max_price, trader.mid_price = Decimal('95'), Decimal('105'), Decimal('100')
+        for i in range(20):
+            buy_price = Decimal(90 + i)
+            add_position(trader, open_position(str(i), buy_price, '0.0001', stop_loss_price=buy_price - 3))
+    for price in prices:
+        for trader in traders:
+            run_prices(trader, [price])
+        assert positions_of(traders[0]) == positions_of(traders[1])
+
+
+def test_secured_capital_trigger_index_matches_full_scan(tmp_path):
+    random.seed(11)
+    prices = [Decimal('100')]
+    for _ in range(2000):
+        prices.append(max(prices[-1] + Decimal(random.randint(-20, 20)) / 10, Decimal('50')))
+    traders = [secured_capital_trader(tmp_path / 'index'),
+               secured_capital_trader(tmp_path / 'scan', FullScanSecuredCapitalTrader)]
+    for trader in traders:
+        for i in range(20):
+            add_position(trader, open_position(str(i), Decimal(90 + i), '0.01'))
+    for price in prices:
+        for trader in traders:
+            run_prices(trader, [price])
+        assert positions_of(traders[0]) == positions_of(traders[1])
+        assert [trade.id for trade in traders[0].trade_history] == [trade.id for trade in traders[1].trade_history]
@@ -1,11 +1,11 @@
 import logging
 import uuid
-from datetime import datetime
-import time
 from decimal import Decimal
 
-from date.date_util import get_current_date, compute_duration_until_now
+from date.date_util import get_current_date, compute_duration_until_now, datetime_of, timestamp_ms_of
+from simulation.fill_model import BUY, SELL, InstantFillModel
 from traders.abstract_multi_trade_trader import AbstractMultiTradeTrader
+from traders.order import Order, OrderStatus
 
 
 def limit_reached():
@@ -14,7 +14,8 @@ def limit_reached():
 
 class SecuredCapitalTrader(AbstractMultiTradeTrader):
 
-    def __init__(self,trader_id, symbol, capital, trade_capital_percentage, order_book, trader_updates_queue, target_volume, respected_gap_value):
+    def __init__(self,trader_id, symbol, capital, trade_capital_percentage, order_book, trader_updates_queue, target_volume, respected_gap_value, data_directory='data', clock=None,
+                 fill_model=None):
         super().__init__(trader_id,
                          symbol,
                          capital,
@@ -23,13 +24,35 @@ class SecuredCapitalTrader(AbstractMultiTradeTrader):
                          name='SecuredCapitalTrader',
                          trader_updates_queue=trader_updates_queue,
                          target_volume=target_volume,
-                         respected_gap_value=respected_gap_value)
+                         respected_gap_value=respected_gap_value,
+                         data_directory=data_directory, clock=clock)
         self.stop_loss_percentage = Decimal('0.05')
+        # Paper orders fill instantly at the current price unless a fill model is configured
+        self.fill_model = fill_model or InstantFillModel(clock=self.clock)
+        # Orders waiting for a latency fill, by id
+        self.pending_orders = {}
+
+    def init_data(self):
+        super().init_data()
+        # Fills still pending when the trader stopped are lost, their orders go back to their previous state
+        self.current_orders = [order for order in self.current_orders if order.status != OrderStatus.BUY_IN_PROGRESS]
+        for order in self.current_orders:
+            if order.status == OrderStatus.SALE_IN_PROGRESS:
+                order.status = OrderStatus.OPEN
+
+    def handle_ticker_message(self, message):
+        super().handle_ticker_message(message)
+        # Fills come due with time: trades complete them even without a price change or a depth update
+        self.complete_pending_fills()
+
+    def handle_market_batch(self, depth_message, trade_message):
+        super().handle_market_batch(depth_message, trade_message)
+        self.complete_pending_fills()
 
     def handle_trading_logic(self):
+        self.complete_pending_fills()
         if self.current_price:
-            for order in self.current_orders[:]:
-                self.update_order(order)
+            self.update_triggered_orders()
 
         if self.can_buy():
             order_size = self.calculate_order_size()
@@ -52,92 +75,150 @@ class SecuredCapitalTrader(AbstractMultiTradeTrader):
                     and not self.is_price_in_buy_orders(self.current_price))
         return False
 
-    def compute_analytics(self):
-        analytics = {}
-        total_profit_loss = Decimal('0')
-        for trade in self.trade_history:
-            total_profit_loss += trade['profit']
-        analytics['total_profit_loss'] = total_profit_loss
-        for trade in self.current_orders:
-            potential_profit_loss = self.compute_potential_profit_loss(trade)
-            if potential_profit_loss is not None:
-                total_profit_loss += potential_profit_loss
-        analytics['potential_profit_loss'] = total_profit_loss
-        return analytics
-
     def buy_order(self, order_size):
-        base_cost = self.current_price * order_size
-        buy_fee = base_cost * self.trading_fee_percentage
-        stop_loss_price = self.current_price * (Decimal('1') - self.stop_loss_percentage)
-        cost = base_cost + buy_fee
-        new_order = {
-            'id': str(uuid.uuid4()),
-            'cost': cost,
-            'opened_at': get_current_date(),
-            'buy_price': self.current_price,
-            'quantity': order_size,
-            'buy_fee': buy_fee,
-            'status': 'open',
-            'secured': False,
-            'max_price': self.current_price,  # Pour le trailing stop-loss
-            'stop_loss_price': stop_loss_price,
-            'support': self.support['value'],
-            'support_volume': self.support['volume'],
-            'support_index': self.support['index']
-        }
+        new_order = Order(
+            id=str(uuid.uuid4()),
+            opened_at=get_current_date(self.clock),
+            opened_at_ts=self.clock.time_ms(),
+            detected_price=self.current_price,
+            # Replaced by the fill price, keeps the gap checks working while the fill is pending
+            buy_price=self.current_price,
+            quantity=order_size,
+            status=OrderStatus.BUY_IN_PROGRESS,
+            secured=False,
+            support=self.support['value'],
+            support_volume=self.support['volume'],
+            support_index=self.support['index']
+        )
         self.current_orders.append(new_order)
-        self.update_capital_after_trade('buy', self.current_price, order_size)
+        self._track_position(new_order)
+        fill = self.fill_model.submit(BUY, order_size, self.current_price, key=new_order.id)
+        if fill is not None:
+            self.complete_buy(new_order, fill)
+        else:
+            self.pending_orders[new_order.id] = new_order
+            self.update_file()
+
+    def complete_pending_fills(self):
+        if not self.pending_orders:
+            return
+        for order_id, fill in self.fill_model.poll():
+            order = self.pending_orders.pop(order_id, None)
+            if order is None:
+                continue
+            if fill.side == BUY:
+                self.complete_buy(order, fill)
+            else:
+                self.complete_sale(order, fill)
+
+    def complete_buy(self, order, fill):
+        if fill.quantity == 0:
+            logging.info(f"{self.name} : No liquidity to fill buy order {order.id}, order dropped")
+            self.current_orders.remove(order)
+            self._untrack_position(order)
+            self.update_file()
+            return
+        base_cost = fill.quote_quantity
+        buy_fee = base_cost * self.trading_fee_percentage
+        order.cost = base_cost + buy_fee
+        order.buy_price = fill.price
+        order.quantity = fill.quantity
+        order.buy_fee = buy_fee
+        order.buy_slippage = fill.slippage
+        order.max_price = fill.price  # Pour le trailing stop-loss
+        order.stop_loss_price = fill.price * (Decimal('1') - self.stop_loss_percentage)
+        order.status = OrderStatus.OPEN
+        self._track_position(order)
+        self.capital -= order.cost
         self.update_file()
 
     def update_order(self, order):
-        if self.current_price and self.current_price > order['max_price']:
-            if order.get('secured', False):
+        if self.current_price and self.current_price > order.max_price:
+            if order.secured:
                 self.update_stop_loss(order)
-            order['max_price'] = self.current_price
+            order.max_price = self.current_price
 
-        if not order.get('secured', False):
+        if not order.secured:
             self.update_secured(order)
 
-        if self.current_price <= order['stop_loss_price']:
+        if self.current_price <= order.stop_loss_price:
             self.sell_trade(order)
-            self.update_capital_after_trade(action='sell', order_price=self.current_price, quantity=order['quantity'])
-            self.trade_history.append(order)
-            logging.info(
-                f"{self.name} : Successfull sale for order {order['id']} with profit/loss {order['profit']}")
-            self.current_orders.remove(order)
-            self.update_file()
 
     def update_stop_loss(self, order):
-        order['stop_loss_price'] = ((self.current_price - order['max_price']) * Decimal('0.5')) + order[
-            'max_price']
+        order.stop_loss_price = ((self.current_price - order.max_price) * Decimal('0.5')) + order.max_price
 
     def update_secured(self, order):
         if self.current_price:
 
             potential_profit = self.compute_potential_profit_loss(order)
-            total_fees = order['buy_fee'] + (self.current_price * self.trading_fee_percentage * order['quantity'])
+            total_fees = order.buy_fee + (self.current_price * self.trading_fee_percentage * order.quantity)
             if potential_profit >= total_fees:
                 # Capital sécurisé
-                order['secured'] = True
+                order.secured = True
                 # Ajuster le stop-loss pour suivre le prix maximum avec le trailing stop
-                order['stop_loss_price'] = order['max_price']
+                order.stop_loss_price = order.max_price
                 logging.info(
-                    f"{self.name} : Securing capital pour l'ordre à {order['buy_price']} avec stopLoss {order['stop_loss_price']}")
+                    f"{self.name} : Securing capital pour l'ordre à {order.buy_price} avec stopLoss {order.stop_loss_price}")
 
     def sell_trade(self, order):
-        try:
-            order['sailed_quantity'] = order['quantity']
-            order['sale_price'] = self.current_price
-            order['closed_at'] = get_current_date()
-            start_datetime = datetime.strptime(order['opened_at'], "%d/%m/%YT%H:%M")
-            order['duration'] = compute_duration_until_now(start_datetime)
-            order['sale_timestamp'] = time.time()
-
-            sale_fee = self.current_price * order['quantity'] * self.trading_fee_percentage
-            order['sale_fee'] = sale_fee
-            order['profit'] = self.compute_potential_profit_loss(order)
-        except Exception as e:
-            logging.error(f"Error when selling order {order['id']}")
+        order.status = OrderStatus.SALE_IN_PROGRESS
+        fill = self.fill_model.submit(SELL, order.quantity, self.current_price, key=order.id)
+        if fill is not None:
+            self.complete_sale(order, fill)
+        else:
+            self.pending_orders[order.id] = order
+            self.update_file()
+
+    def complete_sale(self, order, fill):
+        if fill.quantity == 0:
+            # Nothing to sell against, the stop loss is checked again on the next price
+            order.status = OrderStatus.OPEN
+            self._track_position(order)
+            self.update_file()
+            return
+        if fill.partial:
+            # The sold part is closed as its own trade, the rest stays open
+            closed_order = self.split_order(order, fill.quantity)
+            order.status = OrderStatus.OPEN
+            self._track_position(order)
+        else:
+            closed_order = order
+            self.current_orders.remove(order)
+            self._untrack_position(order)
+        self.close_order(closed_order, fill)
+        logging.info(
+            f"{self.name} : Successfull sale for order {closed_order.id} with profit/loss {closed_order.profit}")
+        self.update_file()
+
+    def split_order(self, order, quantity):
+        part = quantity / order.quantity
+        split = order.copy()
+        split.id = str(uuid.uuid4())
+        split.quantity = quantity
+        split.cost = order.cost * part
+        split.buy_fee = order.buy_fee * part
+        order.quantity -= quantity
+        order.cost -= split.cost
+        order.buy_fee -= split.buy_fee
+        return split
+
+    def close_order(self, order, fill):
+        order.sailed_quantity = fill.quantity
+        order.sale_price = fill.price
+        order.sale_slippage = fill.slippage
+        order.closed_at = get_current_date(self.clock)
+        order.closed_at_ts = self.clock.time_ms()
+        start_datetime = datetime_of(timestamp_ms_of(order, 'opened_at'))
+        order.duration = compute_duration_until_now(start_datetime, self.clock)
+        order.sale_timestamp = self.clock.time()
+
+        sale_fee = fill.quote_quantity * self.trading_fee_percentage
+        order.sale_fee = sale_fee
+        order.profit = self.compute_potential_profit_loss(order, fill.price)
+        order.status = OrderStatus.CLOSED
+        self.capital += fill.quote_quantity - sale_fee
+        # Only closed trades are recorded, errors go up to the consumer instead of recording a trade without profit
+        self._record_trade(order)
 
     def update_file(self):
         self.trading_data['currentOrders'] = self.current_orders
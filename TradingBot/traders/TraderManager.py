@@ -9,78 +9,195 @@ from decimal import Decimal
 import requests
 import websockets
 
+from date.clock import WALL_CLOCK
 from encoders.DecimalEncoder import DecimalEncoder
+from exchange.binance_helper import fetch_depth_snapshot
+from market_data.candle_store import CandleStore, futures_candle_store
+from market_data.depth_sync import DepthSynchronizer
+from market_data.events import DepthUpdateEvent, KlineEvent, MarketDataDecoder, TradeEvent
+from market_data.stream_manager import StreamConnectionManager, kline_stream, symbol_streams
 from traders.FundingRateTrader import FundingRateTrader
 from traders.abstract_support_trader import AbstractSupportTrader
 from traders.bollinger_original_reverse_mean_trader import BollingerOriginalReverseMeanTrader
 from traders.bollinger_reverse_mean_trader import BollingerReverseMeanTrader
 
 
+PRICE_THRESHOLD = Decimal('0.01')
+
+
 class TraderManager:
 
-    def __init__(self, queues, websocket_url, trading_bot_data, traders_locks, traders, trader_updates_queue, symbols,
-                 api_config):
+    def __init__(self, queues, order_books, websocket_url, trading_bot_data, traders_locks, traders,
+                 trader_updates_queue, symbols, api_config, consumer_config=None, recorder=None,
+                 fetch_snapshots=True, clock=None, exchange=None, candle_directory='candles'):
         self.symbols = symbols
         self.websocket_url = websocket_url
         self.queues = queues
+        self.order_books = order_books
+        # Minimum trade price move forwarded to traders, in the representation of each symbol's order book
+        self.price_thresholds = {symbol: order_book.price_key(PRICE_THRESHOLD)
+                                 for symbol, order_book in order_books.items()}
+        # Replays supply the recorded snapshots through dispatch_depth_snapshot instead of fetching them
+        snapshot_loader = self.load_depth_snapshot if fetch_snapshots else None
+        self.depth_synchronizers = {symbol: DepthSynchronizer(order_book, snapshot_loader)
+                                    for symbol, order_book in order_books.items()}
+        self.decoder = MarketDataDecoder()
+        for symbol, order_book in order_books.items():
+            self.decoder.register_parsers(symbol, order_book.parse_price, order_book.parse_quantity)
+        # One thread and one event loop serve the market data streams of every symbol
+        self.stream_manager = StreamConnectionManager(websocket_url, self.dispatch_market_frame,
+                                                      self.__on_streams_disconnected)
         self.trading_bot_data = trading_bot_data
         self.traders = traders
         self.order_queues = self.fill_order_queues()
+        # Simulated exchange: its execution reports replace the user data stream
+        self.exchange = exchange
+        if exchange is not None:
+            # Each trader only receives the reports of the orders placed through its account
+            for trader in self.traders:
+                exchange.add_listener(trader.order_queue, account=trader.trader_id)
         self.started = False
         self.threads = []
         self.stop_event = threading.Event()
         self.traders_locks = traders_locks
         self.trader_updates_queue = trader_updates_queue
         self.api_config = api_config
-
-    def __add_websocket_handler(self, websocket_url):
-
-        def run():
-            asyncio.set_event_loop(asyncio.new_event_loop())
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(handler())
-
-        async def handler():
-            while True:
-                try:
-                    async with websockets.connect(websocket_url) as websocket:
-                        logging.info(f'Connected to WebSocket {websocket_url}')
-                        while True:
-                            message = await websocket.recv()
-                            if isinstance(message, bytes):
-                                await websocket.pong(message)
-                            else:
-                                data = json.loads(message)
-                                payload = data['data']
-                                valid_message = False
-                                s = payload['s']
-                                if payload['e'] == 'trade':
-                                    received_price = Decimal(payload['p'])
-                                    threshold = Decimal('0.01')
-                                    if self.trading_bot_data.last_price.get(s) is None:
-                                        self.trading_bot_data.last_price[s] = received_price
-                                    elif received_price != self.trading_bot_data.last_price[s] and (
-                                            (received_price > (self.trading_bot_data.last_price[s] + threshold)) or (
-                                            received_price < (self.trading_bot_data.last_price[s] - threshold))):
-                                        self.trading_bot_data.last_price[s] = received_price
-                                        valid_message = True
-                                elif payload['e'] == 'depthUpdate':
-                                    valid_message = True
-                                if valid_message and self.queues is not None and len(self.queues) > 0:
-                                    for q in self.queues[s]:
-                                        print(f'queue size : {q.qsize()}')
-                                        try:
-                                            q.put_nowait(payload)
-                                        except queue.Full:
-                                            logging.warning("Queue full. Dropping message.")
-                except (websockets.ConnectionClosedError, websockets.ConnectionClosed):
-                    logging.error(f"Connection lost. Try to reconnect")
-                    await asyncio.sleep(5)
-                except Exception as e:
-                    logging.error(f"Unexpected error occurred", exc_info=True)
-                    await asyncio.sleep(5)
-
-        threading.Thread(target=run, daemon=True).start()
+        consumer_config = consumer_config or {}
+        self.batch_consumer = consumer_config.get('batch', False)
+        self.consumer_cycle = consumer_config.get('cycle-ms', 0) / 1000
+        self.recorder = recorder
+        self.clock = clock or WALL_CLOCK
+        # Klines per symbol and interval, shared by the traders and persisted between runs
+        self.candle_directory = candle_directory
+        self.candle_stores = {}
+        # Traders fed by the kline stream of a (symbol, interval), and the open time of the last closed candle seen
+        self.kline_consumers = {}
+        for trader in traders:
+            if isinstance(trader, BollingerReverseMeanTrader) or isinstance(trader, BollingerOriginalReverseMeanTrader):
+                self.kline_consumers.setdefault((trader.symbol, trader.kline_interval), []).append(trader)
+        self.closed_klines = {}
+
+    def candle_store(self, symbol, interval):
+        key = (symbol, interval)
+        if key not in self.candle_stores:
+            # Same market data host as the depth snapshots and the kline streams, not the trading one
+            candle_store = CandleStore(symbol, interval, self.api_config['base-url'],
+                                       directory=self.candle_directory, clock=self.clock)
+            candle_store.load()
+            self.candle_stores[key] = candle_store
+        return self.candle_stores[key]
+
+    def load_depth_snapshot(self, symbol):
+        depth = fetch_depth_snapshot(base_url=self.api_config['base-url'], symbol=symbol,
+                                     limit=self.order_books[symbol].limit)
+        if depth is not None and self.recorder is not None:
+            self.recorder.record_snapshot(symbol, depth, self.clock.time_ms())
+        return depth
+
+    def subscribe_symbol(self, symbol):
+        self.stream_manager.subscribe(symbol_streams(symbol) + self.kline_streams(symbol))
+
+    def unsubscribe_symbol(self, symbol):
+        self.stream_manager.unsubscribe(symbol_streams(symbol) + self.kline_streams(symbol))
+
+    def kline_streams(self, symbol):
+        return [kline_stream(symbol, interval) for kline_symbol, interval in self.kline_consumers
+                if kline_symbol == symbol]
+
+    def __on_streams_disconnected(self, streams):
+        symbols = {stream.split('@')[0].upper() for stream in streams}
+        for symbol in symbols:
+            synchronizer = self.depth_synchronizers.get(symbol)
+            if synchronizer is not None:
+                synchronizer.invalidate()
+
+    def dispatch_market_frame(self, frame):
+        # Each frame is decoded once, the same event is then shared by the order book and every trader
+        event = self.decoder.decode(frame)
+        if event is not None:
+            if self.recorder is not None:
+                self.recorder.record_frame(event.symbol, frame, self.clock.time_ms())
+            self.dispatch_market_event(event)
+
+    def dispatch_depth_snapshot(self, symbol, depth):
+        synchronizer = self.depth_synchronizers.get(symbol)
+        if synchronizer is not None:
+            synchronizer.load_snapshot(depth)
+
+    def dispatch_keyframe(self, symbol, depth):
+        # A synchronized book already holds the recorded state, keyframes only matter after a gap or a seek
+        synchronizer = self.depth_synchronizers.get(symbol)
+        if synchronizer is not None and not synchronizer.synchronized:
+            synchronizer.load_snapshot(depth)
+
+    def apply_depth_frame(self, frame):
+        """
+        Updates the order book with a depth frame without dispatching it to the traders (replay warm up).
+        """
+        event = self.decoder.decode(frame)
+        if isinstance(event, DepthUpdateEvent):
+            synchronizer = self.depth_synchronizers.get(event.symbol)
+            if synchronizer is not None:
+                synchronizer.on_depth_update(event)
+
+    def dispatch_market_event(self, event):
+        symbol = event.symbol
+        valid_message = False
+        if isinstance(event, KlineEvent):
+            self.__dispatch_kline(event)
+            return
+        if isinstance(event, TradeEvent):
+            valid_message = self.__accept_trade(event)
+            if self.exchange is not None:
+                # Resting orders see every trade, not only the ones moving the price past the threshold
+                self.exchange.on_market_event(event)
+        elif isinstance(event, DepthUpdateEvent):
+            synchronizer = self.depth_synchronizers.get(symbol)
+            valid_message = synchronizer is None or synchronizer.on_depth_update(event)
+            if valid_message and self.exchange is not None:
+                self.exchange.on_market_event(event)
+            if valid_message and self.recorder is not None:
+                now = self.clock.time_ms()
+                if self.recorder.keyframe_due(symbol, now):
+                    self.recorder.record_keyframe(symbol, self.order_books[symbol], now)
+        if valid_message:
+            # Conflating mailboxes never refuse a message
+            for q in self.queues.get(symbol, ()):
+                q.put_nowait(event)
+
+    def __dispatch_kline(self, event):
+        key = (event.symbol, event.interval)
+        candle_store = self.candle_stores.get(key)
+        if candle_store is not None:
+            last_open_time = candle_store.last_open_time
+            candle_store.update([event.kline()])
+            if (last_open_time is not None and event.open_time > last_open_time
+                    and self.closed_klines.get(key) != last_open_time):
+                # The close of the previous candle was missed (reconnection, startup on a candle boundary),
+                # the missing candles are fetched from the REST API
+                threading.Thread(target=candle_store.synchronize, daemon=True).start()
+            elif event.closed:
+                candle_store.save()
+        if event.closed:
+            self.closed_klines[key] = event.open_time
+        # Strategies run on candle closes, and on every update of the candle in progress if they ask for it
+        for trader in self.kline_consumers.get(key, ()):
+            if event.closed or trader.partial_candles:
+                trader.queue.put_nowait(event)
+
+    def __accept_trade(self, event):
+        symbol = event.symbol
+        order_book = self.order_books.get(symbol)
+        received_price = order_book.parse_price(event.price) if order_book is not None else Decimal(event.price)
+        threshold = self.price_thresholds.get(symbol, PRICE_THRESHOLD)
+        last_price = self.trading_bot_data.last_price.get(symbol)
+        if last_price is None:
+            self.trading_bot_data.last_price[symbol] = received_price
+        elif received_price != last_price and (
+                received_price > last_price + threshold or received_price < last_price - threshold):
+            self.trading_bot_data.last_price[symbol] = received_price
+            return True
+        return False
 
     def start(self):
         logging.info('start : Starting Trade Manager')
@@ -88,12 +205,17 @@ class TraderManager:
         if self.started:
             return
         else:
-            listen_key = self.create_listen_key()
-            self.monitor_orders(listen_key=listen_key)
+            if self.exchange is None:
+                listen_key = self.create_listen_key()
+                self.monitor_orders(listen_key=listen_key)
+            if self.recorder is not None:
+                self.threads.append(self.recorder.start())
+            self.threads.append(self.stream_manager.start())
+            for symbol, interval in self.kline_consumers:
+                self.candle_store(symbol, interval)
             for symbol in self.symbols:
-                lower_symbol = symbol.lower()
-                websocket_url = self.websocket_url + '/stream?streams=' + lower_symbol + '@depth@100ms/' + lower_symbol + '@trade'
-                self.__add_websocket_handler(websocket_url)
+                self.subscribe_symbol(symbol)
+            self.bootstrap_candles()
             self.__init_traders_threads()
             for t in self.threads:
                 t.join()
@@ -105,10 +227,11 @@ class TraderManager:
             daemon=True)
         t_save_traders.start()
         self.threads.append(t_save_traders)
+        futures_candle_stores = {}
         for trader in self.traders:
             if isinstance(trader, AbstractSupportTrader) or isinstance(trader, BollingerReverseMeanTrader) or isinstance(trader, BollingerOriginalReverseMeanTrader):
                 t = threading.Thread(
-                    target=self.process_strategy_messages,
+                    target=self.process_strategy_batches if self.batch_consumer else self.process_strategy_messages,
                     args=(
                         trader, self.traders_locks[trader.trader_id], trader.queue,
                         self.stop_event),
@@ -126,6 +249,10 @@ class TraderManager:
                 order_t.start()
                 self.threads.append(order_t)
             elif isinstance(trader, FundingRateTrader):
+                if trader.symbol not in futures_candle_stores:
+                    futures_candle_stores[trader.symbol] = futures_candle_store(
+                        trader.symbol, '1m', directory=self.candle_directory, clock=self.clock)
+                trader.candle_store = futures_candle_stores[trader.symbol]
                 t = threading.Thread(
                     target=self.process_funding_rate_trader,
                     args=(
@@ -134,15 +261,19 @@ class TraderManager:
                 )
                 t.start()
                 self.threads.append(t)
-            if isinstance(trader, BollingerReverseMeanTrader) or isinstance(trader, BollingerOriginalReverseMeanTrader):
-                t = threading.Thread(
-                    target=self.process_klines_update,
-                    args=(
-                        trader, self.stop_event),
-                    daemon=True
-                )
-                t.start()
-                self.threads.append(t)
+
+    def bootstrap_candles(self):
+        """
+        Fetches the klines missed since the last run, then gives the traders their initial bands.
+        Called once the kline streams are subscribed, which keep the candle stores up to date from then on.
+        """
+        for (symbol, interval), traders in self.kline_consumers.items():
+            candle_store = self.candle_store(symbol, interval)
+            if not candle_store.synchronize():
+                logging.error(f"Could not fetch the {interval} klines of {symbol}, bands start from the stream")
+            for trader in traders:
+                with self.traders_locks[trader.trader_id]:
+                    trader.process_update(candle_store.klines(trader.klines_limit()))
 
     def process_funding_rate_trader(self, trader, stop_event):
         while True:
@@ -156,8 +287,7 @@ class TraderManager:
                 if message is None:
                     break
                 with lock:
-                    if message['e'] == 'executionReport':
-                        trader.handle_order_monitoring(message)
+                    self.handle_order_message(trader, message)
                 q.task_done()
             except queue.Empty:
                 continue
@@ -173,12 +303,7 @@ class TraderManager:
                 if message is None:
                     break
                 with lock:
-                    if message['e'] == 'depthUpdate':
-                        trader.handle_depth_message(message)
-                    elif message['e'] == 'trade':
-                        trader.handle_ticker_message(message)
-                    elif message['e'] == 'executionReport':
-                        trader.handle_order_monitoring(message)
+                    self.handle_strategy_message(trader, message)
                 q.task_done()
             except queue.Empty:
                 continue
@@ -186,6 +311,51 @@ class TraderManager:
                 logging.error(f"Error processing message for {trader.symbol}: {e}", exc_info=True)
                 q.task_done()
 
+    def process_strategy_batches(self, trader, lock, q, stop_event):
+        """
+        Batched consumer: drains everything queued for the trader, applies it and evaluates the strategy once,
+        then waits for the consumer cycle so that lock acquisitions follow the cycle rate, not the message rate.
+        """
+        while not stop_event.is_set():
+            try:
+                depth_message, trade_message, messages = q.drain(timeout=1)
+                with lock:
+                    for message in messages:
+                        if message is None:
+                            return
+                        self.handle_strategy_message(trader, message)
+                    trader.handle_market_batch(depth_message, trade_message)
+            except queue.Empty:
+                continue
+            except Exception as e:
+                logging.error(f"Error processing messages for {trader.symbol}: {e}", exc_info=True)
+            if self.consumer_cycle > 0:
+                stop_event.wait(self.consumer_cycle)
+
+    def handle_order_message(self, trader, message):
+        if message['e'] == 'executionReport':
+            trader.handle_order_monitoring(message)
+
+    def handle_strategy_message(self, trader, message):
+        if isinstance(message, DepthUpdateEvent):
+            trader.handle_depth_message(message)
+        elif isinstance(message, TradeEvent):
+            trader.handle_ticker_message(message)
+        elif isinstance(message, KlineEvent):
+            self.handle_kline_message(trader, message)
+        else:
+            self.handle_order_message(trader, message)
+
+    def handle_kline_message(self, trader, message):
+        candle_store = self.candle_stores.get((message.symbol, message.interval))
+        if candle_store is None:
+            # Replays: the recorded stream is the only source of klines
+            klines = [message.kline()]
+        else:
+            # Newer candles may already be stored, the trader sees the series as it was at this event
+            klines = candle_store.klines(trader.klines_limit(), end_time=message.open_time)
+        trader.process_update(klines)
+
     def save_trader(self, q, stop_event):
         while not stop_event.is_set():
             try:
@@ -206,6 +376,8 @@ class TraderManager:
     def save_files(self):
         for trader in self.traders:
             trader.update_file()
+        if self.recorder is not None:
+            self.recorder.close()
 
     def create_listen_key(self):
 
@@ -290,19 +462,3 @@ class TraderManager:
         for trader in self.traders:
             order_queues.append(trader.order_queue)
         return order_queues
-
-    def process_klines_update(self, trader, stop_event):
-        url = self.api_config['trades']['base-url'] + '/api/v3/klines'
-        params = {
-            'symbol': trader.symbol,
-            'interval': '15m',
-            'limit': 1000
-        }
-        while True:
-            try:
-                response = requests.get(url, params=params)
-                trader.process_update(response.json())
-            except Exception as e:
-                logging.error('An error occureed while updqting klines')
-            finally:
-                time.sleep(60)
@@ -1,19 +1,24 @@
 import json
 import os
 from abc import ABC, abstractmethod
-from datetime import datetime
 from decimal import Decimal, ROUND_DOWN
 
+from date.clock import WALL_CLOCK
+from date.date_util import timestamp_ms_of
 from encoders.DecimalEncoder import DecimalEncoder
+from traders.daily_profits import DailyProfits
 
 BINANCE_ORDER_BOOK_URL = "https://api.binance.com/api/v3/depth"
 
 
 class AbstractTrader(ABC):
 
-    def __init__(self, trader_id, symbol, capital, trade_capital_percentage, name, trader_updates_queue):
+    def __init__(self, trader_id, symbol, capital, trade_capital_percentage, name, trader_updates_queue,
+                 data_directory='data', clock=None):
         self.trader_id = trader_id
         self.symbol = symbol
+        # Wall clock in live runs, event clock in replays
+        self.clock = clock or WALL_CLOCK
         self.current_price = None
         self.trade_history = []
         self.capital = capital
@@ -21,8 +26,11 @@ class AbstractTrader(ABC):
         self.trading_fee_percentage = Decimal('0.001')
         self.trading_data = None
         self.name = name
-        self.file_name = 'data/' + self.trader_id.replace(' ', '_') + '_trader.json'
+        self.file_name = os.path.join(data_directory, self.trader_id.replace(' ', '_') + '_trader.json')
+        self.daily_profits = DailyProfits()
         self.load_or_create_trading_file()
+        for trade in self.trade_history:
+            self.daily_profits.add(timestamp_ms_of(trade, 'closed_at'), trade.profit)
         self.trader_updates_queue = trader_updates_queue
 
     def calculate_order_size(self):
@@ -43,11 +51,46 @@ class AbstractTrader(ABC):
             self.capital += total_revenue
 
     def handle_ticker_message(self, message):
-        last_price = Decimal(message['p'])
+        if self.update_current_price(Decimal(message.price)):
+            self.handle_trading_logic()
+
+    def update_current_price(self, last_price):
         if last_price != self.current_price:
             self.current_price = last_price
+            return True
+        return False
+
+    def update_market_depth(self, message):
+        return False
+
+    def handle_order_monitoring(self, message):
+        # Execution reports are broadcast to every trader, paper traders have no exchange order to follow
+        pass
+
+    def handle_market_batch(self, depth_message, trade_message):
+        # Applies everything drained from the mailbox, then evaluates the strategy once
+        updated = depth_message is not None and self.update_market_depth(depth_message)
+        if trade_message is not None and self.update_current_price(Decimal(trade_message.price)):
+            updated = True
+        if updated:
             self.handle_trading_logic()
 
+    def _record_trade(self, order):
+        """
+        Adds a closed order to the trade history.
+        """
+        self.trade_history.append(order)
+        self.daily_profits.add(order.closed_at_ts, order.profit)
+
+    def compute_daily_profits(self):
+        """
+        :return: the cumulative realized profit/loss at the end of each day, a zero for today if no trade closed.
+        """
+        cumulative_profits = self.daily_profits.cumulative()
+        if len(cumulative_profits) == 0:
+            return {self.clock.utcnow().date().strftime("%d/%m/%Y"): Decimal(0)}
+        return cumulative_profits
+
     @abstractmethod
     def handle_trading_logic(self):
         pass
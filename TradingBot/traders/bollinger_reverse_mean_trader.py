@@ -1,15 +1,20 @@
 import logging
 import queue
-import time
-from collections import defaultdict
-from datetime import datetime
 from decimal import Decimal
 
-import pandas as pd
 from binance.spot import Spot
 
-from date.date_util import get_current_date, compute_duration_until_now
+from date.date_util import get_current_date, compute_duration_until_now, datetime_of, timestamp_ms_of
+from indicators.bollinger import BollingerCandles
+from market_data.candle_store import interval_to_ms
+from market_data.mailbox import ConflatingMailbox
 from traders.abstract_trader import AbstractTrader
+from traders.order import Order, OrderStatus
+
+KLINE_INTERVAL = '15m'
+KLINE_INTERVAL_MS = interval_to_ms(KLINE_INTERVAL)
+KLINES_BOOTSTRAP_LIMIT = 1000
+KLINES_UPDATE_LIMIT = 5
 
 
 
@@ -17,15 +22,17 @@ from traders.abstract_trader import AbstractTrader
 
 class BollingerReverseMeanTrader(AbstractTrader):
 
-    def __init__(self, trader_id, symbol, capital, trade_capital_percentage, api_config):
+    def __init__(self, trader_id, symbol, capital, trade_capital_percentage, api_config, data_directory='data', clock=None,
+                 client=None, trader_updates_queue=None):
         super().__init__(trader_id,
                          symbol,
                          capital,
                          trade_capital_percentage,
                          name='BollingerReverseMeanTrader',
-                         trader_updates_queue=None)
+                         trader_updates_queue=trader_updates_queue,
+                         data_directory=data_directory, clock=clock)
         if self.trading_data is None:
-            self.creation_date = datetime.utcnow().strftime("%d/%m/%YT%H:%M")
+            self.creation_date = self.clock.utcnow().strftime("%d/%m/%YT%H:%M")
             self.trading_data = {
                 'currentOrders': [],
                 'capital': self.capital,
@@ -37,44 +44,51 @@ class BollingerReverseMeanTrader(AbstractTrader):
                 'reserved_amount': 0}
         self.stop_loss_percentage = Decimal('0.05')
         self.api_config = api_config
-        # Initialize Binance client with API keys from environment variables
-        api_key = api_config['credentials']['api-key']  # os.getenv('BINANCE_API_KEY')
-        api_secret = api_config['credentials']['secret']  # os.getenv('BINANCE_API_SECRET')
-        self.client = Spot(api_key=api_key, api_secret=api_secret, base_url=api_config['trades']['base-url'])
+        # Initialize Binance client with API keys from environment variables, unless a simulated exchange is given
+        if client is None:
+            api_key = api_config['credentials']['api-key']  # os.getenv('BINANCE_API_KEY')
+            api_secret = api_config['credentials']['secret']  # os.getenv('BINANCE_API_SECRET')
+            client = Spot(api_key=api_key, api_secret=api_secret, base_url=api_config['trades']['base-url'])
+        self.client = client
         self.reserved_amount = Decimal(self.trading_data['reserved_amount'])
         self.fees_to_cover = Decimal(self.trading_data['fees_to_cover'])
         self.free_slots = self.trading_data['free_slots']
         self.current_orders = []
         self.order_queue = queue.Queue(maxsize=1000)
-        self.queue = queue.Queue(maxsize=1000)
+        self.queue = ConflatingMailbox()
+        # Bands of the 15 minutes candles, updated with the new klines only
+        self.kline_interval = KLINE_INTERVAL
+        self.candles = BollingerCandles(window=20, num_std=2, history=3, interval_ms=KLINE_INTERVAL_MS)
+        # The three candles pattern includes the candle in progress, checked on each of its updates
+        self.partial_candles = True
         self.synchronize_orders()
 
     def synchronize_orders(self):
 
         for order in self.current_orders:
-            if order['status'] == 'sale_in_progress':
-                remote_order = self.client.get_order(symbol=self.symbol, orderId=order['id'])
+            if order.status == OrderStatus.SALE_IN_PROGRESS:
+                remote_order = self.client.get_order(symbol=self.symbol, orderId=order.id)
                 if remote_order['status'] == 'FILLED':
-                    order['sailed_quantity'] = Decimal(remote_order['executedQty'])
-                    order['closed_at'] = get_current_date()
-                    order['sale_price'] = Decimal(remote_order['price'])
-                    start_datetime = datetime.strptime(order['opened_at'], "%d/%m/%YT%H:%M")
-                    order['duration'] = compute_duration_until_now(start_datetime)
-                    order['sale_timestamp'] = time.time()
-                    order['sale_fee'] = Decimal(remote_order['cummulativeQuoteQty']) * self.trading_fee_percentage
-                    order['profit'] = Decimal(remote_order['cummulativeQuoteQty']) - order['cost'] - order[
-                        'sale_fee'] - self.fees_to_cover
-                    order['status'] = 'closed'
+                    order.sailed_quantity = Decimal(remote_order['executedQty'])
+                    order.closed_at = get_current_date(self.clock)
+                    order.closed_at_ts = self.clock.time_ms()
+                    order.sale_price = Decimal(remote_order['price'])
+                    start_datetime = datetime_of(timestamp_ms_of(order, 'opened_at'))
+                    order.duration = compute_duration_until_now(start_datetime, self.clock)
+                    order.sale_timestamp = self.clock.time()
+                    order.sale_fee = Decimal(remote_order['cummulativeQuoteQty']) * self.trading_fee_percentage
+                    order.profit = (Decimal(remote_order['cummulativeQuoteQty']) - order.cost - order.sale_fee
+                                    - self.fees_to_cover)
+                    order.status = OrderStatus.CLOSED
                     self.update_capital(action='sell',
-                                        total=Decimal(remote_order['cummulativeQuoteQty']) - order['sale_fee'])
-                    self.trade_history.append(order)
+                                        total=Decimal(remote_order['cummulativeQuoteQty']) - order.sale_fee)
+                    self._record_trade(order)
                     self.current_orders.remove(order)
                     self.update_file()
 
     def process_update(self, data):
-        klines = self.compute_klines(data)
-        bollinger_data = self.calculate_bollinger_bands(klines, window=20, num_std=2)
-        conditions_satisfied = self.check_bollinger_conditions(bollinger_data)
+        self.candles.update_klines(data)
+        conditions_satisfied = self.check_bollinger_conditions(self.candles.last(3))
         if conditions_satisfied:
             print('condition satisfied')
         if conditions_satisfied and len(self.current_orders) == 0:
@@ -84,75 +98,44 @@ class BollingerReverseMeanTrader(AbstractTrader):
             print('Buying order')
             self.buy_order()
 
-    def compute_klines(self, data):
-        columns = [
-            'timestamp', 'open', 'high', 'low', 'close', 'volume',
-            'close_time', 'quote_asset_volume', 'trades',
-            'taker_base_vol', 'taker_quote_vol', 'ignore'
-        ]
-        data = pd.DataFrame(data, columns=columns)
-
-        # Convert relevant columns to numeric
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            data[col] = pd.to_numeric(data[col])
-
-        # Use timestamp as datetime index
-        data['timestamp'] = pd.to_datetime(data['timestamp'], unit='ms')
-        data.set_index('timestamp', inplace=True)
-
-        return data[['open', 'high', 'low', 'close', 'volume']]
+    def klines_limit(self):
+        # The whole window is only needed until the bands are ready, then the latest klines are enough
+        return KLINES_BOOTSTRAP_LIMIT if not self.candles.ready else KLINES_UPDATE_LIMIT
 
-    def check_bollinger_conditions(self, data: pd.DataFrame) -> bool:
+    def check_bollinger_conditions(self, candles) -> bool:
         """
         Checks if the following conditions are met on the last 3 candles:
         1. The first candle opens above the lower Bollinger band and closes below it.
         2. The second candle opens below the lower Bollinger band and closes above it.
         3. The third candle opens at or above the close of the second candle and closes above the close of the second candle.
-        :param data: DataFrame containing Bollinger Bands and candlestick data.
+        :param candles: last 3 BandCandle, oldest first.
         :return: True if all conditions are met, otherwise False.
         """
-        # Get the last 3 candlesticks
-        last_3 = data.tail(3)
-
-        if len(last_3) < 3:
+        if len(candles) < 3 or candles[0].lower is None:
             return False  # Not enough data to evaluate conditions
 
         # Assign the 3 candles to variables
-        candle1, candle2, candle3 = last_3.iloc[0], last_3.iloc[1], last_3.iloc[2]
+        candle1, candle2, candle3 = candles
 
         # Condition 1: First candle
         condition1 = (
-                candle1['open'] > candle1['Lower_Band'] > candle1['close']
+                candle1.open > candle1.lower > candle1.close
         )
 
         # Condition 2: Second candle
         condition2 = (
-                candle2['open'] < candle2['Lower_Band'] < candle2['close']
+                candle2.open < candle2.lower < candle2.close
         )
 
         # Condition 3: Third candle
         condition3 = (
-                candle3['open'] >= candle2['close'] and
-                candle3['close'] > candle2['close']
+                candle3.open >= candle2.close and
+                candle3.close > candle2.close
         )
 
         # Return True if all conditions are met
         return condition1 and condition2 and condition3
 
-    def calculate_bollinger_bands(self, data: pd.DataFrame, window: int = 20, num_std: int = 2):
-        """
-        Calculates Bollinger Bands for a given DataFrame.
-        :param data: DataFrame containing 'close' prices.
-        :param window: Window size for moving average.
-        :param num_std: Number of standard deviations for bands.
-        :return: DataFrame with Bollinger Bands.
-        """
-        data['MA'] = data['close'].rolling(window=window).mean()
-        data['STD'] = data['close'].rolling(window=window).std()
-        data['Upper_Band'] = data['MA'] + (data['STD'] * num_std)
-        data['Lower_Band'] = data['MA'] - (data['STD'] * num_std)
-        return data
-
     def update_file(self):
         self.trading_data['currentOrders'] = self.current_orders
         self.trading_data['capital'] = self.capital
@@ -171,46 +154,10 @@ class BollingerReverseMeanTrader(AbstractTrader):
             self.capital += total
 
     def init_data(self):
-        self.current_orders = self.trading_data['currentOrders']
-        for order in self.current_orders:
-            self.to_decimal(order)
+        self.current_orders = [Order.from_dict(order) for order in self.trading_data['currentOrders']]
         self.capital = Decimal(self.trading_data['capital'])
-        self.trade_history = self.trading_data['tradeHistory']
+        self.trade_history = [Order.from_dict(order) for order in self.trading_data['tradeHistory']]
         self.creation_date = self.trading_data['creation_date']
-        for order in self.trade_history:
-            self.to_decimal(order)
-            if 'sailed_quantity' in order:
-                order['sailed_quantity'] = Decimal(order['sailed_quantity'])
-            if 'sale_price' in order:
-                order['sale_price'] = Decimal(order['sale_price'])
-            if 'sale_fee' in order:
-                order['sale_fee'] = Decimal(order['sale_fee'])
-            if 'profit' in order:
-                order['profit'] = Decimal(order['profit'])
-
-    def to_decimal(self, order):
-        if 'cost' in order:
-            order['cost'] = Decimal(order['cost'])
-        if 'buy_price' in order:
-            order['buy_price'] = Decimal(order['buy_price'])
-        if 'quantity' in order:
-            order['quantity'] = Decimal(order['quantity'])
-        if 'buy_fee' in order:
-            order['buy_fee'] = Decimal(order['buy_fee'])
-        if 'max_price' in order:
-            order['max_price'] = Decimal(order['max_price'])
-        if 'stop_loss_price' in order:
-            order['stop_loss_price'] = Decimal(order['stop_loss_price'])
-        if 'support' in order:
-            order['support'] = Decimal(order['support'])
-        if 'support_volume' in order:
-            order['support_volume'] = Decimal(order['support_volume'])
-        if 'capital' in order:
-            order['capital'] = Decimal(order['capital'])
-        if 'detected_price' in order:
-            order['detected_price'] = Decimal(order['detected_price'])
-        if 'buy_commission' in order:
-            order['buy_commission'] = Decimal(order['buy_commission'])
 
     def handle_trading_logic(self):
         pass
@@ -219,7 +166,7 @@ class BollingerReverseMeanTrader(AbstractTrader):
         analytics = {}
         total_profit_loss = Decimal('0')
         for trade in self.trade_history:
-            total_profit_loss += trade['profit']
+            total_profit_loss += trade.profit
         analytics['total_profit_loss'] = total_profit_loss
         for trade in self.current_orders:
             potential_profit_loss = self.compute_potential_profit_loss(trade)
@@ -237,7 +184,7 @@ class BollingerReverseMeanTrader(AbstractTrader):
             current_price = self.current_price
         total_sale = current_price * Decimal('0.0001')
         sale_fee = total_sale * self.trading_fee_percentage
-        potential_profit_loss = total_sale - order['cost'] - sale_fee - self.fees_to_cover
+        potential_profit_loss = total_sale - order.cost - sale_fee - self.fees_to_cover
         return potential_profit_loss
 
     def buy_fees(self):
@@ -278,14 +225,15 @@ class BollingerReverseMeanTrader(AbstractTrader):
             )
             order_id = order['orderId']
             order_reserved_amount = self.current_price * quantity
-            new_order = {
-                'id': order_id,
-                'opened_at': get_current_date(),
-                'detected_price': self.current_price,
-                'status': 'buy_in_progress',
-                'secured': False,
-                'reserved_amount': order_reserved_amount
-            }
+            new_order = Order(
+                id=order_id,
+                opened_at=get_current_date(self.clock),
+                opened_at_ts=self.clock.time_ms(),
+                detected_price=self.current_price,
+                status=OrderStatus.BUY_IN_PROGRESS,
+                secured=False,
+                reserved_amount=order_reserved_amount
+            )
             self.free_slots -= 1
             self.reserved_amount += order_reserved_amount
             self.current_orders.append(new_order)
@@ -295,7 +243,7 @@ class BollingerReverseMeanTrader(AbstractTrader):
 
     def handle_order_monitoring(self, message):
         for order in self.current_orders:
-            if order['id'] == message['i'] or order.get('sale_order_id', None) == message['i']:
+            if order.id == message['i'] or order.sale_order_id == message['i']:
                 status = message['X']
                 if status == 'FILLED':
                     if message['S'] == 'BUY':
@@ -304,51 +252,28 @@ class BollingerReverseMeanTrader(AbstractTrader):
         print('handle_order_monitoring executed')
 
     def update_buy_order(self, message, order):
-        order['cost'] = Decimal(message['Z'])
-        order['buy_commission'] = Decimal(message['n'])
-        order['quantity'] = Decimal(message['z'])
-        order['buy_price'] = order['cost'] / Decimal(message['z'])
-        order['buy_fee'] = order['buy_commission'] * order['buy_price']
-
-        order['max_price'] = order['buy_price']
-        order['stop_loss_price'] = order['buy_price'] * (Decimal('1') - self.stop_loss_percentage)
-        order['secured'] = False
-        order['status'] = 'open'
-        self.reserved_amount -= order['reserved_amount']
-        self.update_capital('buy', order['cost'])
+        order.cost = Decimal(message['Z'])
+        order.buy_commission = Decimal(message['n'])
+        order.quantity = Decimal(message['z'])
+        order.buy_price = order.cost / Decimal(message['z'])
+        order.buy_fee = order.buy_commission * order.buy_price
+
+        order.max_price = order.buy_price
+        order.stop_loss_price = order.buy_price * (Decimal('1') - self.stop_loss_percentage)
+        order.secured = False
+        order.status = OrderStatus.OPEN
+        self.reserved_amount -= order.reserved_amount
+        self.update_capital('buy', order.cost)
         self.update_file()
 
-    def compute_daily_profits(self):
-        daily_profits = defaultdict(Decimal)  # Initialisation avec valeur par défaut de 0.0 pour chaque clé
-
-        # Collecte des profits par jour
-        for order in self.trade_history:
-            day = datetime.strptime(order['closed_at'], "%d/%m/%YT%H:%M").date()
-            day_str = day.strftime("%d/%m/%Y")
-            daily_profits[day_str] += order['profit']
-
-        # Ordonner les jours et calculer les cumuls progressifs
-        sorted_days = sorted(daily_profits.keys(), key=lambda d: datetime.strptime(d, "%d/%m/%Y"))
-        cumulative_profits = {}
-        cumulative_total = Decimal(0)
-
-        for day in sorted_days:
-            cumulative_total += daily_profits[day]
-            cumulative_profits[day] = cumulative_total
-
-        if len(cumulative_profits) == 0:
-            return {datetime.now().date().strftime("%d/%m/%Y"): Decimal(0)}
-
-        return cumulative_profits
-
     def compute_potential_total_profit_loss(self):
         total_profit_loss = Decimal('0')
         # Add realized profit/loss from trade history
         for trade in self.trade_history:
-            total_profit_loss += trade['profit']
+            total_profit_loss += trade.profit
         # Add unrealized profit/loss from open trades
         for trade in self.current_orders:
-            if trade['status'] != 'buy_in_progress':
+            if trade.status != OrderStatus.BUY_IN_PROGRESS:
                 potential_profit_loss = self.compute_potential_profit_loss(trade)
                 if potential_profit_loss is not None:
                     total_profit_loss += potential_profit_loss
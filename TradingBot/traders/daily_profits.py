@@ -0,0 +1,39 @@
+from decimal import Decimal
+
+from sortedcontainers import SortedDict
+
+from date.date_util import datetime_of
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+class DailyProfits:
+    """
+    Realized profit/loss of a trader per UTC day, added as each trade closes so that the daily curve is read
+    without going through the trade history.
+    """
+
+    def __init__(self):
+        # Day number since the epoch -> profit/loss of the trades closed that day
+        self.buckets = SortedDict()
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def add(self, closed_at_ms, profit):
+        day = closed_at_ms // DAY_MS
+        self.buckets[day] = self.buckets.get(day, Decimal('0')) + profit
+
+    def cumulative(self):
+        """
+        :return: the cumulative profit/loss at the end of each day with closed trades, by "%d/%m/%Y" day in order.
+        """
+        cumulative_profits = {}
+        cumulative_total = Decimal('0')
+        for day, profit in self.buckets.items():
+            cumulative_total += profit
+            cumulative_profits[datetime_of(day * DAY_MS).strftime("%d/%m/%Y")] = cumulative_total
+        return cumulative_profits
+
+    def clear(self):
+        self.buckets.clear()
@@ -1,18 +1,18 @@
 import logging
-from datetime import datetime
-import time
 from decimal import Decimal
 
 from binance.spot import Spot
 
-from date.date_util import get_current_date, compute_duration_until_now
+from date.date_util import get_current_date, compute_duration_until_now, datetime_of, timestamp_ms_of
 from traders.abstract_multi_trade_trader import AbstractMultiTradeTrader
+from traders.order import Order, OrderStatus
 
 
 class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
 
     def __init__(self, trader_id, symbol, capital, trade_capital_percentage, order_book,
-                 trader_updates_queue, target_volume, respected_gap_value, api_config):
+                 trader_updates_queue, target_volume, respected_gap_value, api_config, data_directory='data', clock=None,
+                 client=None):
         super().__init__(trader_id,
                          symbol,
                          capital,
@@ -21,13 +21,16 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
                          name='MinMaxRealSecuredCapitalTrader',
                          trader_updates_queue=trader_updates_queue,
                          target_volume=target_volume,
-                         respected_gap_value=respected_gap_value)
+                         respected_gap_value=respected_gap_value,
+                         data_directory=data_directory, clock=clock)
         self.stop_loss_percentage = Decimal('0.05')
         self.api_config = api_config
-        # Initialize Binance client with API keys from environment variables
-        api_key = api_config['credentials']['api-key']  # os.getenv('BINANCE_API_KEY')
-        api_secret = api_config['credentials']['secret']  # os.getenv('BINANCE_API_SECRET')
-        self.client = Spot(api_key=api_key, api_secret=api_secret, base_url=api_config['trades']['base-url'])
+        # Initialize Binance client with API keys from environment variables, unless a simulated exchange is given
+        if client is None:
+            api_key = api_config['credentials']['api-key']  # os.getenv('BINANCE_API_KEY')
+            api_secret = api_config['credentials']['secret']  # os.getenv('BINANCE_API_SECRET')
+            client = Spot(api_key=api_key, api_secret=api_secret, base_url=api_config['trades']['base-url'])
+        self.client = client
         self.exchange_info = self.client.exchange_info(symbol=self.symbol)
         self.min_order_value = self.extract_min_order_value(self.exchange_info['symbols'][0]['filters'])
         self.reserved_amount = Decimal(self.trading_data['reserved_amount'])
@@ -40,9 +43,7 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
 
     def handle_trading_logic(self):
         if self.current_price:
-            for order in self.current_orders[:]:
-                if order['status'] != "buy_in_progress" and order['status'] != "sale_in_progress":
-                    self.update_order(order)
+            self.update_triggered_orders()
 
         if self.can_buy():
             order_size = self.calculate_order_size()
@@ -66,19 +67,6 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
                     and not self.is_price_in_buy_orders(self.current_price))
         return False
 
-    def compute_analytics(self):
-        analytics = {}
-        total_profit_loss = Decimal('0')
-        for trade in self.trade_history:
-            total_profit_loss += trade['profit']
-        analytics['total_profit_loss'] = total_profit_loss
-        for trade in self.current_orders:
-            potential_profit_loss = self.compute_potential_profit_loss(trade)
-            if potential_profit_loss is not None:
-                total_profit_loss += potential_profit_loss
-        analytics['potential_profit_loss'] = total_profit_loss
-        return analytics
-
     def buy_order(self, order_size):
         try:
             quantity = Decimal('0.00010000')
@@ -93,39 +81,41 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
             # Extract order details
             order_id = order['orderId']
             order_reserved_amount = self.current_price * quantity
-            new_order = {
-                'id': order_id,
-                'opened_at': get_current_date(),
-                'detected_price': self.current_price,
-                'status': 'buy_in_progress',
-                'secured': False,
-                'support': self.support['value'],
-                'support_volume': self.support['volume'],
-                'support_index': self.support['index'],
-                'reserved_amount': order_reserved_amount
-            }
+            new_order = Order(
+                id=order_id,
+                opened_at=get_current_date(self.clock),
+                opened_at_ts=self.clock.time_ms(),
+                detected_price=self.current_price,
+                status=OrderStatus.BUY_IN_PROGRESS,
+                secured=False,
+                support=self.support['value'],
+                support_volume=self.support['volume'],
+                support_index=self.support['index'],
+                reserved_amount=order_reserved_amount
+            )
             self.free_slots -= 1
             self.reserved_amount += order_reserved_amount
             self.current_orders.append(new_order)
+            self._track_position(new_order)
             self.update_file()
 
         except Exception as e:
             logging.error(f"Error placing buy order: {e}")
 
     def update_order(self, order):
-        if order['status'] != 'buy_in_progress' and order['status'] != 'sale_in_progress':
-            if self.current_price and self.current_price > order['max_price']:
-                if order.get('secured', False):
+        if order.status != OrderStatus.BUY_IN_PROGRESS and order.status != OrderStatus.SALE_IN_PROGRESS:
+            if self.current_price and self.current_price > order.max_price:
+                if order.secured:
                     self.update_stop_loss(order)
-                order['max_price'] = self.current_price
+                order.max_price = self.current_price
 
-            if not order.get('secured', False):
+            if not order.secured:
                 self.update_secured(order)
-            if (order['stop_loss_price'] >= self.current_price > self.mid_price and order['stop_loss_price'] > order['buy_price']) or self.current_price <= order['stop_loss_price'] < order['buy_price']:
+            if (order.stop_loss_price >= self.current_price > self.mid_price and order.stop_loss_price > order.buy_price) or self.current_price <= order.stop_loss_price < order.buy_price:
                 self.sell_trade(order)
 
     def update_stop_loss(self, order):
-        order['stop_loss_price'] = ((self.current_price - order['max_price']) * Decimal('0.5')) + order['max_price']
+        order.stop_loss_price = ((self.current_price - order.max_price) * Decimal('0.5')) + order.max_price
 
     def update_secured(self, order):
         if self.current_price:
@@ -133,11 +123,11 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
             total_fees = self.fees_to_cover + (self.current_price * self.trading_fee_percentage * Decimal('0.0001'))
             if potential_profit >= total_fees:
                 # Capital secured
-                order['secured'] = True
+                order.secured = True
                 # Adjust the stop-loss to follow the maximum price with trailing stop
-                order['stop_loss_price'] = order['max_price']
+                order.stop_loss_price = order.max_price
                 logging.info(
-                    f"{self.name} : Securing capital for order at {order['buy_price']} with stop loss {order['stop_loss_price']}")
+                    f"{self.name} : Securing capital for order at {order.buy_price} with stop loss {order.stop_loss_price}")
 
     def sell_trade(self, order):
         try:
@@ -149,11 +139,11 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
                                                timeInForce='GTC',
                                                price=str(self.current_price))
 
-            order['status'] = 'sale_in_progress'
-            order['sale_order_id'] = sale_order['orderId']
+            order.status = OrderStatus.SALE_IN_PROGRESS
+            order.sale_order_id = sale_order['orderId']
             self.update_file()
         except Exception as e:
-            logging.error(f"Error when selling order {order['id']}: {e}")
+            logging.error(f"Error when selling order {order.id}: {e}")
 
     def update_file(self):
         self.trading_data['currentOrders'] = self.current_orders
@@ -175,16 +165,16 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
         return -1
 
     def respected_gap(self):
-        # Vérifie si le gap est respecté pour tous les trades
-        for order in self.current_orders:
-            if order['status'] != 'buy_in_progress' and self.current_price >= order['detected_price'] or (
-                    order['detected_price'] - self.current_price) < self.respected_gap_value:
-                return False
-        return True
+        # Vérifie si le gap est respecté pour tous les trades: il suffit de le vérifier pour les plus bas
+        lowest_open_price = self.open_detected_prices.lowest()
+        if lowest_open_price is not None and self.current_price >= lowest_open_price:
+            return False
+        lowest_price = self.detected_prices.lowest()
+        return lowest_price is None or lowest_price - self.current_price >= self.respected_gap_value
 
     def handle_order_monitoring(self, message):
         for order in self.current_orders:
-            if order['id'] == message['i'] or order.get('sale_order_id', None) == message['i']:
+            if order.id == message['i'] or order.sale_order_id == message['i']:
                 status = message['X']
                 if status == 'FILLED':
                     if message['S'] == 'BUY':
@@ -195,35 +185,38 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
         print('handle_order_monitoring executed')
 
     def update_buy_order(self, message, order):
-        order['cost'] = Decimal(message['Z'])
-        order['buy_commission'] = Decimal(message['n'])
-        order['quantity'] = Decimal(message['z'])
-        order['buy_price'] = order['cost'] / Decimal(message['z'])
-        order['buy_fee'] = order['buy_commission'] * order['buy_price']
-
-        order['max_price'] = order['buy_price']
-        order['stop_loss_price'] = order['buy_price'] * (Decimal('1') - self.stop_loss_percentage)
-        order['secured'] = False
-        order['status'] = 'open'
-        self.reserved_amount -= order['reserved_amount']
-        self.update_capital('buy', order['cost'])
+        order.cost = Decimal(message['Z'])
+        order.buy_commission = Decimal(message['n'])
+        order.quantity = Decimal(message['z'])
+        order.buy_price = order.cost / Decimal(message['z'])
+        order.buy_fee = order.buy_commission * order.buy_price
+
+        order.max_price = order.buy_price
+        order.stop_loss_price = order.buy_price * (Decimal('1') - self.stop_loss_percentage)
+        order.secured = False
+        order.status = OrderStatus.OPEN
+        self._track_position(order)
+        self.reserved_amount -= order.reserved_amount
+        self.update_capital('buy', order.cost)
         self.update_file()
 
     def update_sale_order(self, message, order):
 
-        order['sailed_quantity'] = Decimal(message['z'])
-        order['closed_at'] = get_current_date()
-        order['sale_price'] = Decimal(message['L'])
-        start_datetime = datetime.strptime(order['opened_at'], "%d/%m/%YT%H:%M")
-        order['duration'] = compute_duration_until_now(start_datetime)
-        order['sale_timestamp'] = time.time()
-        order['sale_fee'] = Decimal(message['Z']) * self.trading_fee_percentage
-        order['profit'] = Decimal(message['Z']) - order['cost'] - order['sale_fee'] - self.fees_to_cover
-        order['cumulative_coin_quantity'] = order['quantity'] - Decimal('0.0001')
-        order['status'] = 'closed'
-        self.update_capital(action='sell', total=Decimal(message['Z']) - order['sale_fee'])
-        self.trade_history.append(order)
+        order.sailed_quantity = Decimal(message['z'])
+        order.closed_at = get_current_date(self.clock)
+        order.closed_at_ts = self.clock.time_ms()
+        order.sale_price = Decimal(message['L'])
+        start_datetime = datetime_of(timestamp_ms_of(order, 'opened_at'))
+        order.duration = compute_duration_until_now(start_datetime, self.clock)
+        order.sale_timestamp = self.clock.time()
+        order.sale_fee = Decimal(message['Z']) * self.trading_fee_percentage
+        order.profit = Decimal(message['Z']) - order.cost - order.sale_fee - self.fees_to_cover
+        order.cumulative_coin_quantity = order.quantity - Decimal('0.0001')
+        order.status = OrderStatus.CLOSED
+        self.update_capital(action='sell', total=Decimal(message['Z']) - order.sale_fee)
+        self._record_trade(order)
         self.current_orders.remove(order)
+        self._untrack_position(order)
         self.update_file()
 
     def update_capital(self, action, total):
@@ -245,9 +238,22 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
             current_price = self.current_price
         total_sale = current_price * Decimal('0.0001')
         sale_fee = total_sale * self.trading_fee_percentage
-        potential_profit_loss = total_sale - order['cost'] - sale_fee - self.fees_to_cover
+        potential_profit_loss = total_sale - order.cost - sale_fee - self.fees_to_cover
         return potential_profit_loss
 
+    def compute_unrealized_profit_loss(self, current_price=None):
+        if current_price is None:
+            if self.current_price is None:
+                return None
+            current_price = self.current_price
+        # Every position holds the same quantity
+        total_sale = current_price * Decimal('0.0001')
+        sale_fee = total_sale * self.trading_fee_percentage
+        positions = self.open_positions
+        if positions.count == 0:
+            return Decimal('0')
+        return (total_sale - sale_fee - self.fees_to_cover) * positions.count - positions.cost
+
     def buy_fees(self):
         try:
             quantity = Decimal('0.0000001') * Decimal('1000')
@@ -266,6 +272,8 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
                 total_cost += price * qty
             self.free_slots = 999
             self.fees_to_cover = total_cost / self.free_slots
+            # Securing the capital depends on the fees to cover
+            self.triggers.mark_all_due()
             logging.info(f'fees to cover {self.fees_to_cover}')
             self.capital -= total_cost
             self.update_file()
@@ -273,8 +281,7 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
         except Exception as e:
             logging.error(f"Error placing buy order: {e}")
 
-    def handle_ticker_message(self, message):
-        last_price = Decimal(message['p'])
+    def update_current_price(self, last_price):
         if last_price != self.current_price:
             save_data_required = False
             self.current_price = last_price
@@ -287,7 +294,8 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
             if save_data_required:
                 self.mid_price = self.min_price + ((self.max_price - self.min_price) / 2)
                 self.update_file()
-            self.handle_trading_logic()
+            return True
+        return False
 
     def init_data(self):
         super().init_data()
@@ -298,23 +306,25 @@ class MinMaxSecuredCapitalTrader(AbstractMultiTradeTrader):
     def synchronize_orders(self):
 
         for order in self.current_orders:
-            if order['status'] == 'sale_in_progress':
-                remote_order = self.client.get_order(symbol=self.symbol, orderId=order['id'])
+            if order.status == OrderStatus.SALE_IN_PROGRESS:
+                remote_order = self.client.get_order(symbol=self.symbol, orderId=order.id)
                 if remote_order['status'] == 'FILLED':
-                    order['sailed_quantity'] = Decimal(remote_order['executedQty'])
-                    order['closed_at'] = get_current_date()
-                    order['sale_price'] = Decimal(remote_order['price'])
-                    start_datetime = datetime.strptime(order['opened_at'], "%d/%m/%YT%H:%M")
-                    order['duration'] = compute_duration_until_now(start_datetime)
-                    order['sale_timestamp'] = time.time()
-                    order['sale_fee'] = Decimal(remote_order['cummulativeQuoteQty']) * self.trading_fee_percentage
-                    order['profit'] = Decimal(remote_order['cummulativeQuoteQty']) - order['cost'] - order[
-                        'sale_fee'] - self.fees_to_cover
-                    order['status'] = 'closed'
+                    order.sailed_quantity = Decimal(remote_order['executedQty'])
+                    order.closed_at = get_current_date(self.clock)
+                    order.closed_at_ts = self.clock.time_ms()
+                    order.sale_price = Decimal(remote_order['price'])
+                    start_datetime = datetime_of(timestamp_ms_of(order, 'opened_at'))
+                    order.duration = compute_duration_until_now(start_datetime, self.clock)
+                    order.sale_timestamp = self.clock.time()
+                    order.sale_fee = Decimal(remote_order['cummulativeQuoteQty']) * self.trading_fee_percentage
+                    order.profit = (Decimal(remote_order['cummulativeQuoteQty']) - order.cost - order.sale_fee
+                                    - self.fees_to_cover)
+                    order.status = OrderStatus.CLOSED
                     self.update_capital(action='sell',
-                                        total=Decimal(remote_order['cummulativeQuoteQty']) - order['sale_fee'])
-                    self.trade_history.append(order)
+                                        total=Decimal(remote_order['cummulativeQuoteQty']) - order.sale_fee)
+                    self._record_trade(order)
                     self.current_orders.remove(order)
+                    self._untrack_position(order)
                     self.update_file()
 
 
@@ -0,0 +1,70 @@
+import logging
+from decimal import Decimal
+from enum import Enum
+
+
+class OrderStatus(str, Enum):
+    BUY_IN_PROGRESS = 'buy_in_progress'
+    OPEN = 'open'
+    SALE_IN_PROGRESS = 'sale_in_progress'
+    CLOSED = 'closed'
+
+    def __str__(self):
+        return self.value
+
+
+# Amounts and prices, stored as strings by DecimalEncoder and read back as Decimal
+DECIMAL_FIELDS = ('detected_price', 'buy_price', 'quantity', 'cost', 'buy_fee', 'buy_commission', 'buy_slippage',
+                  'reserved_amount', 'capital', 'max_price', 'stop_loss_price', 'support', 'support_volume',
+                  'sailed_quantity', 'sale_price', 'sale_fee', 'sale_slippage', 'profit', 'cumulative_coin_quantity')
+FIELDS = ('id', 'opened_at', 'opened_at_ts', 'closed_at', 'closed_at_ts', 'duration', 'status', 'secured',
+          'support_index', 'sale_order_id', 'sale_timestamp') + DECIMAL_FIELDS
+
+
+class Order:
+    """
+    Position of a trader, from its buy to its sale. Fields that do not apply to the order, or not yet, are None,
+    and are left out of the saved dict so that the trading files keep their layout.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, id, status, **fields):
+        for name in FIELDS:
+            setattr(self, name, None)
+        self.id = id
+        self.status = OrderStatus(status)
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"Order({self.to_dict()})"
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        :param data: order read from a trading file, unknown keys are dropped.
+        """
+        fields = {}
+        for name, value in data.items():
+            if name not in FIELDS:
+                logging.warning(f"Unknown order field {name} dropped from order {data.get('id')}")
+            elif name in DECIMAL_FIELDS and value is not None:
+                fields[name] = Decimal(value)
+            else:
+                fields[name] = value
+        return cls(**fields)
+
+    def to_dict(self):
+        data = {}
+        for name in FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value.value if name == 'status' else value
+        return data
+
+    def copy(self):
+        order = Order.__new__(Order)
+        for name in FIELDS:
+            setattr(order, name, getattr(self, name))
+        return order
@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+from traders.price_index import is_position_open
+
+ZERO = Decimal('0')
+
+
+class PositionTotals:
+    """
+    Running totals of the open positions of a trader: count, quantity, buy value (buy price times quantity), cost
+    and buy fees, so that the profit/loss of all of them at a price is computed in O(1).
+    Maintained like the price indexes: an order is tracked again whenever these values or its status change.
+
+    :param include: filter of the totalled orders, the open positions by default.
+    """
+
+    def __init__(self, include=is_position_open):
+        self.include = include
+        self.count = 0
+        self.quantity = ZERO
+        self.buy_value = ZERO
+        self.cost = ZERO
+        self.buy_fees = ZERO
+        # Values added per order, subtracted when it is tracked again or untracked
+        self.tracked = {}
+
+    def __len__(self):
+        return self.count
+
+    def track(self, order):
+        self.untrack(order)
+        if not self.include(order):
+            return
+        quantity = order.quantity or ZERO
+        buy_price = order.buy_price or ZERO
+        values = (quantity, buy_price * quantity, order.cost or ZERO, order.buy_fee or ZERO)
+        self.tracked[id(order)] = values
+        self.__add(1, values)
+
+    def untrack(self, order):
+        values = self.tracked.pop(id(order), None)
+        if values is None:
+            return
+        if not self.tracked:
+            # Rounded additions and subtractions could leave a residue
+            self.clear()
+        else:
+            self.__add(-1, values)
+
+    def clear(self):
+        self.count = 0
+        self.quantity = self.buy_value = self.cost = self.buy_fees = ZERO
+        self.tracked.clear()
+
+    def __add(self, sign, values):
+        quantity, buy_value, cost, buy_fee = values
+        self.count += sign
+        self.quantity += sign * quantity
+        self.buy_value += sign * buy_value
+        self.cost += sign * cost
+        self.buy_fees += sign * buy_fee
@@ -0,0 +1,48 @@
+from sortedcontainers import SortedList
+
+from traders.order import OrderStatus
+
+
+def is_position_open(order):
+    # Orders still waiting for their buy fill are not positions yet
+    return order.status != OrderStatus.BUY_IN_PROGRESS
+
+
+class PriceIndex:
+    """
+    Sorted `price_key` values of the orders of a trader, kept next to the orders so that the lowest price is
+    read and maintained in O(log n) instead of a scan of every order.
+    An order must be tracked again whenever its price or status changes, and untracked when it is removed.
+
+    :param include: filter of the indexed orders, every order having the price by default.
+    """
+
+    def __init__(self, price_key, include=None):
+        self.price_key = price_key
+        self.include = include
+        self.prices = SortedList()
+        # Indexed price per order, orders are keyed by identity
+        self.indexed = {}
+
+    def __len__(self):
+        return len(self.prices)
+
+    def track(self, order):
+        self.untrack(order)
+        price = getattr(order, self.price_key)
+        if price is None or (self.include is not None and not self.include(order)):
+            return
+        self.indexed[id(order)] = price
+        self.prices.add(price)
+
+    def untrack(self, order):
+        price = self.indexed.pop(id(order), None)
+        if price is not None:
+            self.prices.remove(price)
+
+    def lowest(self):
+        return self.prices[0] if self.prices else None
+
+    def clear(self):
+        self.prices.clear()
+        self.indexed.clear()
@@ -0,0 +1,148 @@
+from decimal import Decimal
+
+from simulation.fill_model import create_fill_model
+from traders.FundingRateTrader import FundingRateTrader
+from traders.SecuredCapitalTrader import SecuredCapitalTrader
+from traders.abstract_support_trader import AbstractSupportTrader
+from traders.bollinger_original_reverse_mean_trader import BollingerOriginalReverseMeanTrader
+from traders.bollinger_reverse_mean_trader import BollingerReverseMeanTrader
+from traders.min_max_secured_capital_trader import MinMaxSecuredCapitalTrader
+from traders.min_max_trader import MinMaxTrader
+from traders.real_secured_capital_trader import RealSecuredCapitalTrader
+
+
+def create_trader(config, trader_id, trader_config, capital, trade_capital_percentage, trader_update_queue,
+                  order_book_provider, data_directory='data', clock=None, client=None):
+    """
+    Builds the trader described by one entry of the `trading.traders` configuration.
+    Optional `stop-loss-percentage`, `volume-threshold-factor` and `partial-candles` entries override the trader
+    defaults, `volume-threshold-factor` only applies to the support traders.
+    :param order_book_provider: returns the shared order book of a symbol.
+    :param data_directory: directory of the trader state files.
+    :param clock: clock of the trader, the wall clock by default.
+    :param client: exchange client of the traders placing orders, a Binance Spot client by default.
+    :return: the trader, or None if the type is unknown.
+    """
+    trader = instantiate_trader(config, trader_id, trader_config, capital, trade_capital_percentage,
+                                trader_update_queue, order_book_provider, data_directory, clock, client)
+    if trader is None:
+        return None
+    if 'stop-loss-percentage' in trader_config:
+        trader.stop_loss_percentage = Decimal(str(trader_config['stop-loss-percentage']))
+    if 'volume-threshold-factor' in trader_config:
+        if not isinstance(trader, AbstractSupportTrader):
+            raise ValueError(f"volume-threshold-factor is not supported by {trader_config['type']} traders, "
+                             f"only by the support traders")
+        trader.set_volume_threshold_factor(trader_config['volume-threshold-factor'])
+    if 'partial-candles' in trader_config:
+        trader.partial_candles = bool(trader_config['partial-candles'])
+    return trader
+
+
+def instantiate_trader(config, trader_id, trader_config, capital, trade_capital_percentage, trader_update_queue,
+                       order_book_provider, data_directory, clock, client):
+    trader_type = trader_config['type']
+    symbol = trader_config['symbol']
+    if trader_type == 'SecuredCapitalTrader':
+        order_book = order_book_provider(symbol)
+        target_volume = trader_config['target-volume']
+        respected_gap_value = trader_config['respected-gap-value']
+        return SecuredCapitalTrader(
+            trader_id=trader_id,
+            symbol=symbol,
+            capital=capital,
+            trade_capital_percentage=trade_capital_percentage,
+            order_book=order_book,
+            trader_updates_queue=trader_update_queue,
+            target_volume=target_volume,
+            respected_gap_value=respected_gap_value,
+            data_directory=data_directory,
+            clock=clock,
+            fill_model=create_fill_model(config['trading'].get('fill-model'), order_book, clock)
+        )
+    elif trader_type == 'RealSecuredCapitalTrader':
+        order_book = order_book_provider(symbol)
+        target_volume = trader_config['target-volume']
+        respected_gap_value = trader_config['respected-gap-value']
+        return RealSecuredCapitalTrader(
+            trader_id=trader_id,
+            symbol=symbol,
+            capital=capital,
+            trade_capital_percentage=trade_capital_percentage,
+            order_book=order_book,
+            trader_updates_queue=trader_update_queue,
+            target_volume=target_volume,
+            respected_gap_value=respected_gap_value,
+            api_config=config['api'],
+            data_directory=data_directory,
+            clock=clock,
+            client=client
+        )
+    elif trader_type == 'MinMaxSecuredCapitalTrader':
+        order_book = order_book_provider(symbol)
+        target_volume = trader_config['target-volume']
+        respected_gap_value = trader_config['respected-gap-value']
+        return MinMaxSecuredCapitalTrader(
+            trader_id=trader_id,
+            symbol=symbol,
+            capital=capital,
+            trade_capital_percentage=trade_capital_percentage,
+            order_book=order_book,
+            trader_updates_queue=trader_update_queue,
+            target_volume=target_volume,
+            respected_gap_value=respected_gap_value,
+            api_config=config['api'],
+            data_directory=data_directory,
+            clock=clock,
+            client=client
+        )
+    elif trader_type == 'MinMaxTrader':
+        order_book = order_book_provider(symbol)
+        target_volume = trader_config['target-volume']
+        respected_gap_value = trader_config['respected-gap-value']
+        return MinMaxTrader(
+            trader_id=trader_id,
+            symbol=symbol,
+            capital=capital,
+            trade_capital_percentage=trade_capital_percentage,
+            order_book=order_book,
+            trader_updates_queue=trader_update_queue,
+            target_volume=target_volume,
+            respected_gap_value=respected_gap_value,
+            api_config=config['api'],
+            data_directory=data_directory,
+            clock=clock,
+            client=client
+        )
+    elif trader_type == 'FundingRateTrader':
+        return FundingRateTrader(
+            trader_id=trader_id,
+            symbol=symbol,
+            capital=capital,
+            trade_capital_percentage=trade_capital_percentage,
+            trader_updates_queue=trader_update_queue,
+            data_directory=data_directory,
+            clock=clock)
+    elif trader_type == 'BollingerReverseMeanTrader':
+        return BollingerReverseMeanTrader(
+            trader_id=trader_id,
+            symbol=symbol,
+            capital=capital,
+            trade_capital_percentage=100,
+            api_config=config['api'],
+            data_directory=data_directory,
+            clock=clock,
+            client=client,
+            trader_updates_queue=trader_update_queue)
+    elif trader_type == 'BollingerOriginalReverseMeanTrader':
+        return BollingerOriginalReverseMeanTrader(
+            trader_id=trader_id,
+            symbol=symbol,
+            capital=capital,
+            trade_capital_percentage=100,
+            api_config=config['api'],
+            data_directory=data_directory,
+            clock=clock,
+            client=client,
+            trader_updates_queue=trader_update_queue)
+    return None
@@ -0,0 +1,112 @@
+import heapq
+import itertools
+
+from traders.order import OrderStatus
+
+
+def is_position_armed(order):
+    # Only open positions have their stop loss and trailing stop followed on each price
+    return order.status == OrderStatus.OPEN
+
+
+class TriggerIndex:
+    """
+    Open positions keyed by the prices at which a tick has something to do for them: a max-heap of the stop loss
+    prices, hit when the price falls to or below one, and a min-heap of the max price watermarks, crossed when the
+    price rises above one (trailing stop and max price updates, securing the capital). A tick then only pops the
+    triggered positions instead of going through every open order.
+
+    Entries are deleted lazily: tracking a position again pushes new entries and the previous ones are skipped
+    when they reach the top. Positions popped by `triggered` must be tracked again once processed, with the price
+    they were evaluated at: below its max price, a position is then watched from that price on, because the
+    conditions checked on rising prices (securing the capital) may hold at a higher price that stays under the max.
+    Positions are due on the tick following their first tracking, and all of them after `mark_all_due`, so that
+    conditions depending on more than their own prices are checked again.
+
+    :param include: filter of the tracked positions, the open ones by default.
+    """
+
+    def __init__(self, include=is_position_armed, stop_key='stop_loss_price', watermark_key='max_price'):
+        self.include = include
+        self.stop_key = stop_key
+        self.watermark_key = watermark_key
+        # (-stop loss price, sequence, order key) and (max price, sequence, order key)
+        self.stops = []
+        self.watermarks = []
+        # Sequence of the valid entry of each tracked position in each heap
+        self.stop_entries = {}
+        self.watermark_entries = {}
+        self.orders = {}
+        # Tracking order of the positions, triggered positions are returned in that order
+        self.ranks = {}
+        self.due = set()
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self.orders)
+
+    def track(self, order, evaluated_price=None):
+        """
+        :param evaluated_price: price the position was just evaluated at, None if it was not.
+        """
+        key = id(order)
+        if not self.include(order):
+            self.untrack(order)
+            return
+        if key not in self.orders:
+            self.orders[key] = order
+            self.ranks[key] = next(self._sequence)
+            self.due.add(key)
+        self.__push(self.stops, self.stop_entries, key, -getattr(order, self.stop_key))
+        watermark = getattr(order, self.watermark_key)
+        if evaluated_price is not None and evaluated_price < watermark:
+            watermark = evaluated_price
+        self.__push(self.watermarks, self.watermark_entries, key, watermark)
+
+    def untrack(self, order):
+        key = id(order)
+        if self.orders.pop(key, None) is not None:
+            del self.ranks[key]
+            del self.stop_entries[key]
+            del self.watermark_entries[key]
+            self.due.discard(key)
+
+    def mark_all_due(self):
+        self.due.update(self.orders)
+
+    def triggered(self, price):
+        """
+        :return: the positions whose stop loss price is at or above price, whose max price is below price, or due,
+        in tracking order.
+        """
+        keys = self.due
+        self.due = set()
+        stops, stop_entries = self.stops, self.stop_entries
+        while stops and -stops[0][0] >= price:
+            stop, sequence, key = heapq.heappop(stops)
+            if stop_entries.get(key) == sequence:
+                keys.add(key)
+        watermarks, watermark_entries = self.watermarks, self.watermark_entries
+        while watermarks and watermarks[0][0] < price:
+            watermark, sequence, key = heapq.heappop(watermarks)
+            if watermark_entries.get(key) == sequence:
+                keys.add(key)
+        return [self.orders[key] for key in sorted(keys, key=self.ranks.__getitem__)]
+
+    def clear(self):
+        self.stops.clear()
+        self.watermarks.clear()
+        self.stop_entries.clear()
+        self.watermark_entries.clear()
+        self.orders.clear()
+        self.ranks.clear()
+        self.due.clear()
+
+    def __push(self, heap, entries, key, price):
+        sequence = next(self._sequence)
+        entries[key] = sequence
+        heapq.heappush(heap, (price, sequence, key))
+        if len(heap) > 2 * len(entries) + 32:
+            # Too many stale entries, the heap is rebuilt from the valid ones
+            heap[:] = [entry for entry in heap if entries.get(entry[2]) == entry[1]]
+            heapq.heapify(heap)
@@ -0,0 +1,81 @@
+import argparse
+import calendar
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config.config_util import load_config
+from simulation.replay import build_replay, replay_chunk, split_chunks, symbols_of
+
+
+def parse_time(value):
+    """
+    :param value: epoch milliseconds or a UTC date, YYYY-mm-ddTHH:MM:SS.
+    """
+    if value.isdigit():
+        return int(value)
+    return calendar.timegm(time.strptime(value, '%Y-%m-%dT%H:%M:%S')) * 1000
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Replays recorded market data through the configured traders')
+    parser.add_argument('env', choices=['test', 'prod'])
+    parser.add_argument('--recordings', help='recordings directory, the configured one by default')
+    parser.add_argument('--output', default='replay', help='directory of the trader files written by the replay')
+    parser.add_argument('--speed', type=float, default=None,
+                        help='pace the replay at SPEED times real time, as fast as possible by default')
+    parser.add_argument('--start', type=parse_time, default=None,
+                        help='replay from this time (epoch ms or UTC YYYY-mm-ddTHH:MM:SS), from the start by default')
+    parser.add_argument('--end', type=parse_time, default=None, help='replay until this time, to the end by default')
+    parser.add_argument('--chunks', type=int, default=1,
+                        help='split the recordings in CHUNKS independent replays run in parallel')
+    return parser.parse_args()
+
+
+def log_results(results):
+    for result in results:
+        logging.info(f"{result['trader_id']} : {result['closed_trades']} closed trades, "
+                     f"{result['open_orders']} open orders, realized profit/loss {result['total_profit_loss']}, "
+                     f"potential profit/loss {result['potential_profit_loss']}")
+
+
+def replay_chunks(config, recordings_directory, output, chunks):
+    ranges = split_chunks(recordings_directory, symbols_of(config['trading']['traders']), chunks)
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(replay_chunk, config, recordings_directory, os.path.join(output, f'chunk-{chunk}'),
+                                   start_ms, end_ms) for chunk, (start_ms, end_ms) in enumerate(ranges)]
+        for chunk, future in enumerate(futures):
+            records, results = future.result()
+            start_ms, end_ms = ranges[chunk]
+            logging.info(f"Chunk {chunk} [{start_ms}, {end_ms}) : {records} records")
+            log_results(results)
+    logging.info(f"Replayed {len(ranges)} chunks in {time.perf_counter() - start_time:.1f}s")
+
+
+def start():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    arguments = parse_arguments()
+    config = load_config(arguments.env)
+    recordings_directory = arguments.recordings or (config['trading'].get('recording') or {}).get('directory',
+                                                                                                 'recordings')
+    # Traders resume from existing files, a replay must start from a clean state to be reproducible
+    if glob.glob(os.path.join(arguments.output, '**', '*_trader.json'), recursive=True):
+        logging.error(f"{arguments.output} already holds trader files, remove them or choose another output")
+        return
+    if arguments.chunks > 1:
+        replay_chunks(config, recordings_directory, arguments.output, arguments.chunks)
+        return
+    replay = build_replay(config, recordings_directory, arguments.output, speed=arguments.speed,
+                          start_ms=arguments.start, end_ms=arguments.end)
+    start_time = time.perf_counter()
+    results = replay.run()
+    replay.save_files()
+    logging.info(f"Replayed {replay.records} records in {time.perf_counter() - start_time:.1f}s")
+    log_results(results)
+
+
+if __name__ == '__main__':
+    start()
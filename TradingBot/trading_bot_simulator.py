@@ -1,4 +1,3 @@
-import copy
 import logging
 import os
 import queue
@@ -9,16 +8,15 @@ from decimal import Decimal
 from logging.handlers import RotatingFileHandler
 
 from config.config_util import load_current_config
-from exchange.binance_helper import initialize_order_book
-from traders.FundingRateTrader import FundingRateTrader
-from traders.SecuredCapitalTrader import SecuredCapitalTrader
+from exchange.binance_helper import fetch_depth_snapshot, fetch_symbol_filters
+from market_data.order_book import OrderBook
+from market_data.recorder import MarketDataRecorder
+from simulation.exchange import SimulatedSpotClient
 from traders.TraderManager import TraderManager
 from traders.abstract_support_trader import AbstractSupportTrader
 from traders.bollinger_original_reverse_mean_trader import BollingerOriginalReverseMeanTrader
 from traders.bollinger_reverse_mean_trader import BollingerReverseMeanTrader
-from traders.min_max_secured_capital_trader import MinMaxSecuredCapitalTrader
-from traders.min_max_trader import MinMaxTrader
-from traders.real_secured_capital_trader import RealSecuredCapitalTrader
+from traders.trader_factory import create_trader
 from trading_bot_data import TradingBotData
 from ui.app_manager import AppManager
 from ui.traders.MinMaxSupportTraderTabManager import MinMaxSupportTraderTabManager
@@ -28,6 +26,9 @@ trader_manager = None
 app_manager = None
 app = None
 traders_locks = {}
+order_books = {}
+market_data_recorder = None
+simulated_exchange = None
 
 
 def stop_handler(sig, frame):
@@ -56,12 +57,44 @@ def init_data():
     trading_bot_data = TradingBotData()
 
 
+def init_recorder(config):
+    global market_data_recorder
+    recording_config = config['trading'].get('recording') or {}
+    if recording_config.get('enabled', False):
+        market_data_recorder = MarketDataRecorder(directory=recording_config.get('directory', 'recordings'),
+                                                  rotation_minutes=recording_config.get('rotation-minutes', 60),
+                                                  keyframe_seconds=recording_config.get('keyframe-seconds', 30))
+
+
+def init_exchange(config):
+    global simulated_exchange
+    # Orders go to Binance unless the in-process exchange is configured
+    if config['trading'].get('exchange', 'binance') == 'simulated':
+        simulated_exchange = SimulatedSpotClient(order_books)
+
+
 def init_order_book(config, symbol):
     base_url = config['api']['base-url']
     trading_config = config['trading']
     order_book_config = trading_config['order-book']
     order_book_limit = order_book_config['limit']
-    return initialize_order_book(base_url=base_url, symbol=symbol, limit=order_book_limit)
+    symbol_filters = fetch_symbol_filters(base_url=base_url, symbol=symbol) or {}
+    order_book = OrderBook(symbol=symbol, limit=order_book_limit, tick_size=symbol_filters.get('tick_size'),
+                           step_size=symbol_filters.get('step_size'),
+                           fixed_point=order_book_config.get('fixed-point', False))
+    depth = fetch_depth_snapshot(base_url=base_url, symbol=symbol, limit=order_book_limit)
+    if depth is not None:
+        order_book.load_snapshot(depth)
+        if market_data_recorder is not None:
+            market_data_recorder.record_snapshot(symbol, depth)
+    return order_book
+
+
+def get_order_book(config, symbol):
+    global order_books
+    if symbol not in order_books:
+        order_books[symbol] = init_order_book(config, symbol)
+    return order_books[symbol]
 
 
 def init_app():
@@ -71,96 +104,8 @@ def init_app():
     threading.Thread(target=app.run_server, kwargs={'debug': False, 'use_reloader': False, 'port': 8065}).start()
 
 
-def init_trader(config, trader_id, trader_config, capital, trade_capital_percentage, trader_update_queue):
-    global trading_bot_data
-    trader_type = trader_config['type']
-    symbol = trader_config['symbol']
-    order_book_data = init_order_book(config, symbol)
-    if trader_type == 'SecuredCapitalTrader':
-        order_book = copy.deepcopy(order_book_data)
-        target_volume = trader_config['target-volume']
-        respected_gap_value = trader_config['respected-gap-value']
-        return SecuredCapitalTrader(
-            trader_id=trader_id,
-            symbol=symbol,
-            capital=capital,
-            trade_capital_percentage=trade_capital_percentage,
-            order_book=order_book,
-            trader_updates_queue=trader_update_queue,
-            target_volume=target_volume,
-            respected_gap_value=respected_gap_value
-        )
-    elif trader_type == 'RealSecuredCapitalTrader':
-        order_book = copy.deepcopy(order_book_data)
-        target_volume = trader_config['target-volume']
-        respected_gap_value = trader_config['respected-gap-value']
-        return RealSecuredCapitalTrader(
-            trader_id=trader_id,
-            symbol=symbol,
-            capital=capital,
-            trade_capital_percentage=trade_capital_percentage,
-            order_book=order_book,
-            trader_updates_queue=trader_update_queue,
-            target_volume=target_volume,
-            respected_gap_value=respected_gap_value,
-            api_config=config['api']
-        )
-    elif trader_type == 'MinMaxSecuredCapitalTrader':
-        order_book = copy.deepcopy(order_book_data)
-        target_volume = trader_config['target-volume']
-        respected_gap_value = trader_config['respected-gap-value']
-        return MinMaxSecuredCapitalTrader(
-            trader_id=trader_id,
-            symbol=symbol,
-            capital=capital,
-            trade_capital_percentage=trade_capital_percentage,
-            order_book=order_book,
-            trader_updates_queue=trader_update_queue,
-            target_volume=target_volume,
-            respected_gap_value=respected_gap_value,
-            api_config=config['api']
-        )
-    elif trader_type == 'MinMaxTrader':
-        order_book = copy.deepcopy(order_book_data)
-        target_volume = trader_config['target-volume']
-        respected_gap_value = trader_config['respected-gap-value']
-        return MinMaxTrader(
-            trader_id=trader_id,
-            symbol=symbol,
-            capital=capital,
-            trade_capital_percentage=trade_capital_percentage,
-            order_book=order_book,
-            trader_updates_queue=trader_update_queue,
-            target_volume=target_volume,
-            respected_gap_value=respected_gap_value,
-            api_config=config['api']
-        )
-    elif trader_type == 'FundingRateTrader':
-        return FundingRateTrader(
-            trader_id=trader_id,
-            symbol=symbol,
-            capital=capital,
-            trade_capital_percentage=trade_capital_percentage,
-            trader_updates_queue=trader_update_queue)
-    elif trader_type == 'BollingerReverseMeanTrader':
-        return BollingerReverseMeanTrader(
-            trader_id=trader_id,
-            symbol=symbol,
-            capital=capital,
-            trade_capital_percentage=100,
-            api_config=config['api'])
-    elif trader_type == 'BollingerOriginalReverseMeanTrader':
-        return BollingerOriginalReverseMeanTrader(
-            trader_id=trader_id,
-            symbol=symbol,
-            capital=capital,
-            trade_capital_percentage=100,
-            api_config=config['api'])
-    return None
-
-
 def init_traders(config):
-    global trading_bot_data, trader_manager, traders_locks
+    global trading_bot_data, trader_manager, traders_locks, order_books
     trading_config = config['trading']
     capital = Decimal(trading_config['capital'])
     websocket_base_url = config['api']['websocket-base-url']
@@ -177,7 +122,9 @@ def init_traders(config):
         trading_bot_data.analytics_data[trader_id] = {'potential_profit_loss_history': deque(maxlen=1000),
                                                       'total_profit_loss_history': deque(maxlen=1000)}
         traders_locks[trader_id] = threading.Lock()
-        trader = init_trader(config, trader_id, trader_config, capital, trade_capital_percentage, trader_update_queue)
+        trader = create_trader(config, trader_id, trader_config, capital, trade_capital_percentage, trader_update_queue,
+                               order_book_provider=lambda symbol: get_order_book(config, symbol),
+                               client=simulated_exchange.account(trader_id) if simulated_exchange else None)
         traders.append(trader)
         trading_bot_data.traders[trader_id] = {'instance': trader, 'lock': traders_locks[trader_id]}
         if isinstance(trader, AbstractSupportTrader) or isinstance(trader, BollingerReverseMeanTrader) or isinstance(trader, BollingerOriginalReverseMeanTrader):
@@ -189,13 +136,18 @@ def init_traders(config):
             symbols.append(trader.symbol)
     trader_manager = TraderManager(
         queues=queues,
+        order_books=order_books,
         websocket_url=websocket_base_url,
         trading_bot_data=trading_bot_data,
         traders_locks=traders_locks,
         traders=traders,
         trader_updates_queue=trader_update_queue,
         symbols=symbols,
-        api_config=config['api']
+        api_config=config['api'],
+        consumer_config=trading_config.get('consumer'),
+        recorder=market_data_recorder,
+        exchange=simulated_exchange,
+        candle_directory=config['trading'].get('candle-directory', 'candles')
     )
 
 
@@ -207,6 +159,8 @@ def start():
         config = load_current_config()
         logging.info('Initializing data...')
         init_data()
+        init_recorder(config)
+        init_exchange(config)
         logging.info('Initializing traders')
         init_traders(config)
         logging.info('Initializing app')
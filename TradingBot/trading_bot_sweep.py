@@ -0,0 +1,47 @@
+import argparse
+import logging
+import os
+import time
+
+from config.config_util import load_config
+from simulation.sweep import ParameterSweep, configurations_of
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Replays recorded market data through variations of a trader')
+    parser.add_argument('env', choices=['test', 'prod'])
+    parser.add_argument('--recordings', help='recordings directory, the configured one by default')
+    parser.add_argument('--output', default='sweep', help='directory of the result table')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, one per CPU by default')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='runs replayed together in one pass by a worker, sharing the order books')
+    parser.add_argument('--mode', choices=['grid', 'random'], default=None, help='overrides sweep.mode')
+    parser.add_argument('--samples', type=int, default=None, help='overrides sweep.samples in random mode')
+    parser.add_argument('--seed', type=int, default=None, help='overrides sweep.seed in random mode')
+    return parser.parse_args()
+
+
+def start():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    arguments = parse_arguments()
+    config = load_config(arguments.env)
+    sweep_config = config['sweep']
+    recordings_directory = arguments.recordings or (config['trading'].get('recording') or {}).get('directory',
+                                                                                                 'recordings')
+    configurations = configurations_of(sweep_config, arguments.mode, arguments.samples, arguments.seed)
+    logging.info(f"Sweeping {len(configurations)} configurations of {sweep_config['trader']['type']}")
+    sweep = ParameterSweep(config, recordings_directory, sweep_config['trader'],
+                           data_directory=os.path.join(arguments.output, 'runs'), workers=arguments.workers,
+                           batch_size=arguments.batch_size)
+    start_time = time.perf_counter()
+    table = sweep.run(configurations)
+    result_file = os.path.join(arguments.output, 'results.csv')
+    table.to_csv(result_file)
+    logging.info(f"{len(table)} runs in {time.perf_counter() - start_time:.1f}s, results written to {result_file}")
+    table.sort_by('total_profit_loss', reverse=True)
+    for row in table.rows()[:5]:
+        logging.info(row)
+
+
+if __name__ == '__main__':
+    start()
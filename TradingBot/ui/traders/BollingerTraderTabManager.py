@@ -10,6 +10,7 @@ import plotly.graph_objs as go
 
 from date.date_util import compute_duration_until_now
 from traders.abstract_multi_trade_trader import AbstractMultiTradeTrader
+from traders.order import OrderStatus
 
 
 class BollingerTraderTabManager:
@@ -188,23 +189,23 @@ class BollingerTraderTabManager:
                 if isinstance(trader, AbstractMultiTradeTrader):
                     free_slots = trader.free_slots
                     for order in trader.current_orders:
-                        buy_fee = order.get('buy_fee')
+                        buy_fee = order.buy_fee
                         buy_fee_formatted = f"{buy_fee:.2f}" if buy_fee is not None else None
-                        if order['status'] != 'buy_in_progress':
+                        if order.status != OrderStatus.BUY_IN_PROGRESS:
                             profit = trader.compute_potential_profit_loss(order)
                         else:
                             profit = None
                         buy_orders_data.append({
-                            'id': order['id'],
-                            'opened_at': order['opened_at'],
-                            'status': order['status'],
-                            'buy_commission': order['buy_commission'] if order.get('buy_commission') else 'N/A',
-                            'cost': f"{order.get('cost', -1):.2f}" if order['status'] != 'buy_in_progress' else None,
-                            'buy_price': f"{order.get('buy_price', -1):.2f}" if order['status'] != 'buy_in_progress' else None,
-                            'quantity': f"{order.get('quantity', -1)}" if order['status'] != 'buy_in_progress' else None,
+                            'id': order.id,
+                            'opened_at': order.opened_at,
+                            'status': order.status.value,
+                            'buy_commission': order.buy_commission if order.buy_commission else 'N/A',
+                            'cost': f"{order.cost if order.cost is not None else -1:.2f}" if order.status != OrderStatus.BUY_IN_PROGRESS else None,
+                            'buy_price': f"{order.buy_price if order.buy_price is not None else -1:.2f}" if order.status != OrderStatus.BUY_IN_PROGRESS else None,
+                            'quantity': f"{order.quantity if order.quantity is not None else -1}" if order.status != OrderStatus.BUY_IN_PROGRESS else None,
                             'buy_fee': buy_fee_formatted,
-                            'stop_loss': f"{order.get('stop_loss_price', 0):.2f}" if order['status'] != 'buy_in_progress' else None,
-                            'secured': order['secured'] if order.get('secured') else 'N/A' ,
+                            'stop_loss': f"{(order.stop_loss_price or 0):.2f}" if order.status != OrderStatus.BUY_IN_PROGRESS else None,
+                            'secured': order.secured if order.secured else 'N/A' ,
                             'potential_profit_loss': f"{profit:.8f}" if profit is not None else None
                         })
 
@@ -212,26 +213,26 @@ class BollingerTraderTabManager:
                 trade_history_data = []
                 total_profit_loss = Decimal('0')
                 for trade in trader.trade_history:
-                    buy_fee = trade.get('buy_fee')
+                    buy_fee = trade.buy_fee
                     buy_fee_formatted = f"{buy_fee:.2f}" if buy_fee is not None else None
                     trade_history_data.append(
                         {
-                            'id': trade['id'],
-                            'opened_at': trade['opened_at'],
-                            'cost': f"{trade.get('cost', -1):.2f}",
-                            'buy_price': f"{trade['buy_price']:.2f}",
-                            'quantity': f"{trade['quantity']}",
+                            'id': trade.id,
+                            'opened_at': trade.opened_at,
+                            'cost': f"{trade.cost if trade.cost is not None else -1:.2f}",
+                            'buy_price': f"{trade.buy_price:.2f}",
+                            'quantity': f"{trade.quantity}",
                             'buy_fee': buy_fee_formatted,
-                            'stop_loss': f"{trade.get('stop_loss_price', 0):.2f}",
-                            'secured': trade['secured'] if trade.get('secured') else 'N/A',
-                            'closed_at': trade['closed_at'],
-                            'sale_price': f"{trade['sale_price']:.8f}",
-                            'sale_fee': f"{trade.get('sale_fee', 0):.8f}",
-                            'profit': f"{trade['profit']:.8f}",
-                            'sailed_quantity': trade['sailed_quantity'],
-                            'duration': trade['duration']
+                            'stop_loss': f"{(trade.stop_loss_price or 0):.2f}",
+                            'secured': trade.secured if trade.secured else 'N/A',
+                            'closed_at': trade.closed_at,
+                            'sale_price': f"{trade.sale_price:.8f}",
+                            'sale_fee': f"{(trade.sale_fee or 0):.8f}",
+                            'profit': f"{trade.profit:.8f}",
+                            'sailed_quantity': trade.sailed_quantity,
+                            'duration': trade.duration
                         })
-                    total_profit_loss += trade['profit']
+                    total_profit_loss += trade.profit
                 creation_date = datetime.strptime(trader.creation_date, "%d/%m/%YT%H:%M")
                 script_run_time = compute_duration_until_now(creation_date)
 
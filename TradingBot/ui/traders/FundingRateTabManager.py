@@ -161,34 +161,34 @@ class FundingRateTabManager:
                 ))
                 buy_orders_data = []
                 for order in trader.current_orders:
-                    buy_fee = order.get('buy_fee')
+                    buy_fee = order.buy_fee
                     buy_fee_formatted = f"{buy_fee:.2f}" if buy_fee is not None else None
                     profit = trader.compute_potential_profit_loss(order)
                     buy_orders_data.append({
-                        'id': order['id'],
-                        'opened_at': order['opened_at'],
-                        'cost': f"{order.get('cost', -1):.2f}",
-                        'buy_price': f"{order['buy_price']:.2f}",
-                        'quantity': f"{order['quantity']}",
+                        'id': order.id,
+                        'opened_at': order.opened_at,
+                        'cost': f"{order.cost if order.cost is not None else -1:.2f}",
+                        'buy_price': f"{order.buy_price:.2f}",
+                        'quantity': f"{order.quantity}",
                         'buy_fee': buy_fee_formatted,
                         'potential_profit_loss': f"{profit:.8f}" if profit is not None else None
                     })
             funding_rate = trader.funding_rate
             trade_history_data = []
             for trade in trader.trade_history:
-                buy_fee = trade.get('buy_fee')
+                buy_fee = trade.buy_fee
                 buy_fee_formatted = f"{buy_fee:.2f}" if buy_fee is not None else None
                 trade_history_data.append(
                     {
-                        'id': trade['id'],
-                        'opened_at': trade['opened_at'],
-                        'cost': f"{trade.get('cost', -1):.2f}",
-                        'buy_price': f"{trade['buy_price']:.2f}",
-                        'quantity': f"{trade['quantity']}",
+                        'id': trade.id,
+                        'opened_at': trade.opened_at,
+                        'cost': f"{trade.cost if trade.cost is not None else -1:.2f}",
+                        'buy_price': f"{trade.buy_price:.2f}",
+                        'quantity': f"{trade.quantity}",
                         'buy_fee': buy_fee_formatted,
-                        'closed_at': trade['closed_at'],
-                        'profit': f"{trade['profit']:.8f}",
-                        'duration': trade['duration']
+                        'closed_at': trade.closed_at,
+                        'profit': f"{trade.profit:.8f}",
+                        'duration': trade.duration
                     })
             creation_date = datetime.strptime(trader.creation_date, "%d/%m/%YT%H:%M")
             script_run_time = compute_duration_until_now(creation_date)